@@ -0,0 +1,147 @@
+"""
+异步视图性能基准：对比 uvicorn（ASGI，异步视图）与 gunicorn 同步 worker（WSGI）的延迟
+
+两种服务器使用同一个数据库，关闭整页缓存，用并发客户端请求首页、文章详情和搜索页：
+python benchmarks/async_benchmark.py --settings blog_yk.settings --workers 2 --concurrency 16 --requests 400
+
+数据库为空时可先加 --seed 2000 生成文章；查询往返越慢（如远程 MySQL），并发查询的收益越明显。
+需要额外安装 uvicorn 和 gunicorn。
+"""
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import quote
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+SERVERS = {
+    'gunicorn-sync': ['gunicorn', 'blog_yk.wsgi:application', '--worker-class', 'sync', '--workers', '{workers}',
+                      '--bind', '127.0.0.1:{port}', '--log-level', 'warning'],
+    'uvicorn-async': ['uvicorn', 'blog_yk.asgi:application', '--workers', '{workers}',
+                      '--host', '127.0.0.1', '--port', '{port}', '--log-level', 'warning'],
+}
+
+
+def setup_django(settings_module):
+    os.environ['DJANGO_SETTINGS_MODULE'] = settings_module
+    import django
+    django.setup()
+
+
+def seed_posts(count):
+    from django.contrib.auth.models import User
+
+    from blog_app.importer import PostImporter, rebuild_derived_data
+
+    author, _ = User.objects.get_or_create(username='benchmark')
+    records = (
+        {'title': f'Benchmark post {i}', 'content': f'# 基准测试 {i}\n\n异步视图 async benchmark 第 {i} 篇正文。\n' * 20,
+         'category': f'分类{i % 10}', 'tags': [f'tag{i % 30}', f'tag{i % 7}']}
+        for i in range(count)
+    )
+    PostImporter(author).run(records)
+    rebuild_derived_data()
+
+
+def pick_paths():
+    from blog_app.models import Post
+
+    slugs = list(Post.objects.filter(status='published').values_list('slug', flat=True)[:50])
+    if not slugs:
+        raise SystemExit('数据库中没有已发布的文章，请加 --seed 生成')
+    return {
+        'home': ['/'],
+        'post_detail': [f'/post/{slug}/' for slug in slugs],
+        'search': ['/search/?q=async', '/search/?q=' + quote('基准测试')],
+    }
+
+
+def wait_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/')
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f'服务器在 {timeout} 秒内没有就绪')
+
+
+def fetch(port, path):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    started = time.perf_counter()
+    conn.request('GET', path)
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    if response.status != 200:
+        raise RuntimeError(f'{path} 返回 {response.status}')
+    return (time.perf_counter() - started) * 1000
+
+
+def load(port, paths, concurrency, requests):
+    targets = [paths[i % len(paths)] for i in range(requests)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(lambda path: fetch(port, path), targets))
+    elapsed = time.perf_counter() - started
+    return {
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+        'p99': latencies[int(len(latencies) * 0.99) - 1],
+        'rps': requests / elapsed,
+    }
+
+
+def run_server(name, args, paths):
+    command = [part.format(workers=args.workers, port=args.port) for part in SERVERS[name]]
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=args.settings, PAGE_CACHE_ENABLED='False',
+               ASYNC_VIEWS='True' if name.startswith('uvicorn') else 'False')
+    process = subprocess.Popen(command, cwd=ROOT, env=env)
+    try:
+        wait_ready(args.port)
+        results = {}
+        for view, view_paths in paths.items():
+            # 预热连接和进程内缓存
+            load(args.port, view_paths, args.concurrency, args.concurrency)
+            results[view] = load(args.port, view_paths, args.concurrency, args.requests)
+        return results
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--settings', default='blog_yk.settings', help='两种服务器共用的配置模块（需使用可跨进程访问的数据库）')
+    parser.add_argument('--seed', type=int, default=0, help='先生成指定数量的文章')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=400, help='每个页面的请求数')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    setup_django(args.settings)
+    if args.seed:
+        seed_posts(args.seed)
+    paths = pick_paths()
+
+    results = {name: run_server(name, args, paths) for name in SERVERS}
+    print(f'{"页面":<12}{"服务器":<16}{"p50(ms)":>10}{"p95(ms)":>10}{"p99(ms)":>10}{"req/s":>10}')
+    for view in paths:
+        for name in SERVERS:
+            row = results[name][view]
+            print(f'{view:<12}{name:<16}{row["p50"]:>10.1f}{row["p95"]:>10.1f}{row["p99"]:>10.1f}{row["rps"]:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
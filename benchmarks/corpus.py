@@ -0,0 +1,24 @@
+"""
+基准脚本共用的测试文本生成
+
+词表按 Zipf 分布取词，中文词为随机汉字组合，每隔 50 个词混入一个常见英文技术词，
+同一随机种子生成相同的文本。
+"""
+
+EN_WORDS = ['django', 'python', 'redis', 'mysql', 'nginx', 'docker', 'linux', 'async',
+            'cache', 'query', 'template', 'queryset', 'gunicorn', 'index', 'signal']
+
+
+def build_vocabulary(rng, size=5000):
+    """生成按 Zipf 分布取词的中英文词表，返回 (词列表, 权重列表)"""
+    words = [
+        ''.join(chr(rng.randint(0x4e00, 0x9fa5)) for _ in range(rng.choice([2, 2, 3, 4])))
+        for _ in range(size)
+    ]
+    words[::50] = [f' {word} ' for word in EN_WORDS * (size // 50 // len(EN_WORDS) + 1)][:len(words[::50])]
+    weights = [1 / (rank + 1) for rank in range(size)]
+    return words, weights
+
+
+def make_text(rng, vocabulary, words):
+    return ''.join(rng.choices(vocabulary[0], weights=vocabulary[1], k=words))
@@ -0,0 +1,81 @@
+"""
+图片处理性能基准：测量进程池生成全部尺寸版本的吞吐量
+
+不访问数据库和对象存储，只测 Pillow 缩放与编码：
+python benchmarks/image_benchmark.py --images 40 --size 3000x2000
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blog_yk.test_settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from PIL import Image, ImageDraw, ImageFilter  # noqa: E402
+
+from blog_app.images import make_variants  # noqa: E402
+
+
+def make_photo(rng, width, height):
+    """生成带渐变和噪点、压缩难度接近照片的 JPEG"""
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    for _ in range(200):
+        x, y = rng.randrange(width), rng.randrange(height)
+        radius = rng.randrange(10, width // 8)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=color)
+    image = Image.blend(image.filter(ImageFilter.GaussianBlur(3)), Image.effect_noise((width, height), 40).convert('RGB'), 0.2)
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def run(images, workers):
+    started = time.perf_counter()
+    if workers == 1:
+        outputs = list(map(make_variants, images))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            outputs = list(executor.map(make_variants, images))
+    elapsed = time.perf_counter() - started
+    output_bytes = sum(len(v.data) for _, _, variants in outputs for v in variants)
+    return elapsed, output_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=40, help='图片数量')
+    parser.add_argument('--size', default='3000x2000', help='原图尺寸，如 3000x2000')
+    parser.add_argument('--workers', type=int, nargs='+', help='进程数列表，默认 1 到 CPU 核数')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    width, height = map(int, args.size.lower().split('x'))
+    rng = random.Random(args.seed)
+    print(f'生成 {args.images} 张 {width}x{height} 测试图片...')
+    images = [make_photo(rng, width, height) for _ in range(args.images)]
+    input_bytes = sum(map(len, images))
+
+    cpus = os.cpu_count() or 1
+    workers_list = args.workers or sorted({1, *range(2, cpus + 1, max(1, cpus // 4)), cpus})
+    print(f'CPU 核数: {cpus}，输入 {input_bytes / 1024 / 1024:.1f} MB')
+    print(f'{"进程数":>6} {"耗时(s)":>9} {"图片/秒":>9} {"每核图片/秒":>12} {"输出(MB)":>9}')
+    for workers in workers_list:
+        elapsed, output_bytes = run(images, workers)
+        throughput = args.images / elapsed
+        print(f'{workers:>6} {elapsed:>9.2f} {throughput:>9.2f} {throughput / min(workers, cpus):>12.2f} '
+              f'{output_bytes / 1024 / 1024:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
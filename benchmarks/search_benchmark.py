@@ -0,0 +1,118 @@
+"""
+搜索性能基准：对比倒排索引搜索与原 icontains 扫描的延迟
+
+在内存 SQLite 中生成测试数据后运行：
+python benchmarks/search_benchmark.py --sizes 10000 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blog_yk.test_settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.paginator import Paginator  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import Q  # noqa: E402
+from django.db.models.signals import post_save  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from blog_app.models import Post  # noqa: E402
+from blog_app.search import rebuild_index, search_post_ids  # noqa: E402
+from blog_app.signals import update_search_index  # noqa: E402
+from corpus import build_vocabulary, make_text  # noqa: E402
+
+
+def pick_queries(vocabulary):
+    words = vocabulary[0]
+    # 高频词、中频词、低频词、中文词组与中英混合
+    return [words[1], words[20], words[400], words[2000], words[3] + words[30], f'{words[5]} {words[50]}']
+
+
+def seed_posts(author, start, stop, rng, vocabulary):
+    now = timezone.now()
+    batch = []
+    for i in range(start, stop):
+        content = make_text(rng, vocabulary, 300)
+        batch.append(Post(
+            title=make_text(rng, vocabulary, 6),
+            slug=f'bench-{i}',
+            author=author,
+            content=content,
+            excerpt=content[:200],
+            status='published',
+            published_at=now - timezone.timedelta(minutes=i),
+        ))
+        if len(batch) >= 2000:
+            Post.objects.bulk_create(batch)
+            batch = []
+    Post.objects.bulk_create(batch)
+
+
+def legacy_search(query):
+    posts = Post.objects.filter(
+        Q(title__icontains=query) | Q(content__icontains=query) | Q(excerpt__icontains=query),
+        status='published'
+    ).select_related('author', 'category').prefetch_related('tags')
+    page = Paginator(posts, 10).get_page(1)
+    list(page.object_list)
+    return posts.count()
+
+
+def indexed_search(query):
+    post_ids = search_post_ids(query)
+    page = Paginator(post_ids, 10).get_page(1)
+    list(Post.objects.filter(pk__in=page.object_list).select_related(
+        'author', 'category').prefetch_related('tags'))
+    return len(post_ids)
+
+
+def measure(func, query, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(query)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1 if len(timings) > 1 else 0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    connection.creation.create_test_db(verbosity=0)
+    # 批量生成数据时不逐条维护索引，最后统一重建
+    post_save.disconnect(update_search_index, sender=Post)
+
+    rng = random.Random(args.seed)
+    vocabulary = build_vocabulary(rng)
+    queries = pick_queries(vocabulary)
+    author = User.objects.create_user(username='bench')
+    seeded = 0
+    print(f'{"posts":>8} {"query":<14} {"hits":>7} {"icontains p50/p95 ms":>22} {"index p50/p95 ms":>18}')
+    for size in sorted(args.sizes):
+        seed_posts(author, seeded, size, rng, vocabulary)
+        seeded = size
+        rebuild_index()
+        for query in queries:
+            hits = indexed_search(query)
+            legacy = measure(legacy_search, query, args.repeat)
+            indexed = measure(indexed_search, query, args.repeat)
+            print(f'{size:>8} {query.strip():<14} {hits:>7} {legacy[0]:>10.1f}/{legacy[1]:<11.1f} {indexed[0]:>8.1f}/{indexed[1]:<9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+"""
+页面性能基准：在可复现的大数据集上测量各视图的延迟分位数和查询数，并与基线比较
+
+在内存 SQLite 和本地内存缓存中按随机种子生成数据，用 Django 测试客户端请求
+首页、文章详情、搜索、归档、分类和管理面板首页，结果可写入 JSON：
+python benchmarks/view_benchmark.py --profile small --output results.json
+
+与保存的基线比较，任一页面的延迟（默认 p50）超过基线的 (1 + margin) 倍或查询数增加时以状态码 1 退出：
+python benchmarks/view_benchmark.py --profile small --baseline benchmarks/baselines/small.json --margin 0.3
+更新基线：
+python benchmarks/view_benchmark.py --profile small --baseline benchmarks/baselines/small.json --update-baseline
+
+基线中的耗时与机器有关，应在同一台机器（如固定的 CI 节点）上生成和比较；查询数与机器无关。
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+from pathlib import Path
+from urllib.parse import quote
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blog_yk.test_settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from blog_app.content import render_batch  # noqa: E402
+from blog_app.importer import rebuild_derived_data  # noqa: E402
+from blog_app.models import Category, Comment, Post, Tag  # noqa: E402
+from corpus import build_vocabulary, make_text  # noqa: E402
+
+PROFILES = {
+    'small': {'posts': 1000, 'comments': 20000},
+    'medium': {'posts': 10000, 'comments': 300000},
+    'large': {'posts': 100000, 'comments': 3000000},
+}
+BATCH_SIZE = 2000
+CATEGORIES = 20
+TAGS = 200
+
+# 项目中没有的模板用最简模板代替，仍然遍历上下文中的查询集
+STUB_TEMPLATES = {
+    name: '{% for post in page_obj %}{{ post.title }}{% endfor %}{{ archive_data }}'
+    for name in ['blog/category_detail.html', 'blog/tag_detail.html', 'blog/archive.html',
+                 'blog/archive_month.html', 'blog/search_results.html']
+}
+STUB_TEMPLATES['dashboard/home.html'] = (
+    '{{ stats }}{% for post in recent_posts %}{{ post.title }}{{ post.category }}{% endfor %}'
+    '{% for comment in recent_comments %}{{ comment.post.title }}{{ comment.user }}{% endfor %}'
+    '{% for post in popular_posts %}{{ post.title }}{% endfor %}'
+)
+
+
+def template_settings():
+    """项目模板优先，缺失的模板退回 STUB_TEMPLATES"""
+    config = dict(settings.TEMPLATES[0])
+    config['APP_DIRS'] = False
+    config['OPTIONS'] = dict(config['OPTIONS'], loaders=[
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+        ('django.template.loaders.locmem.Loader', STUB_TEMPLATES),
+    ])
+    return [config]
+
+
+# ==================== 生成数据 ====================
+
+def _flush(model, objects):
+    model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+    objects.clear()
+
+
+def seed(rng, posts, comments, executor=None):
+    """
+    生成用户、分类、标签、文章（含标签关联）和评论树，主键按顺序显式指定
+    评论按 Zipf 分布集中在少数热门文章上，约三成是回复
+    """
+    vocabulary = build_vocabulary(rng)
+    users = max(50, posts // 20)
+    User.objects.bulk_create(
+        [User(pk=i, username=f'user{i}', password='!') for i in range(1, users + 1)], batch_size=BATCH_SIZE
+    )
+    Category.objects.bulk_create([Category(pk=i, name=f'分类{i}', slug=f'category-{i}') for i in range(1, CATEGORIES + 1)])
+    Tag.objects.bulk_create([Tag(pk=i, name=f'标签{i}', slug=f'tag-{i}') for i in range(1, TAGS + 1)])
+
+    now = timezone.now()
+    Through = Post.tags.through
+    batch, links = [], []
+    tag_weights = [1 / rank for rank in range(1, TAGS + 1)]
+    for pk in range(1, posts + 1):
+        # 约两年内均匀发布，5% 为草稿
+        published = rng.random() >= 0.05
+        batch.append(Post(
+            pk=pk, title=make_text(rng, vocabulary, 6).strip()[:200], slug=f'bench-{pk}',
+            author_id=rng.randint(1, users), category_id=rng.randint(1, CATEGORIES),
+            content=f'# {make_text(rng, vocabulary, 4)}\n\n{make_text(rng, vocabulary, 150)}\n\n## 小结\n\n{make_text(rng, vocabulary, 80)}',
+            status='published' if published else 'draft',
+            published_at=now - timezone.timedelta(minutes=pk * 10) if published else None,
+            is_featured=rng.random() < 0.01, views=int(rng.paretovariate(1.2) * 10),
+        ))
+        links.extend(
+            Through(post_id=pk, tag_id=tag_id)
+            for tag_id in set(rng.choices(range(1, TAGS + 1), weights=tag_weights, k=rng.randint(0, 4)))
+        )
+        if len(batch) >= BATCH_SIZE:
+            render_batch(batch, executor=executor)
+            _flush(Post, batch)
+            _flush(Through, links)
+    render_batch(batch, executor=executor)
+    _flush(Post, batch)
+    _flush(Through, links)
+
+    # 热门文章打散到各个主键上；按累积权重二分抽样，每批抽一次
+    post_ids = list(range(1, posts + 1))
+    rng.shuffle(post_ids)
+    cum_weights = list(accumulate(1 / rank for rank in range(1, posts + 1)))
+    recent = {}
+    batch, draws = [], []
+    for pk in range(1, comments + 1):
+        if not draws:
+            draws = rng.choices(post_ids, cum_weights=cum_weights, k=BATCH_SIZE)
+        # 四分之三按热度集中，其余均匀分布
+        post_id = draws.pop() if pk % 4 else rng.choice(post_ids)
+        siblings = recent.setdefault(post_id, [])
+        parent = rng.choice(siblings) if siblings and rng.random() < 0.3 else None
+        if parent and len(parent[1]) // Comment.PATH_STEP < Comment.MAX_PATH_DEPTH:
+            parent_id, path = parent[0], parent[1] + Comment.path_segment(pk)
+        else:
+            parent_id, path = None, Comment.path_segment(pk)
+        batch.append(Comment(
+            pk=pk, post_id=post_id, user_id=rng.randint(1, users), parent_id=parent_id, path=path,
+            content=make_text(rng, vocabulary, rng.randint(5, 40)), is_approved=rng.random() < 0.9,
+            ip_address=f'10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}',
+        ))
+        siblings.append((pk, path))
+        del siblings[:-5]
+        if len(batch) >= BATCH_SIZE:
+            _flush(Comment, batch)
+    _flush(Comment, batch)
+
+    rebuild_derived_data()
+    return vocabulary
+
+
+def pick_targets(vocabulary):
+    """需要测量的页面 {名称: (URL, 是否以管理员身份访问)}"""
+    from django.db.models import Count
+
+    published = Post.objects.filter(status='published')
+    hot = published.annotate(total=Count('comments')).order_by('-total', 'pk').values_list('slug', flat=True)[0]
+    typical = published.order_by('pk').values_list('slug', flat=True)[published.count() // 2]
+    moment = timezone.localtime(published.order_by('published_at').values_list('published_at', flat=True)[0])
+    words = vocabulary[0]
+    return {
+        'home': (reverse('home'), False),
+        'home_page_50': (reverse('home') + '?page=50', False),
+        'post_detail': (reverse('post_detail', args=[typical]), False),
+        'post_detail_hot': (reverse('post_detail', args=[hot]), False),
+        'search_common': (reverse('search') + '?q=' + quote(words[1].strip()), False),
+        'search_rare': (reverse('search') + '?q=' + quote(words[2000].strip()), False),
+        'archive': (reverse('archive'), False),
+        'archive_month': (reverse('archive_month', args=[moment.year, moment.month]), False),
+        'category_detail': (reverse('category_detail', args=['category-1']), False),
+        'dashboard_home': (reverse('dashboard_home'), True),
+    }
+
+
+# ==================== 测量 ====================
+
+def percentile(sorted_values, fraction):
+    """最近秩法分位数"""
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def measure(client, url, warmup, repeat):
+    for _ in range(warmup):
+        client.get(url)
+    # 查询数单独统计一次，记录 SQL 的开销不计入耗时
+    with CaptureQueriesContext(connection) as captured:
+        response = client.get(url)
+    # 每个请求开始时会清空查询日志，立即取出数量
+    query_count = len(captured)
+    if response.status_code != 200:
+        raise RuntimeError(f'{url} 返回 {response.status_code}')
+    gc.collect()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        client.get(url)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'url': url,
+        'queries': query_count,
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'max_ms': round(timings[-1], 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+    }
+
+
+def compare(results, baseline, metric, margin, query_margin, min_delta_ms=0):
+    """
+    与基线比较：耗时需同时超过比例和绝对阈值（避免亚毫秒页面的抖动误报）
+    :return: 超出阈值的说明列表
+    """
+    failures = []
+    for name, expected in baseline['results'].items():
+        actual = results.get(name)
+        if actual is None:
+            failures.append(f'{name}: 本次没有测量')
+            continue
+        limit = max(expected[metric] * (1 + margin), expected[metric] + min_delta_ms)
+        if actual[metric] > limit:
+            failures.append(f'{name}: {metric} {actual[metric]:.2f} > {limit:.2f}（基线 {expected[metric]:.2f}）')
+        if actual['queries'] > expected['queries'] + query_margin:
+            failures.append(f'{name}: 查询数 {actual["queries"]} > 基线 {expected["queries"]}')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profile', choices=PROFILES, default='small', help='数据规模')
+    parser.add_argument('--posts', type=int, help='覆盖规模中的文章数')
+    parser.add_argument('--comments', type=int, help='覆盖规模中的评论数')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=30, help='每个页面的计时次数')
+    parser.add_argument('--workers', type=int, default=1, help='生成数据时渲染 Markdown 的进程数')
+    parser.add_argument('--page-cache', action='store_true', help='开启匿名用户整页缓存（默认关闭以测量视图本身）')
+    parser.add_argument('--output', help='结果 JSON 文件')
+    parser.add_argument('--baseline', help='基线 JSON 文件')
+    parser.add_argument('--update-baseline', action='store_true', help='把本次结果写入 --baseline')
+    parser.add_argument('--metric', choices=['p50_ms', 'p95_ms', 'p99_ms', 'mean_ms'], default='p50_ms',
+                        help='与基线比较的指标（p50 受偶发停顿影响最小）')
+    parser.add_argument('--margin', type=float, default=0.25, help='允许超出基线的比例')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0, help='耗时至少比基线多出的毫秒数才算超出')
+    parser.add_argument('--query-margin', type=int, default=0, help='允许比基线多执行的查询数')
+    args = parser.parse_args()
+
+    size = dict(PROFILES[args.profile])
+    size.update({key: value for key, value in (('posts', args.posts), ('comments', args.comments)) if value})
+
+    setup_test_environment(debug=False)
+    connection.creation.create_test_db(verbosity=0)
+    overrides = override_settings(
+        TEMPLATES=template_settings(), PAGE_CACHE_ENABLED=args.page_cache,
+        INSTRUMENTATION_SAMPLE_RATE=0, PAGINATION_MODE='cursor',
+    )
+    overrides.enable()
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            vocabulary = seed(rng, size['posts'], size['comments'], executor)
+    else:
+        vocabulary = seed(rng, size['posts'], size['comments'])
+    seed_seconds = time.perf_counter() - started
+    print(f'生成 {size["posts"]} 篇文章、{size["comments"]} 条评论用时 {seed_seconds:.1f}s')
+
+    cache.clear()
+    anonymous = Client()
+    staff = Client()
+    admin = User.objects.create_user(username='bench-admin', is_staff=True)
+    staff.force_login(admin)
+
+    results = {}
+    print(f'{"页面":<18}{"查询":>6}{"p50(ms)":>10}{"p95(ms)":>10}{"p99(ms)":>10}')
+    for name, (url, as_staff) in pick_targets(vocabulary).items():
+        row = results[name] = measure(staff if as_staff else anonymous, url, args.warmup, args.repeat)
+        print(f'{name:<18}{row["queries"]:>6}{row["p50_ms"]:>10.2f}{row["p95_ms"]:>10.2f}{row["p99_ms"]:>10.2f}')
+
+    report = {
+        'meta': {
+            'profile': args.profile, 'seed': args.seed, **size,
+            'repeat': args.repeat, 'page_cache': args.page_cache,
+            'seed_seconds': round(seed_seconds, 1),
+            'python': platform.python_version(), 'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version, 'machine': platform.machine(),
+            'created_at': timezone.now().isoformat(timespec='seconds'),
+        },
+        'results': results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    if not args.baseline:
+        return
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f'已更新基线 {baseline_path}')
+        return
+    baseline = json.loads(baseline_path.read_text(encoding='utf-8'))
+    dataset = ('seed', 'posts', 'comments', 'page_cache')
+    if any(baseline['meta'].get(key) != report['meta'][key] for key in dataset):
+        print('基线的数据规模或随机种子与本次不同，无法比较')
+        sys.exit(2)
+    failures = compare(results, baseline, args.metric, args.margin, args.query_margin, args.min_delta_ms)
+    if failures:
+        print(f'超出基线（{args.metric}，允许 +{args.margin:.0%}）：')
+        for failure in failures:
+            print(f'  {failure}')
+        sys.exit(1)
+    print(f'全部页面在基线 +{args.margin:.0%} 以内')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
 from .models import Profile, Category, Tag, Post, Comment, SiteSettings
+from .moderation import moderate
 
 
 # ==================== 用户和资料管理 ====================
@@ -83,11 +84,12 @@ class CommentAdmin(admin.ModelAdmin):
     actions = ['approve_comments', 'disapprove_comments']
 
     def approve_comments(self, request, queryset):
-        queryset.update(is_approved=True)
+        # 批量更新不触发信号，由 moderate 调整待审核计数并使页面缓存失效
+        moderate(queryset, 'approve')
     approve_comments.short_description = "批准选中的评论"
 
     def disapprove_comments(self, request, queryset):
-        queryset.update(is_approved=False)
+        moderate(queryset, 'reject')
     disapprove_comments.short_description = "取消批准选中的评论"
 
 
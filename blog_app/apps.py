@@ -4,4 +4,10 @@ from django.apps import AppConfig
 class BlogAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog_app'
-    verbose_name = '博客系统'
\ No newline at end of file
+    verbose_name = '博客系统'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from . import db_router, instrumentation
+        db_router.install()
+        instrumentation.install()
@@ -0,0 +1,50 @@
+"""
+文章归档
+
+按本地时区的月份一次性分组统计已发布文章数，结果缓存到文章发布状态变化为止。
+"""
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Post
+
+HISTOGRAM_CACHE_KEY = 'blog:archive:months'
+
+
+def get_month_histogram():
+    """获取归档月份及文章数 [{'date': date, 'count': int}, ...]，按月份倒序"""
+    histogram = cache.get(HISTOGRAM_CACHE_KEY)
+    if histogram is None:
+        rows = (
+            Post.objects.filter(status='published', published_at__isnull=False)
+            .annotate(month=TruncMonth('published_at', tzinfo=timezone.get_current_timezone()))
+            .values('month')
+            .annotate(count=Count('pk'))
+            .order_by('-month')
+        )
+        histogram = [{'date': row['month'].date(), 'count': row['count']} for row in rows]
+        cache.set(HISTOGRAM_CACHE_KEY, histogram, None)
+    return histogram
+
+
+def invalidate_month_histogram():
+    """文章发布、撤回或删除时清除归档缓存"""
+    cache.delete(HISTOGRAM_CACHE_KEY)
+
+
+def month_range(year, month):
+    """
+    返回本地时区某月的起止时间 [start, end)
+    :raises ValueError: 年月不合法
+    """
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime(year, month, 1), tz)
+    if month == 12:
+        end = timezone.make_aware(datetime(year + 1, 1, 1), tz)
+    else:
+        end = timezone.make_aware(datetime(year, month + 1, 1), tz)
+    return start, end
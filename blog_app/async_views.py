@@ -0,0 +1,97 @@
+"""
+公开页面的异步视图（ASGI）
+
+ASGI 入口（``ASYNC_VIEWS`` 为 True）下首页、文章详情和搜索使用这里的实现，
+WSGI 下仍使用 views.py 中的同步视图，两者共用查询、上下文、模板和整页缓存装饰器。
+
+Django 4.2 的异步 ORM 仍在同一个同步线程中依次执行查询，
+互不依赖的查询因此各自放到线程池中（各自的数据库连接）并发执行。
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import Paginator
+from django.db import close_old_connections
+from django.http import Http404
+from django.shortcuts import render
+
+from .comment_tree import load_comment_page, parse_cursor
+from .models import Post
+from .page_cache import cache_page_for_anonymous
+from .related import get_related_posts
+from .search import search_post_ids
+from .views import (HOME_DB_ERROR_CONTEXT, count_cached_view, home_loaders, post_detail_queryset,
+                    post_validator, record_post_view, render_post_detail, render_search_results,
+                    search_results_queryset)
+
+
+def _in_own_connection(func):
+    """在线程池线程中执行，按 CONN_MAX_AGE 复用或关闭该线程的数据库连接"""
+    def run():
+        close_old_connections()
+        try:
+            return func()
+        finally:
+            close_old_connections()
+    return run
+
+
+async def gather_queries(*funcs):
+    """并发执行互不依赖的查询函数，按顺序返回结果"""
+    return await asyncio.gather(
+        *(sync_to_async(_in_own_connection(func), thread_sensitive=False)() for func in funcs)
+    )
+
+
+def _evaluated(page):
+    # 在查询线程中取出本页文章，模板渲染时不再查询
+    page.object_list = list(page.object_list)
+    return page
+
+
+@cache_page_for_anonymous('post', 'comment')
+async def home(request):
+    """首页视图（异步）"""
+    loaders = home_loaders(request)
+    paginate = loaders['page_obj']
+    loaders['page_obj'] = lambda: _evaluated(paginate())
+    try:
+        results = await gather_queries(*loaders.values())
+        context = dict(zip(loaders, results))
+    except Exception:
+        context = dict(HOME_DB_ERROR_CONTEXT)
+    return await sync_to_async(render)(request, 'blog/home.html', context)
+
+
+@cache_page_for_anonymous(
+    'post',
+    lambda request, slug: f'comments:{slug}',
+    vary_on_params=('comments_after',),
+    on_hit=count_cached_view,
+    validator=post_validator,
+)
+async def post_detail(request, slug):
+    """文章详情页（异步）：取出文章后并发加载评论树、相关文章并记录阅读量"""
+    try:
+        post = await post_detail_queryset().aget(slug=slug, status='published')
+    except Post.DoesNotExist:
+        raise Http404('文章不存在')
+
+    after = parse_cursor(request.GET.get('comments_after'))
+    comment_page, related_posts, pending_views = await gather_queries(
+        lambda: load_comment_page(post, after),
+        lambda: get_related_posts(post),
+        lambda: record_post_view(request, post),
+    )
+    post.views += pending_views
+    return await sync_to_async(render_post_detail)(request, post, comment_page, related_posts)
+
+
+async def search(request):
+    """搜索功能（异步）"""
+    query = request.GET.get('q', '').strip()
+    post_ids = await sync_to_async(search_post_ids)(query) if query else []
+
+    page_obj = Paginator(post_ids, 10).get_page(request.GET.get('page'))
+    posts = await search_results_queryset(page_obj.object_list).ain_bulk()
+    return await sync_to_async(render_search_results)(request, query, page_obj, posts)
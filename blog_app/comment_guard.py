@@ -0,0 +1,282 @@
+"""
+评论防刷
+
+在写数据库之前拦截刷评论：
+1. 按 IP、用户和文章分别维护令牌桶（Redis 不可用时退回进程内字典），令牌按时间连续补充，
+   任一桶不足时拒绝并给出需等待的秒数，三个桶在一次原子操作中检查和扣减；
+2. 最近通过的评论在进程内保留 SimHash 指纹，与其中任一条的海明距离不超过阈值即视为重复内容。
+
+配置项：COMMENT_RATE_LIMITS、COMMENT_DUPLICATE_WINDOW、COMMENT_DUPLICATE_DISTANCE、COMMENT_DUPLICATE_MIN_LENGTH。
+"""
+import re
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+
+BUCKET_KEY = 'blog:throttle:{}:{}'
+
+# 名称 -> (时间窗口内允许的评论数, 时间窗口秒数)
+DEFAULT_RATE_LIMITS = {
+    'ip': (5, 60),
+    'user': (3, 60),
+    'post': (30, 60),
+}
+
+# 对所有桶：先计算补充后的令牌数，全部足够时才一起扣减；返回需等待的秒数（字符串，保留小数）
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local tokens = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local current = tonumber(state[1]) or capacity
+    local last = tonumber(state[2]) or now
+    current = math.min(capacity, current + math.max(0, now - last) * rate)
+    tokens[i] = current
+    if current < 1 then
+        wait = math.max(wait, (1 - current) / rate)
+    end
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    redis.call('HSET', key, 'tokens', tokens[i] - 1, 'ts', now)
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return '0'
+"""
+
+
+def get_rate_limits():
+    return getattr(settings, 'COMMENT_RATE_LIMITS', DEFAULT_RATE_LIMITS)
+
+
+# ==================== 令牌桶限流 ====================
+
+class LocalTokenBuckets:
+    """进程内令牌桶（Redis 不可用时使用）"""
+    # 桶数超过该值时清理已经补满的桶
+    MAX_BUCKETS = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def acquire(self, buckets, now):
+        """
+        :param buckets: [(键, 容量, 每秒补充的令牌数), ...]
+        :return: 需等待的秒数，0 表示已扣减令牌
+        """
+        with self._lock:
+            tokens = []
+            wait = 0
+            for key, capacity, rate in buckets:
+                current, last = self._buckets.get(key, (capacity, now))
+                current = min(capacity, current + max(0, now - last) * rate)
+                tokens.append(current)
+                if current < 1:
+                    wait = max(wait, (1 - current) / rate)
+            if wait:
+                return wait
+            for (key, _, _), current in zip(buckets, tokens):
+                self._buckets[key] = (current - 1, now)
+            if len(self._buckets) > self.MAX_BUCKETS:
+                self._prune(now)
+            return 0
+
+    def _prune(self, now):
+        limits = get_rate_limits()
+        for key, (current, last) in list(self._buckets.items()):
+            count, period = limits.get(key.split(':')[2], (1, 1))
+            if current + (now - last) * count / period >= count:
+                del self._buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self._buckets = {}
+
+
+class RedisTokenBuckets:
+    """基于 Redis 的令牌桶，多个 worker 共享"""
+
+    def __init__(self, client):
+        self.client = client
+        self.script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def acquire(self, buckets, now):
+        args = [now]
+        for _, capacity, rate in buckets:
+            args.extend([capacity, rate])
+        return float(self.script(keys=[key for key, _, _ in buckets], args=args))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(BUCKET_KEY.format('*', '*')))
+        if keys:
+            self.client.delete(*keys)
+
+
+_local_buckets = LocalTokenBuckets()
+_redis_buckets = None
+
+
+def _get_buckets():
+    """默认缓存为 django-redis 时返回 Redis 令牌桶，否则返回进程内令牌桶"""
+    global _redis_buckets
+    try:
+        from django_redis import get_redis_connection
+    except ImportError:
+        return _local_buckets
+    try:
+        client = get_redis_connection('default')
+    except NotImplementedError:
+        return _local_buckets
+    if _redis_buckets is None or _redis_buckets.client is not client:
+        _redis_buckets = RedisTokenBuckets(client)
+    return _redis_buckets
+
+
+def acquire(**identities):
+    """
+    为一次评论从各个桶中各取一个令牌，如 acquire(ip='1.2.3.4', user=1, post='slug')
+    :return: 需等待的秒数，0 表示允许
+    """
+    limits = get_rate_limits()
+    buckets = [
+        (BUCKET_KEY.format(name, value), limits[name][0], limits[name][0] / limits[name][1])
+        for name, value in identities.items()
+        if value is not None and name in limits
+    ]
+    if not buckets:
+        return 0
+    now = time.time()
+    buckets_backend = _get_buckets()
+    if buckets_backend is not _local_buckets:
+        try:
+            return buckets_backend.acquire(buckets, now)
+        except Exception:
+            pass
+    return _local_buckets.acquire(buckets, now)
+
+
+# ==================== 近似重复检测 ====================
+
+SIMHASH_BITS = 64
+DEFAULT_MAX_DISTANCE = 8
+
+TOKEN_RE = re.compile(r'[a-z0-9]+|[^\sa-z0-9]', re.I)
+
+
+def _features(text):
+    """英文按词、其他字符按字切分，单项和相邻两项都作为特征（评论较短，只用二元组时指纹不稳定）"""
+    tokens = [token.lower() for token in TOKEN_RE.findall(text) if token.isalnum()]
+    return tokens + [a + ' ' + b for a, b in zip(tokens, tokens[1:])]
+
+
+def _hash64(feature):
+    # FNV-1a，进程间稳定（内置 hash 会随机化）
+    value = 0xcbf29ce484222325
+    for byte in feature.encode('utf-8'):
+        value = ((value ^ byte) * 0x100000001b3) & 0xffffffffffffffff
+    return value
+
+
+def simhash(text):
+    """计算 64 位 SimHash 指纹，相似文本的指纹只有少数位不同"""
+    weights = [0] * SIMHASH_BITS
+    counts = defaultdict(int)
+    for feature in _features(text):
+        counts[feature] += 1
+    for feature, count in counts.items():
+        value = _hash64(feature)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += count if value >> bit & 1 else -count
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class RecentFingerprints:
+    """
+    最近通过的评论指纹（进程内）
+
+    64 位指纹分成 max_distance + 1 段，海明距离不超过 max_distance 的两个指纹
+    至少有一段完全相同，按段建索引后只需比较同段相同的候选。
+    :param window: 指纹保留秒数
+    :param max_distance: 判定为近似重复的最大海明距离
+    :param max_size: 最多保留的指纹数
+    """
+
+    def __init__(self, window=600, max_distance=DEFAULT_MAX_DISTANCE, max_size=5000):
+        self.window = window
+        self.max_distance = max_distance
+        self.max_size = max_size
+        bounds = [SIMHASH_BITS * index // (max_distance + 1) for index in range(max_distance + 2)]
+        self._ranges = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        self._lock = threading.Lock()
+        self._entries = deque()
+        self._bands = [defaultdict(list) for _ in self._ranges]
+
+    def _band_values(self, fingerprint):
+        return [(fingerprint >> shift) & mask for shift, mask in self._ranges]
+
+    def _expire(self, now):
+        while self._entries and (now - self._entries[0][0] > self.window or len(self._entries) > self.max_size):
+            _, fingerprint = self._entries.popleft()
+            for band, value in zip(self._bands, self._band_values(fingerprint)):
+                band[value].remove(fingerprint)
+                if not band[value]:
+                    del band[value]
+
+    def check_and_add(self, fingerprint):
+        """
+        与最近的指纹比较，不重复时加入
+        :return: 是否为近似重复
+        """
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            values = self._band_values(fingerprint)
+            for band, value in zip(self._bands, values):
+                for candidate in band.get(value, ()):
+                    if hamming_distance(candidate, fingerprint) <= self.max_distance:
+                        return True
+            self._entries.append((now, fingerprint))
+            for band, value in zip(self._bands, values):
+                band[value].append(fingerprint)
+            return False
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bands = [defaultdict(list) for _ in self._ranges]
+
+
+recent_comments = RecentFingerprints(
+    window=getattr(settings, 'COMMENT_DUPLICATE_WINDOW', 600),
+    max_distance=getattr(settings, 'COMMENT_DUPLICATE_DISTANCE', DEFAULT_MAX_DISTANCE),
+)
+
+
+def is_duplicate(content):
+    """评论内容与最近的评论近似重复时返回 True，否则记录其指纹；“谢谢”之类的短评论不检查"""
+    if len(content.strip()) < getattr(settings, 'COMMENT_DUPLICATE_MIN_LENGTH', 20):
+        return False
+    return recent_comments.check_and_add(simhash(content))
+
+
+def reset():
+    """清空限流状态和指纹（测试中使用）"""
+    bucket_backend = _get_buckets()
+    if bucket_backend is not _local_buckets:
+        bucket_backend.clear()
+    _local_buckets.clear()
+    recent_comments.clear()
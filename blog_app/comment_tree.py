@@ -0,0 +1,110 @@
+"""
+评论树
+
+评论按树路径排序即为深度优先顺序，详情页按这一顺序分页：
+每页一次带索引的 LIMIT 查询，最多 ``COMMENT_THREADS_PER_PAGE`` 个顶层话题、``COMMENT_PAGE_SIZE`` 条评论，
+超长话题在页内截断，下一页从截断处继续。评论整理为带 depth 属性的扁平列表，
+模板用一个循环渲染，缩进最多 ``MAX_INDENT`` 级，任意深度都不会递归。
+"""
+import re
+
+from django.conf import settings
+from django.db.models import Value
+
+from .models import Comment
+
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_THREADS_PER_PAGE = 20
+# 超过该深度的回复不再继续缩进
+MAX_INDENT = 6
+
+CURSOR_RE = re.compile(r'^[0-9a-z]{%d,%d}$' % (Comment.PATH_STEP, Comment.MAX_PATH_DEPTH * Comment.PATH_STEP))
+
+
+class CommentPage:
+    """
+    详情页的一页评论
+    :param comments: 深度优先顺序的评论列表，每条带 depth 和 indent 属性
+    :param count: 文章的已审核评论总数
+    :param next_cursor: 下一页的翻页参数（本页最后一条评论的树路径），没有下一页时为 None
+    """
+
+    def __init__(self, comments, count, next_cursor=None, after=''):
+        self.comments = comments
+        self.count = count
+        self.next_cursor = next_cursor
+        self.after = after
+
+
+def parse_cursor(value):
+    """校验翻页参数，无效时从第一页开始"""
+    return value if value and CURSOR_RE.match(value) else ''
+
+
+def _ancestor_ids(comment):
+    path = comment.path[:-Comment.PATH_STEP]
+    ids = {int(path[i:i + Comment.PATH_STEP], 36) for i in range(0, len(path), Comment.PATH_STEP)}
+    ids.add(comment.parent_id)
+    return ids
+
+
+def load_comment_page(post, after=''):
+    """
+    加载文章的一页已审核评论（含用户和资料）
+    :param after: 上一页最后一条评论的树路径，为空时加载第一页
+    :return: CommentPage
+    """
+    page_size = getattr(settings, 'COMMENT_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    threads = getattr(settings, 'COMMENT_THREADS_PER_PAGE', DEFAULT_THREADS_PER_PAGE)
+    # is_approved=True 会被编译为裸布尔条件，无法作为 comment_tree_idx 的等值前缀，
+    # 只能按 post_id 查找后再用临时 B 树排序；改为与参数比较后按索引顺序读取
+    approved = Comment.objects.filter(post=post, is_approved=Value(True))
+    rows = list(
+        approved.filter(path__gt=after)
+        .select_related('user', 'user__profile')
+        .order_by('path', 'pk')[:page_size + 1]
+    )
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    roots = 0
+    for index, comment in enumerate(rows):
+        if comment.parent_id is None:
+            roots += 1
+            if roots > threads:
+                rows, has_next = rows[:index], True
+                break
+
+    # 父评论不在本页（上一页的话题被截断，或父评论未审核）时查询祖先中未审核的评论
+    loaded = {comment.pk for comment in rows}
+    orphans = [comment for comment in rows if comment.parent_id and comment.parent_id not in loaded]
+    hidden = set()
+    if orphans:
+        ancestors = set().union(*(_ancestor_ids(comment) for comment in orphans)) - loaded
+        hidden = set(Comment.objects.filter(pk__in=ancestors, is_approved=False).values_list('pk', flat=True))
+
+    next_cursor = rows[-1].path if has_next and rows else None
+    return CommentPage(build_tree(rows, hidden), approved.count(), next_cursor, after)
+
+
+def build_tree(comments, hidden=frozenset()):
+    """
+    将按树路径排序的评论整理为深度优先的扁平列表，每条评论带 depth（顶层为 0）和 indent 属性
+    父评论未审核的回复不显示；父评论不在列表中时按树路径中的祖先是否在 hidden 中判断
+    """
+    visible = {}
+    seen = set()
+    flat = []
+    for comment in comments:
+        seen.add(comment.pk)
+        if comment.parent_id is None:
+            comment.depth = 0
+        elif comment.parent_id in visible:
+            comment.depth = visible[comment.parent_id].depth + 1
+        elif comment.parent_id in seen or _ancestor_ids(comment) & hidden:
+            continue
+        else:
+            comment.depth = max(len(comment.path) // Comment.PATH_STEP - 1, 1)
+        comment.indent = min(comment.depth, MAX_INDENT)
+        visible[comment.pk] = comment
+        flat.append(comment)
+    return flat
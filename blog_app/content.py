@@ -0,0 +1,233 @@
+"""
+文章内容渲染
+
+保存文章时把 Markdown 正文渲染一次（代码高亮、标题目录），
+渲染结果按白名单清理标签、属性和链接协议后，
+连同纯文本摘要、字数和内容哈希一起存入文章，详情页直接输出存储的 HTML。
+内容哈希未变时跳过渲染；``manage.py render_posts`` 使用进程池批量重新渲染。
+"""
+import hashlib
+import html as html_lib
+import math
+import re
+from collections import namedtuple
+from html.parser import HTMLParser
+
+import markdown
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+# 修改渲染扩展或参数时递增，使已有文章的哈希失效
+# 2: 渲染结果经过白名单清理
+RENDERER_VERSION = 2
+
+MARKDOWN_EXTENSIONS = ['extra', 'codehilite', 'toc', 'sane_lists', 'nl2br']
+MARKDOWN_EXTENSION_CONFIGS = {
+    'codehilite': {'css_class': 'highlight', 'guess_lang': False},
+    'toc': {'toc_depth': '2-4', 'permalink': False},
+}
+
+EXCERPT_LENGTH = 200
+# 中文按字、英文按词计数
+WORD_RE = re.compile(r'[㐀-䶿一-鿿豈-﫿]|[A-Za-z0-9]+(?:[\'’-][A-Za-z0-9]+)*')
+WORDS_PER_MINUTE = 300
+
+RenderedContent = namedtuple('RenderedContent', ['html', 'toc', 'text', 'word_count'])
+
+
+# ==================== HTML 清理 ====================
+
+ALLOWED_TAGS = {
+    'a', 'abbr', 'b', 'blockquote', 'br', 'code', 'dd', 'del', 'div', 'dl', 'dt', 'em',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'img', 'ins', 'kbd', 'li', 'ol', 'p', 'pre',
+    's', 'span', 'strong', 'sub', 'sup', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'u', 'ul',
+}
+# 连同内容一起丢弃的标签
+DROPPED_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'noscript', 'template', 'textarea', 'title'}
+VOID_TAGS = {'br', 'hr', 'img'}
+ALLOWED_ATTRIBUTES = {
+    '*': {'id', 'class', 'title'},
+    'a': {'href'},
+    'abbr': {'title'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'td': {'style', 'colspan', 'rowspan'},
+    'th': {'style', 'colspan', 'rowspan'},
+}
+URL_ATTRIBUTES = {'href', 'src'}
+ALLOWED_SCHEMES = {'http', 'https', 'mailto'}
+SCHEME_RE = re.compile(r'^([a-z][a-z0-9+.-]*):', re.I)
+# 浏览器解析协议时忽略其中的空白和控制字符
+URL_IGNORED_RE = re.compile(r'[\x00-\x20\x7f]+')
+# 表格扩展只输出对齐样式
+STYLE_RE = re.compile(r'^text-align: (left|right|center);?$')
+
+
+def _safe_attribute(tag, name, value):
+    if name not in ALLOWED_ATTRIBUTES['*'] and name not in ALLOWED_ATTRIBUTES.get(tag, ()):
+        return False
+    if value is None:
+        return False
+    if name in URL_ATTRIBUTES:
+        scheme = SCHEME_RE.match(URL_IGNORED_RE.sub('', value))
+        return not scheme or scheme.group(1).lower() in ALLOWED_SCHEMES
+    if name == 'style':
+        return bool(STYLE_RE.match(value))
+    return True
+
+
+class _Sanitizer(HTMLParser):
+    """按白名单重建 HTML：不在白名单中的标签去掉标签保留文本，属性值和文本重新转义，未闭合的标签补齐"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.open_tags = []
+        self.dropping = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.dropping:
+            return
+        if tag in DROPPED_TAGS:
+            self.dropping = tag
+            return
+        if tag not in ALLOWED_TAGS:
+            return
+        safe = ''.join(
+            f' {name}="{html_lib.escape(value)}"' for name, value in attrs if _safe_attribute(tag, name, value)
+        )
+        self.parts.append(f'<{tag}{safe}>')
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        # 自闭合的标签没有内容，不进入丢弃状态
+        if tag in DROPPED_TAGS or self.dropping:
+            return
+        self.handle_starttag(tag, attrs)
+        if tag in ALLOWED_TAGS and tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self.dropping:
+            if tag == self.dropping:
+                self.dropping = None
+            return
+        if tag not in self.open_tags:
+            return
+        while self.open_tags:
+            current = self.open_tags.pop()
+            self.parts.append(f'</{current}>')
+            if current == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.parts.append(html_lib.escape(data, quote=False))
+
+    def result(self):
+        self.close()
+        return ''.join(self.parts) + ''.join(f'</{tag}>' for tag in reversed(self.open_tags))
+
+
+def sanitize_html(html):
+    """只保留白名单中的标签、属性和链接协议（http/https/mailto 及相对地址），去掉脚本和事件属性"""
+    parser = _Sanitizer()
+    parser.feed(html)
+    return parser.result()
+
+
+def content_hash(text):
+    return hashlib.sha256(f'{RENDERER_VERSION}:{text}'.encode('utf-8')).hexdigest()
+
+
+def render_markdown(text):
+    """将 Markdown 渲染为 RenderedContent（纯函数，可在子进程中执行）"""
+    md = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS, extension_configs=MARKDOWN_EXTENSION_CONFIGS)
+    # extra 扩展会原样保留正文中的 HTML，渲染后统一清理
+    html = sanitize_html(md.convert(text or ''))
+    # 没有标题时 toc 扩展仍会输出空列表
+    toc = sanitize_html(md.toc) if md.toc_tokens else ''
+    plain = ' '.join(html_lib.unescape(strip_tags(html)).split())
+    return RenderedContent(html, toc, plain, len(WORD_RE.findall(plain)))
+
+
+def make_excerpt(plain_text):
+    return Truncator(plain_text).chars(EXCERPT_LENGTH)
+
+
+def reading_minutes(word_count):
+    return max(1, math.ceil(word_count / WORDS_PER_MINUTE))
+
+
+def apply_rendered(post, rendered, digest):
+    """把渲染结果写到文章对象上（不保存），返回被修改的字段名"""
+    post.content_html = rendered.html
+    post.toc_html = rendered.toc
+    post.word_count = rendered.word_count
+    post.content_hash = digest
+    fields = ['content_html', 'toc_html', 'word_count', 'content_hash']
+    if not post.excerpt:
+        post.excerpt = make_excerpt(rendered.text)
+        fields.append('excerpt')
+    return fields
+
+
+def render_post(post, force=False):
+    """
+    内容有变化时渲染文章
+    :return: 被修改的字段名列表，未渲染时为空
+    """
+    digest = content_hash(post.content)
+    # 摘要被清空时也需要重新生成
+    if digest == post.content_hash and post.excerpt and not force:
+        return []
+    return apply_rendered(post, render_markdown(post.content), digest)
+
+
+def render_batch(posts, force=False, executor=None):
+    """渲染一批文章（不保存），executor 为进程池时并行渲染，返回被渲染的文章"""
+    pending = []
+    for post in posts:
+        digest = content_hash(post.content)
+        if force or digest != post.content_hash or not post.excerpt:
+            pending.append((post, digest))
+    texts = [post.content for post, _ in pending]
+    results = executor.map(render_markdown, texts, chunksize=16) if executor else map(render_markdown, texts)
+    for (post, digest), rendered in zip(pending, results):
+        apply_rendered(post, rendered, digest)
+    return [post for post, _ in pending]
+
+
+def rerender_posts(workers=None, batch_size=200, force=False):
+    """
+    批量重新渲染内容有变化的文章
+    :param workers: 渲染进程数，为1时在当前进程中渲染
+    :param force: 忽略内容哈希，全部重新渲染
+    :return: 重新渲染的文章数
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    from .models import Post
+    from .page_cache import bump_generation
+
+    posts = Post.objects.only('pk', 'content', 'content_hash', 'excerpt').order_by('pk')
+    fields = ['content_html', 'toc_html', 'word_count', 'content_hash', 'excerpt']
+    rendered, last_pk = 0, 0
+    executor = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+    try:
+        while True:
+            # 按主键分批读取，写回时不持有打开的游标
+            batch = list(posts.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            changed = render_batch(batch, force=force, executor=executor)
+            # bulk_update 不触发信号，也不会重复渲染
+            Post.objects.bulk_update(changed, fields)
+            rendered += len(changed)
+    finally:
+        if executor:
+            executor.shutdown()
+    if rendered:
+        bump_generation('post')
+    return rendered
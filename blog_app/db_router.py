@@ -0,0 +1,226 @@
+"""
+主从数据库路由
+
+``DATABASE_REPLICAS``（别名 -> 权重）非空时启用：公开页面的读查询按权重分配到从库，
+写查询、管理面板和后台的全部查询使用主库（default）。
+
+- 每个请求只选一次从库，同一页面的查询读到同一份数据；
+- 请求中实际执行了写入语句（INSERT/UPDATE/DELETE）后，本请求余下的读查询改用主库，并在响应中设置 Cookie，
+  此后 ``DATABASE_STICKY_SECONDS`` 秒内该用户的读查询仍使用主库（读到自己刚写入的数据）；
+- 页面缓存代数变化后 ``DATABASE_STICKY_SECONDS`` 秒内，填充依赖它的页面缓存的请求改用主库读取，
+  避免把落后的从库上的旧内容写入新代数的缓存（见 ``page_cache``），该时长应大于从库的最大复制延迟；
+- 从库连接失败或查询出错时暂停使用 ``DATABASE_REPLICA_EJECT_SECONDS`` 秒，没有可用从库时退回主库；
+- 请求之外（管理命令、后台线程、静态导出）的查询一律使用主库。
+
+请求状态保存在 ContextVar 中，异步视图在线程池中并发执行的查询沿用同一状态。
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, InterfaceError, OperationalError, connections
+from django.db.backends.signals import connection_created
+
+STICKY_COOKIE = 'blog_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+DEFAULT_PRIMARY_PATHS = ('/dashboard/', '/admin/', '/profile/')
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+_request_state = ContextVar('blog_db_routing', default=None)
+
+
+class RoutingState:
+    """
+    一个请求的路由状态
+    :param use_primary: 整个请求都使用主库（写请求、管理面板、刚写入过的用户）
+    """
+
+    def __init__(self, use_primary):
+        self.use_primary = use_primary
+        self.replica = None
+        self.wrote = False
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', {})
+
+
+@contextmanager
+def untracked():
+    """请求中顺带执行的维护性写入（如阅读量写回）不算作用户写入，其间的查询使用主库"""
+    token = _request_state.set(None)
+    try:
+        yield
+    finally:
+        _request_state.reset(token)
+
+
+def sticky_seconds():
+    return getattr(settings, 'DATABASE_STICKY_SECONDS', 10)
+
+
+def use_primary():
+    """本请求余下的读查询改用主库（如从库可能尚未同步、结果又要写入共享缓存时）"""
+    state = _request_state.get()
+    if state is not None:
+        state.use_primary = True
+
+
+# ==================== 从库健康状态 ====================
+
+_ejected = {}
+_ejected_lock = threading.Lock()
+
+
+def eject(alias):
+    """暂停使用出错的从库"""
+    with _ejected_lock:
+        _ejected[alias] = time.monotonic() + getattr(settings, 'DATABASE_REPLICA_EJECT_SECONDS', 30)
+
+
+def healthy_replicas():
+    """当前可用的从库 {别名: 权重}"""
+    now = time.monotonic()
+    with _ejected_lock:
+        for alias in [alias for alias, until in _ejected.items() if until <= now]:
+            del _ejected[alias]
+        ejected = set(_ejected)
+    return {alias: weight for alias, weight in get_replicas().items() if alias not in ejected and weight > 0}
+
+
+def reset_health():
+    with _ejected_lock:
+        _ejected.clear()
+
+
+def choose_replica():
+    """按权重随机选择可用的从库，连接失败的从库暂停使用后重选；没有可用从库时返回 None"""
+    candidates = healthy_replicas()
+    while candidates:
+        alias = random.choices(list(candidates), weights=list(candidates.values()))[0]
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            eject(alias)
+            del candidates[alias]
+            continue
+        return alias
+    return None
+
+
+def _watch_replica_errors(execute, sql, params, many, context):
+    try:
+        return execute(sql, params, many, context)
+    except (OperationalError, InterfaceError):
+        alias = context['connection'].alias
+        if alias in get_replicas():
+            eject(alias)
+        raise
+
+
+def _track_writes(execute, sql, params, many, context):
+    """
+    实际执行写入语句时标记本请求已写入
+    按语句而不是 db_for_write 判断：get_or_create 等只读到已有记录的操作也会经过 db_for_write
+    """
+    state = _request_state.get()
+    if state is not None and not state.wrote and sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+        state.wrote = True
+    return execute(sql, params, many, context)
+
+
+def _wrap_connection(sender, connection, **kwargs):
+    # 从库配置可能在连接建立后变化（测试中），两个包装器都在执行时按别名判断
+    for wrapper in (_track_writes, _watch_replica_errors):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(wrapper)
+
+
+def install():
+    """为新建的数据库连接加上执行包装器（AppConfig.ready 中调用一次）"""
+    connection_created.connect(_wrap_connection, dispatch_uid='blog_db_router')
+
+
+# ==================== 路由 ====================
+
+class PrimaryReplicaRouter:
+    """读查询按请求状态分配到从库，写查询使用主库"""
+
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is None or state.use_primary or state.wrote:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            state.replica = choose_replica() or DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # 从库的表结构由数据库复制同步
+        return db not in get_replicas()
+
+
+# ==================== 中间件 ====================
+
+class ReplicaRoutingMiddleware:
+    """根据请求方法、路径和粘滞 Cookie 决定本请求的读查询能否使用从库"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _requires_primary(self, request):
+        if request.method not in SAFE_METHODS:
+            return True
+        if request.path.startswith(tuple(getattr(settings, 'DATABASE_PRIMARY_PATHS', DEFAULT_PRIMARY_PATHS))):
+            return True
+        try:
+            return float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def _finish(self, response, state):
+        if state.wrote:
+            window = sticky_seconds()
+            response.set_cookie(STICKY_COOKIE, str(int(time.time() + window)), max_age=window, httponly=True, samesite='Lax')
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not get_replicas():
+            return self.get_response(request)
+        state = RoutingState(self._requires_primary(request))
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self._finish(response, state)
+
+    async def __acall__(self, request):
+        if not get_replicas():
+            return await self.get_response(request)
+        state = RoutingState(self._requires_primary(request))
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self._finish(response, state)
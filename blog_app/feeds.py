@@ -0,0 +1,102 @@
+"""
+RSS/Atom 订阅源
+
+全站最新文章以及按分类、标签的订阅源。视图外层由 ``cache_snapshot`` 缓存，
+文章、分类或标签变化前重复请求不再查询数据库，阅读器轮询时可直接得到 304。
+"""
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+
+from .models import Category, Post, Tag
+from .site_cache import get_site_settings
+
+FEED_ITEMS = 20
+
+
+class LatestPostsFeed(Feed):
+    """全站最新文章"""
+
+    def __init__(self, atom=False):
+        super().__init__()
+        if atom:
+            self.feed_type = Atom1Feed
+            self.subtitle = self.description
+
+    def title(self):
+        return get_site_settings().site_name
+
+    def link(self):
+        return reverse('home')
+
+    def description(self):
+        return get_site_settings().site_description
+
+    def get_queryset(self):
+        return (
+            Post.objects.filter(status='published')
+            .select_related('author')
+            .prefetch_related('tags')
+            .defer(*Post.BODY_FIELDS)
+        )
+
+    def items(self):
+        return self.get_queryset()[:FEED_ITEMS]
+
+    def item_title(self, item):
+        return item.title
+
+    def item_description(self, item):
+        return item.excerpt
+
+    def item_pubdate(self, item):
+        return item.published_at
+
+    def item_updateddate(self, item):
+        return item.updated_at
+
+    def item_author_name(self, item):
+        return item.author.get_full_name() or item.author.username
+
+    def item_categories(self, item):
+        # 标签已预取，不使用 values_list 以免逐篇查询
+        return [tag.name for tag in item.tags.all()]
+
+
+class CategoryPostsFeed(LatestPostsFeed):
+    """某个分类下的最新文章"""
+
+    def get_object(self, request, slug):
+        return get_object_or_404(Category, slug=slug)
+
+    def title(self, obj):
+        return f'{obj.name} - {get_site_settings().site_name}'
+
+    def link(self, obj):
+        return obj.get_absolute_url()
+
+    def description(self, obj):
+        return obj.description or get_site_settings().site_description
+
+    def items(self, obj):
+        return self.get_queryset().filter(category=obj)[:FEED_ITEMS]
+
+
+class TagPostsFeed(LatestPostsFeed):
+    """带有某个标签的最新文章"""
+
+    def get_object(self, request, slug):
+        return get_object_or_404(Tag, slug=slug)
+
+    def title(self, obj):
+        return f'{obj.name} - {get_site_settings().site_name}'
+
+    def link(self, obj):
+        return obj.get_absolute_url()
+
+    def description(self, obj):
+        return get_site_settings().site_description
+
+    def items(self, obj):
+        return self.get_queryset().filter(tags=obj)[:FEED_ITEMS]
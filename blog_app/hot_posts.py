@@ -0,0 +1,188 @@
+"""
+热门文章排行
+
+每篇文章在 Redis 有序集合（不可用时退回进程内字典）中维护一个随时间衰减的热度：
+一次事件的贡献按半衰期指数衰减。为避免每次读取都重算全部分数，采用“前向衰减”——
+新事件按 2^((t - t0) / 半衰期) 放大后累加，相对排名与逐个衰减完全一致，
+读取前N名只需一次 ZREVRANGE。放大系数随时间增长，
+由 ``manage.py compact_hot_posts`` 周期性地把基准时间 t0 挪到当前并同比例缩小全部分数。
+"""
+import heapq
+import threading
+import time
+
+from django.conf import settings
+
+RANKING_KEY = 'blog:hot:ranking'
+ANCHOR_KEY = 'blog:hot:anchor'
+
+VIEW_WEIGHT = 1.0
+COMMENT_WEIGHT = 5.0
+
+# 放大系数超过 2^该值 时立即压缩，防止浮点数溢出
+MAX_HALF_LIVES = 256
+# 压缩时丢弃低于该分数的文章，并只保留前若干篇
+MIN_SCORE = 0.01
+MAX_SIZE = 10000
+
+
+def _half_life():
+    return getattr(settings, 'HOT_POSTS_HALF_LIFE_HOURS', 48) * 3600
+
+
+class LocalHotRanking:
+    """进程内热度排行（Redis 不可用时使用）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._scores = {}
+        self._anchor = None
+
+    def get_anchor(self):
+        with self._lock:
+            if self._anchor is None:
+                self._anchor = time.time()
+            return self._anchor
+
+    def incr(self, post_id, amount):
+        with self._lock:
+            self._scores[post_id] = self._scores.get(post_id, 0.0) + amount
+
+    def top(self, count):
+        with self._lock:
+            return [pk for pk, _ in heapq.nlargest(count, self._scores.items(), key=lambda item: (item[1], item[0]))]
+
+    def remove(self, post_id):
+        with self._lock:
+            self._scores.pop(post_id, None)
+
+    def compact(self, anchor, factor):
+        with self._lock:
+            scores = {pk: score * factor for pk, score in self._scores.items() if score * factor >= MIN_SCORE}
+            self._scores = dict(heapq.nlargest(MAX_SIZE, scores.items(), key=lambda item: item[1]))
+            self._anchor = anchor
+            return len(self._scores)
+
+    def clear(self):
+        with self._lock:
+            self._scores = {}
+            self._anchor = None
+
+
+class RedisHotRanking:
+    """基于 Redis 有序集合的热度排行，多个 worker 共享"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get_anchor(self):
+        anchor = self.client.get(ANCHOR_KEY)
+        if anchor is None:
+            self.client.set(ANCHOR_KEY, time.time(), nx=True)
+            anchor = self.client.get(ANCHOR_KEY)
+        return float(anchor)
+
+    def incr(self, post_id, amount):
+        self.client.zincrby(RANKING_KEY, amount, post_id)
+
+    def top(self, count):
+        return [int(pk) for pk in self.client.zrevrange(RANKING_KEY, 0, count - 1)]
+
+    def remove(self, post_id):
+        self.client.zrem(RANKING_KEY, post_id)
+
+    def compact(self, anchor, factor):
+        # ZUNIONSTORE 带权重地就地缩放全部分数，与更新基准时间在同一事务中执行
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zunionstore(RANKING_KEY, {RANKING_KEY: factor})
+        pipe.zremrangebyscore(RANKING_KEY, '-inf', f'({MIN_SCORE}')
+        pipe.zremrangebyrank(RANKING_KEY, 0, -(MAX_SIZE + 1))
+        pipe.set(ANCHOR_KEY, anchor)
+        pipe.zcard(RANKING_KEY)
+        return pipe.execute()[-1]
+
+    def clear(self):
+        self.client.delete(RANKING_KEY, ANCHOR_KEY)
+
+
+_local_ranking = LocalHotRanking()
+
+
+def _get_ranking():
+    """默认缓存为 django-redis 时返回 Redis 排行，否则返回进程内排行"""
+    try:
+        from django_redis import get_redis_connection
+    except ImportError:
+        return _local_ranking
+    try:
+        return RedisHotRanking(get_redis_connection('default'))
+    except NotImplementedError:
+        return _local_ranking
+
+
+def _call(method, *args):
+    ranking = _get_ranking()
+    if ranking is not _local_ranking:
+        try:
+            return getattr(ranking, method)(*args)
+        except Exception:
+            pass
+    return getattr(_local_ranking, method)(*args)
+
+
+def _boost(anchor, now):
+    return 2 ** ((now - anchor) / _half_life())
+
+
+def record_event(post_id, weight=VIEW_WEIGHT):
+    """记录一次阅读或评论"""
+    now = time.time()
+    anchor = _call('get_anchor')
+    if (now - anchor) / _half_life() > MAX_HALF_LIVES:
+        compact()
+        anchor = now
+    _call('incr', post_id, weight * _boost(anchor, now))
+
+
+def record_view(post_id):
+    record_event(post_id, VIEW_WEIGHT)
+
+
+def record_comment(post_id):
+    record_event(post_id, COMMENT_WEIGHT)
+
+
+def remove_post(post_id):
+    """文章撤回或删除时移出排行"""
+    _call('remove', post_id)
+
+
+def compact():
+    """
+    将基准时间移到当前并按比例缩小全部分数
+    :return: 排行中保留的文章数
+    """
+    now = time.time()
+    anchor = _call('get_anchor')
+    return _call('compact', now, 1 / _boost(anchor, now))
+
+
+def get_hot_post_ids(count):
+    return _call('top', count)
+
+
+def get_hot_posts(limit=5):
+    """
+    获取热门文章，排行中文章不足时按总阅读量补足
+    :return: 已发布文章列表
+    """
+    from .models import Post
+
+    published = Post.objects.filter(status='published')
+    # 多取一些，容忍排行中尚未移除的失效文章
+    ids = get_hot_post_ids(limit * 2)
+    posts = published.in_bulk(ids)
+    result = [posts[pk] for pk in ids if pk in posts][:limit]
+    if len(result) < limit:
+        result.extend(published.exclude(pk__in=[post.pk for post in result]).order_by('-views')[:limit - len(result)])
+    return result
@@ -0,0 +1,168 @@
+"""
+图片处理
+
+上传的位图先在进程池中生成多种尺寸的 WebP/JPEG 版本，再交给上传服务并行上传；
+全部版本上传完成后记录到 ProcessedImage，文章封面和用户头像保存时据此填写各版本地址，
+模板用 ``srcset`` 过滤器输出响应式图片。
+"""
+import io
+import threading
+import uuid
+from collections import namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from PIL import Image, ImageOps
+
+from .uploads import check_folder, set_job, submit_upload
+
+# 名称 -> 最大宽度，原图更窄时不放大
+VARIANTS = {
+    'thumb': 320,
+    'card': 800,
+    'full': 1600,
+}
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+# 动图和矢量图保持原样上传
+PROCESSABLE_TYPES = ('image/jpeg', 'image/png', 'image/webp')
+
+Variant = namedtuple('Variant', ['name', 'format', 'width', 'height', 'data'])
+
+
+def make_variants(data):
+    """
+    生成全部尺寸和格式的图片（纯函数，在子进程中执行）
+    :return: (原图宽, 原图高, [Variant, ...])
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        width, height = image.size
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        variants = []
+        for name, max_width in VARIANTS.items():
+            resized = image
+            if width > max_width:
+                resized = image.resize((max_width, round(height * max_width / width)), Image.LANCZOS)
+            for fmt, (pil_format, _, options) in FORMATS.items():
+                output = resized
+                if pil_format == 'JPEG' and has_alpha:
+                    # JPEG 不支持透明通道，铺白色背景
+                    output = Image.new('RGB', resized.size, (255, 255, 255))
+                    output.paste(resized, mask=resized.getchannel('A'))
+                buffer = io.BytesIO()
+                output.save(buffer, pil_format, **options)
+                variants.append(Variant(name, fmt, *resized.size, buffer.getvalue()))
+        return width, height, variants
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=getattr(settings, 'IMAGE_WORKERS', None))
+        return _pool
+
+
+def shutdown_process_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = None
+
+
+def _record(width, height, variants, urls):
+    from .models import ProcessedImage
+
+    info = {'width': width, 'height': height, 'variants': {}}
+    for variant in variants:
+        entry = info['variants'].setdefault(variant.name, {'width': variant.width, 'height': variant.height})
+        entry[variant.format] = urls[(variant.name, variant.format)]
+    info['url'] = info['variants']['full']['jpeg']
+    try:
+        ProcessedImage.objects.update_or_create(url=info['url'], defaults={'info': info})
+    finally:
+        # 回调在上传线程中执行，用完即关闭该线程的数据库连接
+        connections.close_all()
+    return info
+
+
+def _upload_variants(processing, result, job_id, folder):
+    try:
+        width, height, variants = processing.result()
+        uploads = {
+            (variant.name, variant.format): submit_upload(
+                variant.data, folder=folder, content_type=FORMATS[variant.format][1]
+            )
+            for variant in variants
+        }
+    except Exception as e:
+        set_job(job_id, {'status': 'failed', 'error': str(e)})
+        result.set_exception(e)
+        return
+
+    remaining = [len(uploads)]
+    lock = threading.Lock()
+
+    def uploaded(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        try:
+            info = _record(width, height, variants, {key: future.result() for key, future in uploads.items()})
+        except Exception as e:
+            set_job(job_id, {'status': 'failed', 'error': str(e)})
+            result.set_exception(e)
+        else:
+            set_job(job_id, {'status': 'done', **info})
+            result.set_result(info)
+
+    for future in uploads.values():
+        future.add_done_callback(uploaded)
+
+
+def submit_image(data, folder='images'):
+    """
+    提交图片处理和上传任务，立即返回
+    :return: Future，结果为 {'url', 'width', 'height', 'variants': {名称: {'width', 'height', 'webp', 'jpeg'}}}，
+             job_id 属性为任务ID
+    """
+    check_folder(folder)
+    if hasattr(data, 'read'):
+        data = data.read()
+    result = Future()
+    result.job_id = uuid.uuid4().hex
+    set_job(result.job_id, {'status': 'pending'})
+    processing = get_process_pool().submit(make_variants, data)
+    processing.add_done_callback(lambda done: _upload_variants(done, result, result.job_id, folder))
+    return result
+
+
+def lookup_variants(url):
+    """按图片地址查找已生成的各尺寸版本，找不到时返回空字典"""
+    from .models import ProcessedImage
+
+    if not url:
+        return {}
+    info = ProcessedImage.objects.filter(url=url).values_list('info', flat=True).first()
+    return info or {}
+
+
+def build_srcset(info, fmt='jpeg'):
+    """生成 srcset 属性值，如 "a.jpg 320w, b.jpg 800w" """
+    entries = {}
+    for variant in (info or {}).get('variants', {}).values():
+        if fmt in variant:
+            entries[variant['width']] = variant[fmt]
+    return ', '.join(f'{url} {width}w' for width, url in sorted(entries.items()))
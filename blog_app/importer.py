@@ -0,0 +1,325 @@
+"""
+文章批量导入
+
+逐条读取 JSONL 文件或 Markdown（带 front matter）目录，按批处理：
+每批用前缀查询一次性分配唯一 slug，批量创建缺失的分类和标签，
+bulk_create 写入文章，再通过中间表批量写入标签关联。内存占用只与批大小有关。
+导入时不触发模型信号，结束后统一重建搜索索引、相邻文章、相关文章和统计计数。
+"""
+import hashlib
+import json
+import re
+from datetime import datetime
+from functools import reduce
+from operator import or_
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.text import slugify
+
+from .content import render_batch
+from .models import Category, Post, Tag
+
+# 单条前缀查询包含的 slug 数，避免 SQLite 表达式深度超限
+PREFIX_QUERY_SIZE = 200
+
+FRONT_MATTER_RE = re.compile(r'\A---\s*\n(.*?)\n---\s*(?:\n|\Z)', re.S)
+
+
+class ImportDataError(ValueError):
+    """导入数据格式错误"""
+
+
+# ==================== 读取 ====================
+
+def _parse_value(value):
+    value = value.strip()
+    if value.startswith('[') and value.endswith(']'):
+        return [item.strip().strip('\'"') for item in value[1:-1].split(',') if item.strip()]
+    return value.strip('\'"')
+
+
+def parse_front_matter(text):
+    """
+    解析简单的 YAML front matter（key: value、[a, b] 列表和 “- item” 列表）
+    :return: (元数据字典, 正文)
+    """
+    match = FRONT_MATTER_RE.match(text)
+    if not match:
+        return {}, text
+    meta, key = {}, None
+    for line in match.group(1).splitlines():
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        if line.lstrip().startswith('- ') and key:
+            if not isinstance(meta.get(key), list):
+                meta[key] = []
+            meta[key].append(_parse_value(line.lstrip()[2:]))
+            continue
+        key, _, value = line.partition(':')
+        key = key.strip().lower()
+        meta[key] = _parse_value(value) if value.strip() else []
+    return meta, text[match.end():]
+
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ImportDataError(f'{path} 第 {line_number} 行不是有效的 JSON: {e}') from e
+
+
+def read_markdown_dir(path):
+    for file in sorted(Path(path).rglob('*.md')):
+        meta, body = parse_front_matter(file.read_text(encoding='utf-8'))
+        meta.setdefault('title', file.stem)
+        meta.setdefault('slug', file.stem)
+        meta['content'] = body
+        yield meta
+
+
+def read_source(path):
+    """按路径类型选择读取方式，逐条返回原始记录"""
+    if Path(path).is_dir():
+        return read_markdown_dir(path)
+    return read_jsonl(path)
+
+
+def _as_list(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(',') if item.strip()]
+    return [str(item).strip() for item in value if str(item).strip()]
+
+
+def _parse_moment(value):
+    if not value:
+        return None
+    moment = parse_datetime(str(value))
+    if moment is None:
+        day = parse_date(str(value))
+        if day is None:
+            raise ImportDataError(f'无法识别的时间: {value}')
+        moment = datetime(day.year, day.month, day.day)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def normalize(record):
+    """把 JSONL 或 front matter 中的字段统一为文章字段"""
+    title = str(record.get('title') or '').strip()
+    if not title:
+        raise ImportDataError(f'文章缺少标题: {str(record)[:80]}')
+    categories = _as_list(record.get('category') or record.get('categories'))
+    draft = str(record.get('draft', '')).lower() in ('true', '1', 'yes')
+    status = record.get('status') or ('draft' if draft else 'published')
+    published_at = _parse_moment(record.get('published_at') or record.get('date'))
+    if status == 'published' and published_at is None:
+        published_at = timezone.now()
+    return {
+        'title': title[:255],
+        'slug': slugify(str(record.get('slug') or '')),
+        'content': record.get('content') or '',
+        'excerpt': record.get('excerpt') or record.get('description') or record.get('summary') or '',
+        'category': categories[0][:100] if categories else None,
+        'tags': [tag[:50] for tag in _as_list(record.get('tags'))],
+        'status': status if status in ('draft', 'published') else 'draft',
+        'published_at': published_at if status == 'published' else None,
+        'cover_image': record.get('cover_image') or record.get('cover') or '',
+        'is_featured': str(record.get('is_featured') or record.get('featured') or '').lower() in ('true', '1', 'yes'),
+        'author': record.get('author'),
+    }
+
+
+# ==================== slug 分配 ====================
+
+def slug_base(text, max_length, fallback_prefix):
+    """生成 slug 的基础部分，中文等无法转写的标题使用稳定的哈希"""
+    # 预留 “-数字” 后缀的长度
+    base = slugify(text)[:max_length - 8].strip('-')
+    if not base:
+        base = f'{fallback_prefix}-{hashlib.md5(text.encode("utf-8")).hexdigest()[:8]}'
+    return base
+
+
+def allocate_slugs(model, bases, max_length=None):
+    """
+    为一批基础 slug 分配唯一值（base、base-2、base-3…），每 PREFIX_QUERY_SIZE 个前缀一次查询
+    :return: 与 bases 一一对应的 slug 列表
+    """
+    max_length = max_length or model._meta.get_field('slug').max_length
+    stems = sorted(set(bases))
+    taken = set()
+    for start in range(0, len(stems), PREFIX_QUERY_SIZE):
+        condition = reduce(or_, (Q(slug__startswith=stem) for stem in stems[start:start + PREFIX_QUERY_SIZE]))
+        taken.update(model.objects.filter(condition).values_list('slug', flat=True))
+
+    slugs, counters = [], {}
+    for base in bases:
+        slug, counter = base, counters.get(base, 1)
+        while slug in taken:
+            counter += 1
+            slug = f'{base}-{counter}'[:max_length]
+        counters[base] = counter
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+# ==================== 写入 ====================
+
+class PostImporter:
+    """
+    批量导入文章
+    :param author: 记录中未指定作者时使用的用户
+    :param batch_size: 每批写入的文章数
+    :param executor: 渲染 Markdown 的进程池，为 None 时在当前进程渲染
+    """
+
+    def __init__(self, author, batch_size=1000, executor=None):
+        self.author = author
+        self.batch_size = batch_size
+        self.executor = executor
+        self.categories = {}
+        self.tags = {}
+        self.authors = {author.username: author.pk}
+        self.imported = 0
+        self.skipped = 0
+
+    def run(self, records):
+        batch = []
+        for record in records:
+            batch.append(normalize(record))
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch)
+                batch = []
+        if batch:
+            self.write_batch(batch)
+        return self.imported, self.skipped
+
+    @staticmethod
+    def _match_names(cache, names, rows):
+        """
+        把查到的 (名称, id) 对应到请求的名称：先按原名，再忽略大小写
+        MySQL 常用的排序规则不区分大小写，查询 "django" 会返回已有的 "Django"
+        """
+        rows = list(rows)
+        exact = dict(rows)
+        folded = {}
+        for name, pk in rows:
+            folded.setdefault(name.casefold(), pk)
+        for name in names:
+            pk = exact.get(name) or folded.get(name.casefold())
+            if pk is not None:
+                cache[name] = pk
+
+    def _ensure_named(self, model, cache, names, fallback_prefix):
+        """按名称批量查找或创建分类/标签，{名称: id} 写入 cache；只差大小写的名称对应同一条记录"""
+        missing = {name for name in names if name not in cache}
+        if not missing:
+            return
+        self._match_names(cache, missing, model.objects.filter(name__in=missing).values_list('name', 'pk'))
+        missing = sorted(name for name in missing if name not in cache)
+        if not missing:
+            return
+        # 只差大小写的名称只创建一条（排在前面的写法），否则在不区分大小写的数据库上违反唯一约束
+        distinct = {}
+        for name in missing:
+            distinct.setdefault(name.casefold(), name)
+        distinct = list(distinct.values())
+        max_length = model._meta.get_field('slug').max_length
+        slugs = allocate_slugs(model, [slug_base(name, max_length, fallback_prefix) for name in distinct])
+        model.objects.bulk_create(
+            [model(name=name, slug=slug) for name, slug in zip(distinct, slugs)], ignore_conflicts=True
+        )
+        self._match_names(cache, missing, model.objects.filter(name__in=distinct).values_list('name', 'pk'))
+        unresolved = [name for name in missing if name not in cache]
+        if unresolved:
+            # 数据库排序规则认为相同（如忽略重音）、但名称不只差大小写的记录
+            raise ImportDataError(
+                f'{model._meta.verbose_name}名称与已有记录冲突: {", ".join(unresolved)}'
+            )
+
+    def _resolve_authors(self, usernames):
+        missing = {name for name in usernames if name and name not in self.authors}
+        if missing:
+            self.authors.update(User.objects.filter(username__in=missing).values_list('username', 'pk'))
+
+    def write_batch(self, batch):
+        # 已存在的显式 slug 视为重复导入，跳过
+        explicit = [item['slug'] for item in batch if item['slug']]
+        existing = set(Post.objects.filter(slug__in=explicit).values_list('slug', flat=True))
+        seen = set()
+        items = []
+        for item in batch:
+            if item['slug'] in existing or (item['slug'] and item['slug'] in seen):
+                self.skipped += 1
+                continue
+            seen.add(item['slug'])
+            items.append(item)
+        if not items:
+            return
+
+        max_length = Post._meta.get_field('slug').max_length
+        bases = [
+            item['slug'][:max_length] if item['slug'] else slug_base(item['title'], max_length, 'post')
+            for item in items
+        ]
+        slugs = allocate_slugs(Post, bases)
+
+        self._ensure_named(Category, self.categories, {item['category'] for item in items if item['category']}, 'category')
+        self._ensure_named(Tag, self.tags, {tag for item in items for tag in item['tags']}, 'tag')
+        self._resolve_authors({item['author'] for item in items})
+
+        posts = [
+            Post(
+                title=item['title'], slug=slug, content=item['content'], excerpt=item['excerpt'],
+                category_id=self.categories.get(item['category']),
+                author_id=self.authors.get(item['author'], self.author.pk),
+                status=item['status'], published_at=item['published_at'],
+                cover_image=item['cover_image'], is_featured=item['is_featured'],
+            )
+            for item, slug in zip(items, slugs)
+        ]
+        render_batch(posts, executor=self.executor)
+
+        with transaction.atomic():
+            Post.objects.bulk_create(posts)
+            # MySQL 的 bulk_create 不返回主键，按 slug 取回
+            ids = dict(Post.objects.filter(slug__in=slugs).values_list('slug', 'pk'))
+            Through = Post.tags.through
+            Through.objects.bulk_create(
+                [
+                    Through(post_id=ids[slug], tag_id=self.tags[tag])
+                    for item, slug in zip(items, slugs)
+                    for tag in dict.fromkeys(item['tags'])
+                ],
+                batch_size=5000,
+                ignore_conflicts=True,
+            )
+        self.imported += len(posts)
+
+
+def rebuild_derived_data():
+    """导入不触发信号，结束后重建依赖文章数据的索引、缓存和计数"""
+    from . import archive, neighbors, related, search, stats
+    from .page_cache import bump_generation
+    from .site_cache import invalidate_site_chrome
+
+    search.rebuild_index()
+    neighbors.rebuild_neighbors()
+    related.rebuild_related()
+    stats.reconcile()
+    archive.invalidate_month_histogram()
+    invalidate_site_chrome()
+    bump_generation('post', 'category', 'tag')
@@ -0,0 +1,361 @@
+"""
+请求性能采样
+
+按 ``INSTRUMENTATION_SAMPLE_RATE`` 抽样请求，记录：
+SQL 查询数和耗时、重复执行的查询指纹（N+1 检测）、缓存命中/未命中和耗时、模板渲染耗时。
+结果保存到最近请求的环形缓冲区（Redis 列表，不可用时退回进程内 deque），
+在管理面板 /dashboard/performance/ 查看；``Server-Timing`` 响应头默认只发给管理员或在 DEBUG 下输出，
+``INSTRUMENTATION_SERVER_TIMING = True`` 时发给所有用户。
+
+未被抽中的请求只多一次 ContextVar 读取：数据库执行包装器、缓存和模板计时钩子
+在没有当前记录器时直接调用原方法。异步视图在线程池中并发执行的查询
+通过复制的上下文记到同一个记录器。
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+RING_KEY = 'blog:perf:recent'
+DEFAULT_RING_SIZE = 500
+# 同一指纹执行达到该次数时视为重复查询
+DUPLICATE_THRESHOLD = 2
+# 每个请求最多保留的重复查询指纹数
+MAX_DUPLICATES = 10
+
+_current = ContextVar('blog_request_recorder', default=None)
+_MISSING = object()
+
+_IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+_NUMBER_RE = re.compile(r'\b\d+\b')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """查询指纹：参数已是占位符，再折叠 IN 列表、LIMIT 等中的数字和空白"""
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+class RequestRecorder:
+    """一个请求的计时数据，可能被异步视图的多个线程同时写入"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.fingerprints = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    def query(self, sql, elapsed):
+        key = fingerprint(sql)
+        with self._lock:
+            self.queries += 1
+            self.db_time += elapsed
+            count, total = self.fingerprints.get(key, (0, 0.0))
+            self.fingerprints[key] = (count + 1, total + elapsed)
+
+    def cache(self, hits, misses, elapsed):
+        with self._lock:
+            self.cache_hits += hits
+            self.cache_misses += misses
+            self.cache_time += elapsed
+
+    def duplicates(self):
+        """重复执行的查询 [(指纹, 次数, 总耗时秒)]，按次数降序"""
+        rows = [(sql, count, total) for sql, (count, total) in self.fingerprints.items() if count >= DUPLICATE_THRESHOLD]
+        rows.sort(key=lambda row: (-row[1], -row[2]))
+        return rows[:MAX_DUPLICATES]
+
+    def summary(self, request, response):
+        return {
+            'time': time.time(),
+            'method': request.method,
+            'path': request.path,
+            'view': getattr(request.resolver_match, 'view_name', None),
+            'status': response.status_code,
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 2),
+            'duplicates': [
+                {'sql': sql[:500], 'count': count, 'ms': round(total * 1000, 2)}
+                for sql, count, total in self.duplicates()
+            ],
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_ms': round(self.cache_time * 1000, 2),
+            'template_ms': round(self.template_time * 1000, 2),
+        }
+
+
+def server_timing(entry):
+    """Server-Timing 响应头（浏览器开发者工具的 Timing 面板中显示）"""
+    return ', '.join([
+        f'db;dur={entry["db_ms"]};desc="{entry["queries"]} queries, {len(entry["duplicates"])} duplicated"',
+        f'cache;dur={entry["cache_ms"]};desc="{entry["cache_hits"]} hits, {entry["cache_misses"]} misses"',
+        f'tpl;dur={entry["template_ms"]};desc="templates"',
+        f'total;dur={entry["total_ms"]}',
+    ])
+
+
+# ==================== 钩子 ====================
+
+def _execute_wrapper(execute, sql, params, many, context):
+    recorder = _current.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.query(sql, time.perf_counter() - started)
+
+
+def _wrap_execute(sender, connection, **kwargs):
+    """新建的数据库连接（包括异步视图线程池中的）都加上执行包装器"""
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+def _timed_get(get):
+    @wraps(get)
+    def wrapper(self, key, default=None, *args, **kwargs):
+        recorder = _current.get()
+        if recorder is None:
+            return get(self, key, default, *args, **kwargs)
+        started = time.perf_counter()
+        value = get(self, key, _MISSING, *args, **kwargs)
+        hit = value is not _MISSING
+        recorder.cache(int(hit), int(not hit), time.perf_counter() - started)
+        return value if hit else default
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _timed_get_many(get_many):
+    @wraps(get_many)
+    def wrapper(self, keys, *args, **kwargs):
+        recorder = _current.get()
+        if recorder is None:
+            return get_many(self, keys, *args, **kwargs)
+        keys = list(keys)
+        started = time.perf_counter()
+        values = get_many(self, keys, *args, **kwargs)
+        recorder.cache(len(values), len(keys) - len(values), time.perf_counter() - started)
+        return values
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _timed_render(render):
+    @wraps(render)
+    def wrapper(self, *args, **kwargs):
+        recorder = _current.get()
+        if recorder is None:
+            return render(self, *args, **kwargs)
+        # 只计最外层，render_to_string 嵌套调用不重复累计
+        recorder.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            recorder.template_depth -= 1
+            if not recorder.template_depth:
+                recorder.template_time += time.perf_counter() - started
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _patch(cls, name, decorator):
+    method = getattr(cls, name)
+    if not getattr(method, 'instrumented', False):
+        setattr(cls, name, decorator(method))
+
+
+def install():
+    """安装数据库、缓存和模板钩子（AppConfig.ready 中调用一次）"""
+    from django.core.cache import caches
+    from django.core.cache.backends.base import BaseCache
+    from django.db.backends.signals import connection_created
+    from django.template.backends.django import Template
+
+    connection_created.connect(_wrap_execute, dispatch_uid='blog_instrumentation')
+    for alias in settings.CACHES:
+        backend = type(caches[alias])
+        _patch(backend, 'get', _timed_get)
+        # BaseCache.get_many 逐个调用 get，已经计入
+        if backend.get_many is not BaseCache.get_many:
+            _patch(backend, 'get_many', _timed_get_many)
+    _patch(Template, 'render', _timed_render)
+
+
+# ==================== 环形缓冲区 ====================
+
+def _ring_size():
+    return getattr(settings, 'INSTRUMENTATION_RING_SIZE', DEFAULT_RING_SIZE)
+
+
+class LocalRing:
+    """进程内环形缓冲区（Redis 不可用时使用）"""
+
+    def __init__(self):
+        self._entries = deque(maxlen=_ring_size())
+
+    def push(self, entry):
+        self._entries.appendleft(entry)
+
+    def recent(self, count):
+        return list(self._entries)[:count]
+
+    def clear(self):
+        self._entries.clear()
+
+
+class RedisRing:
+    """基于 Redis 列表的环形缓冲区，所有 worker 共享"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def push(self, entry):
+        pipe = self.client.pipeline()
+        pipe.lpush(RING_KEY, json.dumps(entry, ensure_ascii=False))
+        pipe.ltrim(RING_KEY, 0, _ring_size() - 1)
+        pipe.execute()
+
+    def recent(self, count):
+        return [json.loads(raw) for raw in self.client.lrange(RING_KEY, 0, count - 1)]
+
+    def clear(self):
+        self.client.delete(RING_KEY)
+
+
+_local_ring = LocalRing()
+
+
+def _get_ring():
+    """默认缓存为 django-redis 时返回 Redis 缓冲区，否则返回进程内缓冲区"""
+    try:
+        from django_redis import get_redis_connection
+    except ImportError:
+        return _local_ring
+    try:
+        return RedisRing(get_redis_connection('default'))
+    except NotImplementedError:
+        return _local_ring
+
+
+def _call(method, *args):
+    ring = _get_ring()
+    if ring is not _local_ring:
+        try:
+            return getattr(ring, method)(*args)
+        except Exception:
+            pass
+    return getattr(_local_ring, method)(*args)
+
+
+def record(entry):
+    _call('push', entry)
+
+
+def recent_requests(count=100):
+    """最近采样的请求，新的在前"""
+    return _call('recent', count)
+
+
+def clear():
+    _call('clear')
+
+
+def summarize(entries):
+    """按视图汇总：请求数、耗时中位数和最大值、平均查询数、出现重复查询的请求数"""
+    groups = {}
+    for entry in entries:
+        groups.setdefault(entry.get('view') or entry['path'], []).append(entry)
+    rows = []
+    for name, items in groups.items():
+        totals = sorted(item['total_ms'] for item in items)
+        rows.append({
+            'view': name,
+            'count': len(items),
+            'p50_ms': totals[len(totals) // 2],
+            'max_ms': totals[-1],
+            'avg_queries': round(sum(item['queries'] for item in items) / len(items), 1),
+            'with_duplicates': sum(1 for item in items if item['duplicates']),
+        })
+    rows.sort(key=lambda row: -row['p50_ms'])
+    return rows
+
+
+# ==================== 中间件 ====================
+
+class InstrumentationMiddleware:
+    """按采样率记录请求的查询、缓存和模板耗时，同步和异步请求均可使用"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _sampled(self):
+        rate = getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', 0)
+        return rate > 0 and random.random() < rate
+
+    def _expose_timing(self, request):
+        """Server-Timing 暴露了查询数和缓存情况，不应默认发给匿名访客"""
+        if getattr(settings, 'INSTRUMENTATION_SERVER_TIMING', False) or settings.DEBUG:
+            return True
+        user = getattr(request, 'user', None)
+        return bool(user is not None and user.is_staff)
+
+    def _finish(self, request, response, recorder):
+        entry = recorder.summary(request, response)
+        if self._expose_timing(request):
+            response['Server-Timing'] = server_timing(entry)
+        try:
+            record(entry)
+        except Exception:
+            pass
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+        recorder = RequestRecorder()
+        token = _current.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self._finish(request, response, recorder)
+        return response
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+        recorder = RequestRecorder()
+        token = _current.set(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        await sync_to_async(self._finish)(request, response, recorder)
+        return response
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog_app.hot_posts import compact
+
+
+class Command(BaseCommand):
+    help = '压缩热门文章排行：按时间衰减缩小热度分数并清理冷门文章'
+
+    def handle(self, *args, **options):
+        count = compact()
+        self.stdout.write(self.style.SUCCESS(f'热门文章排行已压缩，保留 {count} 篇文章'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from blog_app.static_export import export_site
+
+
+class Command(BaseCommand):
+    help = '将公开页面导出为静态 HTML 文件（默认只重新生成输入有变化的页面）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_dir', help='输出目录')
+        parser.add_argument('--workers', type=int, default=None, help='渲染进程数，默认为CPU核数')
+        parser.add_argument('--force', action='store_true', help='忽略上次导出的记录，全部重新生成')
+
+    def handle(self, *args, **options):
+        result = export_site(options['output_dir'], workers=options['workers'], force=options['force'])
+        if result.failed:
+            self.stderr.write(self.style.WARNING(f'{result.failed} 个页面导出失败，详见日志'))
+        self.stdout.write(self.style.SUCCESS(
+            f'已渲染 {result.rendered} 个页面（写入 {result.written} 个），'
+            f'跳过 {result.skipped} 个未变化的页面，删除 {result.removed} 个失效页面'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog_app.view_counter import flush_views
+
+
+class Command(BaseCommand):
+    help = '将缓冲的文章阅读量批量写回数据库（建议通过 cron 每分钟执行一次）'
+
+    def handle(self, *args, **options):
+        posts, views = flush_views()
+        self.stdout.write(self.style.SUCCESS(f'已写回 {posts} 篇文章的 {views} 次阅读'))
@@ -0,0 +1,40 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from blog_app.importer import ImportDataError, PostImporter, read_source, rebuild_derived_data
+
+
+class Command(BaseCommand):
+    help = '从 JSONL 文件或 Markdown 目录（带 front matter）批量导入文章'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSONL 文件或包含 .md 文件的目录')
+        parser.add_argument('--author', help='记录中未指定作者时使用的用户名，默认为第一个超级用户')
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批写入的文章数')
+        parser.add_argument('--workers', type=int, default=1, help='渲染 Markdown 的进程数')
+        parser.add_argument('--skip-rebuild', action='store_true', help='导入后不重建搜索索引、相关文章等数据')
+
+    def handle(self, *args, **options):
+        if options['author']:
+            author = User.objects.filter(username=options['author']).first()
+        else:
+            author = User.objects.filter(is_superuser=True).order_by('pk').first()
+        if author is None:
+            raise CommandError('找不到作者用户，请先创建超级用户或使用 --author 指定')
+
+        executor = ProcessPoolExecutor(max_workers=options['workers']) if options['workers'] > 1 else None
+        importer = PostImporter(author, batch_size=options['batch_size'], executor=executor)
+        try:
+            imported, skipped = importer.run(read_source(options['path']))
+        except (ImportDataError, OSError) as e:
+            raise CommandError(f'导入失败（已导入 {importer.imported} 篇）: {e}')
+        finally:
+            if executor:
+                executor.shutdown()
+
+        if imported and not options['skip_rebuild']:
+            self.stdout.write('正在重建搜索索引、相邻文章、相关文章和统计计数...')
+            rebuild_derived_data()
+        self.stdout.write(self.style.SUCCESS(f'已导入 {imported} 篇文章，跳过 {skipped} 篇已存在的文章'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from blog_app.page_cache import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = '查看匿名用户整页缓存的命中统计'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='输出后清零计数')
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total * 100 if total else 0
+        self.stdout.write(f"命中: {stats['hits']}  未命中: {stats['misses']}  命中率: {ratio:.1f}%")
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS('计数已清零'))
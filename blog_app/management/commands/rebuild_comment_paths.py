@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from blog_app.models import Comment
+
+
+class Command(BaseCommand):
+    help = '重新计算全部评论的树路径（用于补全旧数据）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批更新的评论数')
+
+    def handle(self, *args, **options):
+        paths = {}
+        batch = []
+        # 父评论的id总是小于回复的id，按id顺序处理即可保证父路径已算出
+        for comment in Comment.objects.only('pk', 'parent_id', 'path').order_by('pk').iterator():
+            parent_path = paths.get(comment.parent_id, '') if comment.parent_id else ''
+            if len(parent_path) // Comment.PATH_STEP >= Comment.MAX_PATH_DEPTH:
+                parent_path = parent_path[:-Comment.PATH_STEP]
+            comment.path = parent_path + Comment.path_segment(comment.pk)
+            paths[comment.pk] = comment.path
+            batch.append(comment)
+            if len(batch) >= options['batch_size']:
+                Comment.objects.bulk_update(batch, ['path'])
+                batch = []
+        Comment.objects.bulk_update(batch, ['path'])
+        self.stdout.write(self.style.SUCCESS(f'已更新 {len(paths)} 条评论的树路径'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog_app.neighbors import rebuild_neighbors
+
+
+class Command(BaseCommand):
+    help = '重建全部文章的上一篇/下一篇关系'
+
+    def handle(self, *args, **options):
+        count = rebuild_neighbors()
+        self.stdout.write(self.style.SUCCESS(f'已重建 {count} 篇已发布文章的相邻关系'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog_app.related import rebuild_related
+
+
+class Command(BaseCommand):
+    help = '离线重新计算全部文章的相关文章'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批写入的记录数')
+
+    def handle(self, *args, **options):
+        count = rebuild_related(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'已为 {count} 篇已发布文章计算相关文章'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog_app.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = '批量重建文章全文搜索索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='每批写入的文章数')
+
+    def handle(self, *args, **options):
+        indexed = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'已为 {indexed} 篇文章重建索引'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from blog_app.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = '重新统计管理面板计数并校正偏差'
+
+    def handle(self, *args, **options):
+        drift = reconcile()
+        for name, (old, value) in sorted(drift.items()):
+            self.stdout.write(f'{name}: {old} -> {value}')
+        self.stdout.write(self.style.SUCCESS(f'计数校正完成，{len(drift)} 项存在偏差'))
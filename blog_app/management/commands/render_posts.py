@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from blog_app.content import rerender_posts
+
+
+class Command(BaseCommand):
+    help = '使用进程池批量重新渲染文章正文（默认只渲染内容有变化的文章）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='渲染进程数，默认为CPU核数')
+        parser.add_argument('--batch-size', type=int, default=200, help='每批读取和写入的文章数')
+        parser.add_argument('--force', action='store_true', help='忽略内容哈希，全部重新渲染')
+
+    def handle(self, *args, **options):
+        count = rerender_posts(
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            force=options['force'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'已重新渲染 {count} 篇文章'))
@@ -7,11 +7,15 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 import uuid
 
+from .content import reading_minutes, render_post
+from .images import lookup_variants
+
 
 class Profile(models.Model):
     """用户扩展资料模型"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, verbose_name='用户')
     avatar = models.URLField('头像URL', blank=True)
+    avatar_variants = models.JSONField('头像尺寸版本', default=dict, blank=True, editable=False)
     bio = models.TextField('个人简介', max_length=500, blank=True)
     website = models.URLField('个人网站', blank=True)
     github = models.CharField('GitHub', max_length=100, blank=True)
@@ -28,6 +32,11 @@ class Profile(models.Model):
     def __str__(self):
         return f'{self.user.username} 的资料'
 
+    def save(self, *args, **kwargs):
+        if 'avatar' not in self.get_deferred_fields() and self.avatar_variants.get('url') != self.avatar:
+            self.avatar_variants = lookup_variants(self.avatar)
+        super().save(*args, **kwargs)
+
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -106,17 +115,39 @@ class Post(models.Model):
     content = models.TextField('正文内容')
     excerpt = models.TextField('摘要', blank=True)
     cover_image = models.URLField('封面图URL', blank=True)
+    cover_variants = models.JSONField('封面尺寸版本', default=dict, blank=True, editable=False)
     status = models.CharField('状态', max_length=20, choices=STATUS_CHOICES, default='draft')
     is_featured = models.BooleanField('推荐文章', default=False)
     views = models.PositiveIntegerField('阅读量', default=0)
     created_at = models.DateTimeField('创建时间', auto_now_add=True)
     updated_at = models.DateTimeField('更新时间', auto_now=True)
     published_at = models.DateTimeField('发布时间', null=True, blank=True)
+    # 保存时由 content 模块从正文渲染
+    content_html = models.TextField('正文HTML', blank=True, editable=False)
+    toc_html = models.TextField('目录HTML', blank=True, editable=False)
+    word_count = models.PositiveIntegerField('字数', default=0, editable=False)
+    content_hash = models.CharField('内容哈希', max_length=64, blank=True, editable=False)
+    # 按 (published_at, id) 排序的相邻已发布文章，由 neighbors 模块在发布状态变化时维护
+    previous_post = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+', verbose_name='上一篇')
+    next_post = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+', verbose_name='下一篇')
 
     class Meta:
         verbose_name = '文章'
         verbose_name_plural = '文章'
-        ordering = ['-published_at', '-created_at']
+        # 与游标分页的 (published_at, id) 排序保持一致
+        ordering = ['-published_at', '-id']
+        indexes = [
+            # 公开列表：按状态过滤，按发布时间/阅读量排序
+            models.Index(fields=['status', 'published_at'], name='post_status_published_idx'),
+            models.Index(fields=['status', 'views'], name='post_status_views_idx'),
+            models.Index(fields=['status', 'is_featured', 'published_at'], name='post_featured_idx'),
+            models.Index(fields=['category', 'status', 'published_at'], name='post_category_idx'),
+        ]
+
+    # 不随 save() 写入的字段
+    MAINTAINED_FIELDS = ('previous_post', 'next_post')
+    # 列表页不需要的大字段
+    BODY_FIELDS = ('content', 'content_html', 'toc_html')
 
     def __str__(self):
         return self.title
@@ -130,25 +161,62 @@ class Post(models.Model):
         elif self.status == 'draft':
             self.published_at = None
         
-        if not self.excerpt and self.content:
-            self.excerpt = self.content[:200] + '...' if len(self.content) > 200 else self.content
+        # 封面图由图片处理流程上传时，记录各尺寸版本供 srcset 使用
+        if 'cover_image' not in self.get_deferred_fields() and self.cover_variants.get('url') != self.cover_image:
+            self.cover_variants = lookup_variants(self.cover_image)
+        
+        # 正文只在内容变化时重新渲染，并生成纯文本摘要
+        if 'content' not in self.get_deferred_fields():
+            rendered_fields = render_post(self)
+            update_fields = kwargs.get('update_fields')
+            if rendered_fields and update_fields is not None and 'content' in update_fields:
+                kwargs['update_fields'] = set(update_fields) | set(rendered_fields)
+        
+        # 相邻文章字段由 neighbors 模块单独维护，避免用内存中的旧值覆盖
+        if not self._state.adding and not kwargs.get('update_fields') and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.MAINTAINED_FIELDS
+                and field.attname not in deferred
+            ]
         
         super().save(*args, **kwargs)
+        self._loaded_publication = self.publication_marker()
+        self._loaded_status = self.status
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'status' in field_names and 'published_at' in field_names:
+            instance._loaded_publication = instance.publication_marker()
+        if 'status' in field_names:
+            instance._loaded_status = instance.status
+        return instance
+
+    def publication_marker(self):
+        """已发布文章返回发布时间，草稿返回None"""
+        return self.published_at if self.status == 'published' else None
+
+    def publication_changed(self):
+        """发布状态或发布时间是否与数据库中的记录不同（在post_save中使用）"""
+        return getattr(self, '_loaded_publication', None) != self.publication_marker()
 
     def get_absolute_url(self):
         return reverse('post_detail', kwargs={'slug': self.slug})
 
+    @property
+    def reading_minutes(self):
+        """预计阅读时间（分钟）"""
+        return reading_minutes(self.word_count)
+
     def get_previous_post(self):
-        return Post.objects.filter(
-            status='published',
-            published_at__lt=self.published_at
-        ).first()
+        """上一篇（更早发布的文章）"""
+        return self.previous_post
 
     def get_next_post(self):
-        return Post.objects.filter(
-            status='published',
-            published_at__gt=self.published_at
-        ).last()
+        """下一篇（更晚发布的文章）"""
+        return self.next_post
 
 
 class Comment(models.Model):
@@ -161,16 +229,60 @@ class Comment(models.Model):
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies', verbose_name='父评论')
     is_approved = models.BooleanField('已审核', default=False)
     ip_address = models.GenericIPAddressField('IP地址', null=True, blank=True)
+    path = models.CharField('树路径', max_length=760, blank=True, editable=False)
     created_at = models.DateTimeField('创建时间', auto_now_add=True)
 
+    # 树路径中每一级的宽度（base36 编码的 id）
+    PATH_STEP = 7
+    MAX_PATH_DEPTH = 760 // PATH_STEP
+
     class Meta:
         verbose_name = '评论'
         verbose_name_plural = '评论'
         ordering = ['created_at']
+        indexes = [
+            # 详情页评论树：按文章和审核状态过滤，按树路径排序
+            models.Index(fields=['post', 'is_approved', 'path'], name='comment_tree_idx'),
+            # 管理面板审核队列
+            models.Index(fields=['is_approved', 'created_at'], name='comment_moderation_idx'),
+        ]
 
     def __str__(self):
         return f'{self.get_commenter_name()} 对 "{self.post.title}" 的评论'
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_approved = self.is_approved
+        path = self.build_path()
+        if path != self.path:
+            self.path = path
+            Comment.objects.filter(pk=self.pk).update(path=path)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'is_approved' in field_names:
+            instance._loaded_approved = instance.is_approved
+        return instance
+
+    @classmethod
+    def path_segment(cls, pk):
+        digits = ''
+        while pk:
+            pk, remainder = divmod(pk, 36)
+            digits = '0123456789abcdefghijklmnopqrstuvwxyz'[remainder] + digits
+        return digits.rjust(cls.PATH_STEP, '0')
+
+    def build_path(self):
+        """计算树路径：父评论路径 + 本评论id，按路径排序即为深度优先顺序"""
+        if not self.parent_id:
+            return self.path_segment(self.pk)
+        parent_path = self.parent.path or self.parent.build_path()
+        if len(parent_path) // self.PATH_STEP >= self.MAX_PATH_DEPTH:
+            # 超出路径长度时排在父评论的同级位置，树结构仍由 parent 决定
+            parent_path = parent_path[:-self.PATH_STEP]
+        return parent_path + self.path_segment(self.pk)
+
     def get_commenter_name(self):
         if self.user:
             return self.user.username
@@ -213,5 +325,76 @@ class SiteSettings(models.Model):
     @classmethod
     def get_settings(cls):
         """获取网站设置（单例模式）"""
-        settings, created = cls.objects.get_or_create(pk=1)
-        return settings
\ No newline at end of file
+        # 先按读查询取出，记录不存在时才创建，避免每次读取都按写查询路由到主库
+        settings = cls.objects.filter(pk=1).first()
+        if settings is None:
+            settings, created = cls.objects.get_or_create(pk=1)
+        return settings
+
+
+class ProcessedImage(models.Model):
+    """图片处理流程生成的各尺寸版本，按 full 尺寸 JPEG 的地址索引"""
+    url = models.CharField('图片地址', max_length=500, unique=True)
+    info = models.JSONField('尺寸版本', default=dict)
+    created_at = models.DateTimeField('创建时间', auto_now_add=True)
+
+    class Meta:
+        verbose_name = '图片版本'
+        verbose_name_plural = '图片版本'
+
+    def __str__(self):
+        return self.url
+
+
+class SiteCounter(models.Model):
+    """由信号维护的站点统计计数（管理面板使用），可用 reconcile_counters 命令校正"""
+    name = models.CharField('名称', max_length=50, primary_key=True)
+    value = models.BigIntegerField('数值', default=0)
+    updated_at = models.DateTimeField('更新时间', auto_now=True)
+
+    class Meta:
+        verbose_name = '统计计数'
+        verbose_name_plural = '统计计数'
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+
+class SearchDocument(models.Model):
+    """搜索索引文档（每篇已发布文章一条）"""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='search_document', verbose_name='文章')
+    length = models.PositiveIntegerField('词项数', default=0)
+    # 归一化后的关键词 TF-IDF 权重，供相关文章计算使用
+    keywords = models.JSONField('关键词权重', default=dict, blank=True)
+
+    class Meta:
+        verbose_name = '搜索文档'
+        verbose_name_plural = '搜索文档'
+
+
+class SearchPosting(models.Model):
+    """搜索倒排索引项"""
+    term = models.CharField('词项', max_length=64)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='search_postings', verbose_name='文章')
+    frequency = models.PositiveIntegerField('词频', default=1)
+    doc_length = models.PositiveIntegerField('文档词项数', default=0)
+
+    class Meta:
+        verbose_name = '倒排索引'
+        verbose_name_plural = '倒排索引'
+        unique_together = [('term', 'post')]
+
+
+
+class RelatedPost(models.Model):
+    """预计算的相关文章（每篇文章保留得分最高的前K篇）"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_entries', verbose_name='文章')
+    related = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_to', verbose_name='相关文章')
+    score = models.FloatField('相似度', default=0)
+    rank = models.PositiveSmallIntegerField('排名')
+
+    class Meta:
+        verbose_name = '相关文章'
+        verbose_name_plural = '相关文章'
+        unique_together = [('post', 'rank')]
+        ordering = ['post', 'rank']
@@ -0,0 +1,159 @@
+"""
+评论批量审核
+
+按主键列表或筛选条件（所属文章、IP、审核状态）选出评论，按主键分块处理：
+每块用一条 UPDATE（通过/驳回）或按层级的 DELETE（删除，连同回复）完成，
+计数在同一事务中按块调整。批量操作不逐条触发模型信号，
+结束后统一使受影响文章的整页缓存失效。
+"""
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+
+from . import stats
+from .models import Comment, Post
+from .page_cache import bump_generation
+
+ACTIONS = ('approve', 'reject', 'delete')
+CHUNK_SIZE = 500
+
+ModerationResult = namedtuple('ModerationResult', ['action', 'matched', 'affected'])
+
+
+class ModerationError(ValueError):
+    """批量审核参数错误"""
+
+
+def _parse_ids(ids):
+    """评论主键列表只接受整数或数字字符串，其他类型（包括单个字符串）视为无效"""
+    if not isinstance(ids, (list, tuple)):
+        raise ModerationError('评论ID无效')
+    parsed = []
+    for pk in ids:
+        if isinstance(pk, str) and pk.strip().isdigit():
+            pk = int(pk)
+        if type(pk) is not int or pk <= 0:
+            raise ModerationError('评论ID无效')
+        parsed.append(pk)
+    return parsed
+
+
+def select_comments(ids=None, post=None, ip=None, approved=None):
+    """
+    按条件选出评论，至少需要一个条件
+    :param ids: 评论主键列表（整数或数字字符串）
+    :param post: 文章 slug
+    :param ip: 评论者 IP
+    :param approved: True/False 按审核状态筛选，None 不限
+    """
+    ids = _parse_ids(ids) if ids is not None else []
+    if not ids and not post and not ip and approved is None:
+        raise ModerationError('请选择评论或指定筛选条件')
+    comments = Comment.objects.all()
+    if ids:
+        comments = comments.filter(pk__in=ids)
+    if post:
+        comments = comments.filter(post__slug=post)
+    if ip:
+        comments = comments.filter(ip_address=ip)
+    if approved is not None:
+        comments = comments.filter(is_approved=approved)
+    return comments
+
+
+FIELDS = ('pk', 'post_id', 'is_approved', 'parent_id')
+
+
+def _chunks(comments, chunk_size):
+    """按主键顺序分块取出 (主键, 文章id, 是否已审核, 父评论id)"""
+    last_pk = 0
+    while True:
+        rows = list(comments.filter(pk__gt=last_pk).order_by('pk').values_list(*FIELDS)[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last_pk = rows[-1][0]
+
+
+def _set_approved(rows, approved):
+    """一条 UPDATE 修改一块评论的审核状态，返回 (实际修改的行数, 涉及的文章id)"""
+    changed = [row for row in rows if row[2] != approved]
+    if not changed:
+        return 0, set()
+    with transaction.atomic():
+        affected = Comment.objects.filter(
+            pk__in=[row[0] for row in changed], is_approved=not approved
+        ).update(is_approved=approved)
+        stats.adjust(pending_comments=-affected if approved else affected)
+    return affected, {row[1] for row in changed}
+
+
+def _delete_with_replies(rows):
+    """
+    删除一块评论及其全部回复，返回 (删除的行数, 涉及的文章id)
+    逐层查出回复，按树深度从深到浅每层一条 DELETE（MySQL 会立即检查自引用外键）
+    """
+    found = {row[0]: row for row in rows}
+    frontier = list(found)
+    while frontier:
+        replies = Comment.objects.filter(parent_id__in=frontier).values_list(*FIELDS)
+        frontier = []
+        for row in replies:
+            if row[0] not in found:
+                found[row[0]] = row
+                frontier.append(row[0])
+
+    # 从不在本次删除范围内的父评论之下开始逐层向下，得到每条评论的层级（迭代，不受回复链深度限制）；
+    # 被选中的评论本身可能是另一条被选中评论的回复，所以按 parent 关系而不是查出的轮次分层
+    children = defaultdict(list)
+    for pk, row in found.items():
+        if row[3] in found:
+            children[row[3]].append(pk)
+    levels = [[pk for pk, row in found.items() if row[3] not in found]]
+    while levels[-1]:
+        levels.append([child for pk in levels[-1] for child in children[pk]])
+
+    affected = 0
+    with transaction.atomic():
+        for level in reversed(levels[:-1]):
+            queryset = Comment.objects.filter(pk__in=level)
+            # 绕过收集器：回复已按层级处理，不逐条发送删除信号
+            affected += queryset._raw_delete(queryset.db)
+        stats.adjust(
+            total_comments=-affected,
+            pending_comments=-sum(1 for row in found.values() if not row[2]),
+        )
+    return affected, {row[1] for row in found.values()}
+
+
+def moderate(comments, action, chunk_size=CHUNK_SIZE):
+    """
+    对选出的评论执行批量操作
+    :param comments: 评论查询集（select_comments 的结果）
+    :param action: approve（通过）、reject（驳回为待审核）或 delete（删除，连同回复）
+    :return: ModerationResult，affected 为实际修改或删除的评论数（删除包括回复）
+    """
+    if action not in ACTIONS:
+        raise ModerationError(f'未知操作: {action}')
+    matched = affected = 0
+    post_ids = set()
+    try:
+        for rows in _chunks(comments, chunk_size):
+            matched += len(rows)
+            if action == 'delete':
+                count, posts = _delete_with_replies(rows)
+            else:
+                count, posts = _set_approved(rows, action == 'approve')
+            affected += count
+            post_ids |= posts
+    finally:
+        invalidate_comment_pages(post_ids)
+    return ModerationResult(action, matched, affected)
+
+
+def invalidate_comment_pages(post_ids):
+    """批量操作结束后一次性使受影响文章的详情页和列表页缓存失效"""
+    if not post_ids:
+        return
+    slugs = Post.objects.filter(pk__in=post_ids).order_by().values_list('slug', flat=True)
+    bump_generation('comment', *(f'comments:{slug}' for slug in slugs))
@@ -0,0 +1,70 @@
+"""
+上一篇/下一篇的预计算
+
+相邻关系按 (published_at, id) 排序，发布时间相同时以 id 区分先后。
+只在文章发布、撤回、修改发布时间或删除时重新计算受影响的几篇文章。
+"""
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Post
+
+
+def _published():
+    return Post.objects.filter(status='published')
+
+
+def find_neighbors(post):
+    """查询文章当前的 (上一篇id, 下一篇id)"""
+    published_at, pk = post.published_at, post.pk
+    previous_id = _published().filter(
+        Q(published_at__lt=published_at) | Q(published_at=published_at, id__lt=pk)
+    ).order_by('-published_at', '-id').values_list('pk', flat=True).first()
+    next_id = _published().filter(
+        Q(published_at__gt=published_at) | Q(published_at=published_at, id__gt=pk)
+    ).order_by('published_at', 'id').values_list('pk', flat=True).first()
+    return previous_id, next_id
+
+
+def _refresh(post_ids):
+    posts = Post.objects.filter(pk__in=[pk for pk in post_ids if pk]).only('pk', 'status', 'published_at')
+    for post in posts:
+        if post.status == 'published' and post.published_at:
+            previous_id, next_id = find_neighbors(post)
+        else:
+            previous_id = next_id = None
+        Post.objects.filter(pk=post.pk).update(previous_post_id=previous_id, next_post_id=next_id)
+
+
+def relink_post(post):
+    """文章发布状态变化后，更新它自身以及新旧相邻文章的指向"""
+    with transaction.atomic():
+        stored = Post.objects.filter(pk=post.pk).values_list('previous_post_id', 'next_post_id').first()
+        affected = {post.pk, *(stored or ())}
+        if post.status == 'published' and post.published_at:
+            affected.update(find_neighbors(post))
+        _refresh(affected)
+
+
+def unlink_deleted_post(post):
+    """文章删除后，把原来的上一篇和下一篇重新连接"""
+    _refresh({post.previous_post_id, post.next_post_id})
+
+
+def rebuild_neighbors(batch_size=1000):
+    """
+    按发布顺序一次遍历，重建全部文章的相邻关系
+    :return: 已发布文章数
+    """
+    ordered = list(_published().exclude(published_at=None).order_by('published_at', 'id').values_list('pk', flat=True))
+    posts = []
+    for index, pk in enumerate(ordered):
+        posts.append(Post(
+            pk=pk,
+            previous_post_id=ordered[index - 1] if index > 0 else None,
+            next_post_id=ordered[index + 1] if index + 1 < len(ordered) else None,
+        ))
+    with transaction.atomic():
+        Post.objects.exclude(status='published').update(previous_post=None, next_post=None)
+        Post.objects.bulk_update(posts, ['previous_post', 'next_post'], batch_size=batch_size)
+    return len(ordered)
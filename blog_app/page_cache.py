@@ -0,0 +1,310 @@
+"""
+匿名用户整页缓存
+
+页面缓存键由路径、页码以及所依赖数据的“代数”组成。模型保存或删除时
+递增对应代数（存放在共享缓存中，所有 worker 和节点可见），
+依赖它的页面随之自然失效，无需逐个删除缓存键。
+
+缓存键同时作为 ETag：重新验证的请求在渲染之前即可得到 304，
+文章详情页另用一次索引查询得到 Last-Modified 和计数阅读量所需的文章ID。
+
+订阅源、站点地图等与用户无关的响应使用 ``cache_snapshot``：所有用户共享一份快照，
+并以缓存键作为 ETag 应答条件请求。
+
+配置了从库时，代数递增后的一段时间内（``DATABASE_STICKY_SECONDS``）从库可能还没有同步这次写入，
+此时未命中缓存的请求改用主库读取后再写入缓存，以免旧内容在新代数下被缓存到过期为止。
+"""
+import asyncio
+import hashlib
+import time
+from collections import namedtuple
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+from . import db_router
+from .static_export import is_static_export
+
+GENERATION_KEY = 'blog:gen:{}'
+# 代数最近递增过的标记，在从库可能落后的时间内有效
+BUMPED_KEY = 'blog:gen_bumped:{}'
+PAGE_KEY = 'blog:page:{}'
+STATS_KEY = 'blog:page_cache:{}'
+
+# 所有页面都包含导航分类、标签和网站设置
+BASE_DEPENDENCIES = ('category', 'tag', 'settings')
+
+# cache_snapshot 未指定缓存时间时与整页缓存相同
+_PAGE_TIMEOUT = object()
+
+
+def _page_timeout():
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', 300)
+
+
+def _initial_generation():
+    # 代数键被淘汰后以当前时间重新开始，避免与旧页面的代数重复
+    return int(time.time() * 1000)
+
+
+def get_generations(names):
+    """获取多个依赖项的当前代数"""
+    keys = [GENERATION_KEY.format(name) for name in names]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, _initial_generation(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def bump_generation(*names):
+    """递增依赖项代数，使依赖它的页面失效"""
+    if db_router.get_replicas():
+        cache.set_many({BUMPED_KEY.format(name): 1 for name in names}, db_router.sticky_seconds())
+    for name in names:
+        key = GENERATION_KEY.format(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_generation(), None)
+
+
+def _fill_from_primary(names):
+    """
+    依赖项的代数刚递增过时，本请求改用主库读取，返回是否切换
+    未命中缓存、即将执行视图并写入缓存时调用
+    """
+    if not db_router.get_replicas() or not cache.get_many([BUMPED_KEY.format(name) for name in names]):
+        return False
+    db_router.use_primary()
+    return True
+
+
+def _count(name):
+    key = STATS_KEY.format(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def get_stats():
+    """获取页面缓存命中统计 {'hits': int, 'misses': int}"""
+    values = cache.get_many([STATS_KEY.format('hits'), STATS_KEY.format('misses')])
+    return {
+        'hits': values.get(STATS_KEY.format('hits'), 0),
+        'misses': values.get(STATS_KEY.format('misses'), 0),
+    }
+
+
+def reset_stats():
+    cache.delete_many([STATS_KEY.format('hits'), STATS_KEY.format('misses')])
+
+
+def _is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if not getattr(settings, 'PAGE_CACHE_ENABLED', True):
+        return False
+    if request.user.is_authenticated:
+        return False
+    # 导出静态页面时总是重新渲染
+    if is_static_export(request):
+        return False
+    # 有待显示的提示消息时页面内容因人而异
+    if 'messages' in request.COOKIES or '_messages' in getattr(request, 'session', {}):
+        return False
+    return True
+
+
+def _page_key(request, dependencies, vary_on_params):
+    params = '&'.join(f'{name}={request.GET.get(name, "")}' for name in vary_on_params)
+    generations = ':'.join(str(generation) for generation in get_generations(dependencies))
+    raw = f'{request.path}?{params}#{generations}'
+    return PAGE_KEY.format(hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+
+# 条件请求校验值：参与 ETag 的数据、Last-Modified 时间戳（秒）和传给 on_hit 的 meta
+Validation = namedtuple('Validation', ['etag', 'last_modified', 'meta'])
+NO_VALIDATION = Validation((), None, None)
+
+
+def _is_conditional(request):
+    return 'HTTP_IF_NONE_MATCH' in request.META or 'HTTP_IF_MODIFIED_SINCE' in request.META
+
+
+def _make_etag(key, parts):
+    raw = ':'.join([key, *(str(part) for part in parts)])
+    # 页面中的阅读量等细节不影响语义，使用弱 ETag
+    return 'W/"%s"' % hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def _set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # 要求浏览器每次重新验证，304 请求也能计入阅读量
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def cache_page_for_anonymous(*dependencies, vary_on_params=('page', 'cursor'), on_hit=None, validator=None):
+    """
+    匿名用户整页缓存装饰器，同时应答条件请求
+    :param dependencies: 依赖项名称，或 (request, *args, **kwargs) -> 名称 的函数
+    :param vary_on_params: 参与缓存键的查询参数
+    :param on_hit: 命中缓存或返回 304 时调用 on_hit(request, meta)，meta 为视图设置的 response.page_cache_meta
+    :param validator: (request, *args, **kwargs) -> Validation，对象不存在时返回 None；
+                      应只执行一次带索引的查询。未提供时 ETag 只由依赖项代数决定，不查询数据库
+    """
+    def validate(request, args, kwargs):
+        return validator(request, *args, **kwargs) if validator is not None else NO_VALIDATION
+
+    def lookup(request, args, kwargs):
+        """
+        执行视图之前查缓存、应答条件请求
+        :return: (响应, 状态)，响应为 None 时需要执行视图，状态为 None 时视图结果不缓存
+        """
+        if not _is_cacheable_request(request):
+            return None, None
+
+        names = list(BASE_DEPENDENCIES)
+        for dependency in dependencies:
+            names.append(dependency(request, *args, **kwargs) if callable(dependency) else dependency)
+        key = _page_key(request, names, vary_on_params)
+
+        # 条件请求在构建上下文和渲染模板之前应答
+        validation = None
+        if _is_conditional(request):
+            validation = validate(request, args, kwargs)
+            if validation is None:
+                return None, None
+            etag = _make_etag(key, validation.etag)
+            response = get_conditional_response(request, etag=etag, last_modified=validation.last_modified)
+            if response is not None:
+                _count('hits')
+                if on_hit is not None:
+                    on_hit(request, validation.meta)
+                return _set_validators(response, etag, validation.last_modified), None
+
+        cached = cache.get(key)
+        if cached is not None:
+            _count('hits')
+            if on_hit is not None:
+                on_hit(request, cached['meta'])
+            response = HttpResponse(cached['content'], content_type=cached['content_type'])
+            response['X-Page-Cache'] = 'HIT'
+            if cached.get('etag'):
+                _set_validators(response, cached['etag'], cached.get('last_modified'))
+            return response, None
+
+        _count('misses')
+        if _fill_from_primary(names):
+            # 条件请求的校验值可能读自落后的从库，写入缓存前在主库上重新计算
+            validation = None
+        return None, (key, validation)
+
+    def store(request, response, state, args, kwargs):
+        if state is None:
+            return response
+        key, validation = state
+        # 设置了 Cookie（如 CSRF）的响应不能共享
+        if response.status_code == 200 and not response.cookies and not getattr(response, 'streaming', False):
+            validation = validation or validate(request, args, kwargs)
+            entry = {
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'meta': getattr(response, 'page_cache_meta', None),
+            }
+            if validation is not None:
+                entry['etag'] = _make_etag(key, validation.etag)
+                entry['last_modified'] = validation.last_modified
+                _set_validators(response, entry['etag'], entry['last_modified'])
+            cache.set(key, entry, _page_timeout())
+        response['X-Page-Cache'] = 'MISS'
+        return response
+
+    def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                # 缓存读写、会话中的用户和校验查询都是同步操作
+                response, state = await sync_to_async(lookup)(request, args, kwargs)
+                if response is None:
+                    response = await view_func(request, *args, **kwargs)
+                    response = await sync_to_async(store)(request, response, state, args, kwargs)
+                return response
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            response, state = lookup(request, args, kwargs)
+            if response is None:
+                response = store(request, view_func(request, *args, **kwargs), state, args, kwargs)
+            return response
+        return wrapper
+    return decorator
+
+
+def cache_snapshot(*dependencies, vary_on_params=(), timeout=_PAGE_TIMEOUT):
+    """
+    与用户无关的响应（订阅源、站点地图）的共享快照，支持条件请求
+    ETag 由依赖项代数得出，携带 If-None-Match 的请求无需读取快照即可返回 304；
+    Last-Modified 取视图设置的值，没有时为快照生成时间。
+    :param dependencies: 同 cache_page_for_anonymous
+    :param vary_on_params: 参与缓存键的查询参数
+    :param timeout: 快照缓存时间（秒），默认为 ``PAGE_CACHE_TIMEOUT``；
+        代数变化后旧快照的键不会再被访问，只有显式传入 None 时才永不过期
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+
+            names = list(BASE_DEPENDENCIES)
+            for dependency in dependencies:
+                names.append(dependency(request, *args, **kwargs) if callable(dependency) else dependency)
+            key = _page_key(request, names, vary_on_params)
+            etag = quote_etag(key.rsplit(':', 1)[-1])
+
+            if request.META.get('HTTP_IF_NONE_MATCH'):
+                response = get_conditional_response(request, etag=etag)
+                if response is not None:
+                    _count('hits')
+                    response['ETag'] = etag
+                    return response
+
+            snapshot = cache.get(key)
+            if snapshot is None:
+                _count('misses')
+                _fill_from_primary(names)
+                response = view_func(request, *args, **kwargs)
+                if hasattr(response, 'render'):
+                    response.render()
+                if response.status_code != 200:
+                    return response
+                snapshot = {
+                    'content': response.content,
+                    'content_type': response['Content-Type'],
+                    'last_modified': parse_http_date_safe(response.get('Last-Modified', '')) or int(time.time()),
+                }
+                cache.set(key, snapshot, _page_timeout() if timeout is _PAGE_TIMEOUT else timeout)
+            else:
+                _count('hits')
+
+            response = get_conditional_response(request, etag=etag, last_modified=snapshot['last_modified'])
+            if response is None:
+                response = HttpResponse(snapshot['content'], content_type=snapshot['content_type'])
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(snapshot['last_modified'])
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,141 @@
+"""
+文章列表的游标（keyset）分页
+
+按 (published_at, id) 倒序定位，翻页令牌为签名后的不透明字符串，
+任意深度的翻页都只需一次带索引条件的 LIMIT 查询，不再执行 COUNT 和 OFFSET。
+"""
+import hashlib
+import math
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_SALT = 'blog_app.pagination'
+ESTIMATE_CACHE_TIMEOUT = 600
+
+
+def encode_cursor(post, direction):
+    return signing.dumps(
+        {'p': post.published_at.isoformat(), 'i': post.pk, 'd': direction},
+        salt=CURSOR_SALT,
+    )
+
+
+def decode_cursor(token):
+    """解析翻页令牌，返回 (published_at, id, direction)，令牌无效时返回 None"""
+    try:
+        data = signing.loads(token, salt=CURSOR_SALT)
+        return parse_datetime(data['p']), int(data['i']), data['d']
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return None
+
+
+class CursorPage:
+    """游标分页的一页，接口与 django.core.paginator.Page 的常用部分保持一致"""
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return encode_cursor(self.object_list[-1], 'next')
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return encode_cursor(self.object_list[0], 'prev')
+        return None
+
+    @property
+    def estimated_count(self):
+        return self.paginator.estimated_count
+
+    @property
+    def estimated_num_pages(self):
+        return self.paginator.estimated_num_pages
+
+
+class CursorPaginator:
+    """
+    按 (published_at, id) 倒序的游标分页器
+    :param queryset: 只包含已发布文章的查询集；published_at 为空的文章（如用 update() 直接改为已发布）无法定位，不参与分页
+    :param per_page: 每页条数
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset.filter(published_at__isnull=False)
+        self.per_page = per_page
+
+    def get_page(self, cursor=None):
+        position = decode_cursor(cursor) if cursor else None
+        if position is None:
+            rows = list(self.queryset.order_by('-published_at', '-id')[:self.per_page + 1])
+            return CursorPage(rows[:self.per_page], self, len(rows) > self.per_page, False)
+
+        published_at, pk, direction = position
+        if direction == 'prev':
+            rows = list(
+                self.queryset.filter(
+                    Q(published_at__gt=published_at) | Q(published_at=published_at, id__gt=pk)
+                ).order_by('published_at', 'id')[:self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            return CursorPage(rows[:self.per_page][::-1], self, True, has_previous)
+
+        rows = list(
+            self.queryset.filter(
+                Q(published_at__lt=published_at) | Q(published_at=published_at, id__lt=pk)
+            ).order_by('-published_at', '-id')[:self.per_page + 1]
+        )
+        return CursorPage(rows[:self.per_page], self, len(rows) > self.per_page, True)
+
+    @property
+    def estimated_count(self):
+        """估算总条数（缓存的 COUNT 结果，仅在模板使用时计算）"""
+        sql = str(self.queryset.order_by().query)
+        key = 'blog:page_estimate:' + hashlib.md5(sql.encode('utf-8')).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = self.queryset.order_by().count()
+            cache.set(key, count, ESTIMATE_CACHE_TIMEOUT)
+        return count
+
+    @property
+    def estimated_num_pages(self):
+        return max(1, math.ceil(self.estimated_count / self.per_page))
+
+
+def paginate_posts(request, queryset, per_page=10):
+    """
+    按配置选择分页方式；显式传入 page 参数的旧链接仍按页码分页
+    :return: Page 或 CursorPage
+    """
+    mode = getattr(settings, 'PAGINATION_MODE', 'cursor')
+    if mode == 'cursor' and 'page' not in request.GET:
+        return CursorPaginator(queryset, per_page).get_page(request.GET.get('cursor'))
+    return Paginator(queryset, per_page).get_page(request.GET.get('page'))
@@ -0,0 +1,288 @@
+"""
+相关文章
+
+相似度 = 标签向量余弦（按标签 IDF 加权）+ 正文关键词 TF-IDF 余弦 + 同分类加分。
+``manage.py rebuild_related_posts`` 以倒排表逐行做稀疏矩阵自乘，离线计算全部文章的前K篇；
+文章保存时只重算它自身以及与它有共同标签、关键词或分类的文章。
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import Post, RelatedPost, SearchDocument, SearchPosting
+from .search import get_index_stats
+
+TOP_K = 8
+KEYWORDS_PER_POST = 16
+
+TAG_WEIGHT = 1.0
+TEXT_WEIGHT = 1.0
+CATEGORY_WEIGHT = 0.3
+
+# 出现在过多文章中的关键词或标签区分度低，计算时忽略
+MAX_DF_RATIO = 0.2
+MIN_MAX_DF = 50
+
+# 增量更新时最多考察的候选文章数
+MAX_CANDIDATES = 2000
+
+PostTag = Post.tags.through
+
+
+def _idf(df, total):
+    return math.log((1 + total) / (1 + df)) + 1
+
+
+def _normalize(vector):
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    if not norm:
+        return {}
+    return {key: weight / norm for key, weight in vector.items()}
+
+
+def _dot(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(key, 0) for key, weight in a.items())
+
+
+def _max_df(total):
+    return max(MIN_MAX_DF, int(total * MAX_DF_RATIO))
+
+
+def keyword_vector(frequencies, df, total):
+    """按 TF-IDF 选出权重最高的关键词并归一化，单个汉字不作为关键词"""
+    weights = {
+        term: (1 + math.log(frequency)) * _idf(df.get(term, 1), total)
+        for term, frequency in frequencies.items()
+        if len(term) > 1
+    }
+    return _normalize(dict(heapq.nlargest(KEYWORDS_PER_POST, weights.items(), key=itemgetter(1))))
+
+
+def tag_vector(tag_ids, tag_df, total):
+    return _normalize({tag_id: _idf(tag_df.get(tag_id, 1), total) for tag_id in tag_ids})
+
+
+def similarity(a, b):
+    """a、b 为 (关键词向量, 标签向量, 分类id)"""
+    score = TEXT_WEIGHT * _dot(a[0], b[0]) + TAG_WEIGHT * _dot(a[1], b[1])
+    if a[2] and a[2] == b[2]:
+        score += CATEGORY_WEIGHT
+    return score
+
+
+def _top(scores):
+    return heapq.nlargest(TOP_K, scores.items(), key=lambda item: (item[1], item[0]))
+
+
+def _rows(post_id, top):
+    return [
+        RelatedPost(post_id=post_id, related_id=related_id, score=score, rank=rank)
+        for rank, (related_id, score) in enumerate(top)
+    ]
+
+
+# ==================== 离线批量计算 ====================
+
+def _load_keyword_vectors(total):
+    df = dict(SearchPosting.objects.values('term').annotate(df=Count('pk')).values_list('term', 'df'))
+    vectors = {}
+    postings = SearchPosting.objects.filter(post__status='published').order_by('post_id').values_list(
+        'post_id', 'term', 'frequency'
+    )
+    current, frequencies = None, {}
+    for post_id, term, frequency in postings.iterator(chunk_size=10000):
+        if post_id != current:
+            if current is not None:
+                vectors[current] = keyword_vector(frequencies, df, total)
+            current, frequencies = post_id, {}
+        frequencies[term] = frequency
+    if current is not None:
+        vectors[current] = keyword_vector(frequencies, df, total)
+    return vectors
+
+
+def rebuild_related(batch_size=1000):
+    """
+    重新计算全部已发布文章的相关文章
+    :return: 已计算的文章数
+    """
+    ordered = list(
+        Post.objects.filter(status='published')
+        .order_by('-published_at', '-id')
+        .values_list('pk', 'category_id')
+    )
+    categories = dict(ordered)
+    total = len(ordered)
+    max_df = _max_df(total)
+
+    by_category = defaultdict(list)
+    for post_id, category_id in ordered:
+        if category_id and len(by_category[category_id]) <= TOP_K:
+            by_category[category_id].append(post_id)
+
+    post_tags = defaultdict(list)
+    for post_id, tag_id in PostTag.objects.filter(post__status='published').values_list('post_id', 'tag_id'):
+        post_tags[post_id].append(tag_id)
+    tag_df = Counter(tag_id for tag_ids in post_tags.values() for tag_id in tag_ids)
+    tag_vectors = {post_id: tag_vector(tag_ids, tag_df, total) for post_id, tag_ids in post_tags.items()}
+
+    keyword_vectors = _load_keyword_vectors(total)
+    documents = [SearchDocument(post_id=post_id, keywords=vector) for post_id, vector in keyword_vectors.items()]
+    SearchDocument.objects.bulk_update(documents, ['keywords'], batch_size=batch_size)
+
+    # 倒排表：特征 -> [(文章id, 权重)]
+    inverted = defaultdict(list)
+    for vectors, prefix in ((keyword_vectors, 'w'), (tag_vectors, 't')):
+        weight = TEXT_WEIGHT if prefix == 'w' else TAG_WEIGHT
+        for post_id, vector in vectors.items():
+            for key, value in vector.items():
+                inverted[(prefix, key)].append((post_id, weight * value))
+
+    rows = []
+    for post_id, category_id in ordered:
+        # 逐行计算稀疏矩阵 X·Xᵀ 的第 post_id 行
+        scores = defaultdict(float)
+        for vectors, prefix in ((keyword_vectors, 'w'), (tag_vectors, 't')):
+            for key, value in vectors.get(post_id, {}).items():
+                postings = inverted[(prefix, key)]
+                if len(postings) > max_df:
+                    continue
+                for other_id, other_value in postings:
+                    scores[other_id] += value * other_value
+        scores.pop(post_id, None)
+        if category_id:
+            for other_id in scores:
+                if categories.get(other_id) == category_id:
+                    scores[other_id] += CATEGORY_WEIGHT
+            # 没有足够相似文章时用同分类的最新文章补足
+            for other_id in by_category[category_id]:
+                if len(scores) >= TOP_K:
+                    break
+                if other_id != post_id and other_id not in scores:
+                    scores[other_id] = CATEGORY_WEIGHT
+        rows.extend(_rows(post_id, _top(scores)))
+
+    with transaction.atomic():
+        RelatedPost.objects.all().delete()
+        RelatedPost.objects.bulk_create(rows, batch_size=batch_size)
+    return total
+
+
+# ==================== 保存时增量更新 ====================
+
+def compute_keywords(post_id, total):
+    """根据倒排索引计算单篇文章的关键词向量并保存"""
+    frequencies = dict(
+        heapq.nlargest(
+            200,
+            SearchPosting.objects.filter(post_id=post_id).values_list('term', 'frequency'),
+            key=itemgetter(1),
+        )
+    )
+    df = dict(
+        SearchPosting.objects.filter(term__in=list(frequencies))
+        .values('term').annotate(df=Count('pk')).values_list('term', 'df')
+    )
+    vector = keyword_vector(frequencies, df, total)
+    SearchDocument.objects.filter(post_id=post_id).update(keywords=vector)
+    return vector, df
+
+
+def _find_candidates(post, keywords, df, tag_ids, total):
+    max_df = _max_df(total)
+    counts = Counter()
+    for other_id in PostTag.objects.filter(tag_id__in=tag_ids).values_list('post_id', flat=True):
+        counts[other_id] += 2
+    terms = [term for term in keywords if df.get(term, 0) <= max_df]
+    for other_id in SearchPosting.objects.filter(term__in=terms).values_list('post_id', flat=True):
+        counts[other_id] += 1
+    if post.category_id:
+        for other_id in Post.objects.filter(
+            category_id=post.category_id, status='published'
+        ).order_by('-published_at', '-id').values_list('pk', flat=True)[:TOP_K + 1]:
+            counts[other_id] += 1
+    counts.pop(post.pk, None)
+    return [other_id for other_id, _ in counts.most_common(MAX_CANDIDATES)]
+
+
+def _load_profiles(post_ids, total):
+    documents = SearchDocument.objects.filter(
+        post_id__in=post_ids, post__status='published'
+    ).values_list('post_id', 'keywords', 'post__category_id')
+    post_tags = defaultdict(list)
+    for post_id, tag_id in PostTag.objects.filter(post_id__in=post_ids).values_list('post_id', 'tag_id'):
+        post_tags[post_id].append(tag_id)
+    all_tags = {tag_id for tag_ids in post_tags.values() for tag_id in tag_ids}
+    tag_df = dict(
+        PostTag.objects.filter(tag_id__in=all_tags, post__status='published')
+        .values('tag_id').annotate(df=Count('pk')).values_list('tag_id', 'df')
+    )
+    return {
+        post_id: (keywords or {}, tag_vector(post_tags[post_id], tag_df, total), category_id)
+        for post_id, keywords, category_id in documents
+    }
+
+
+def remove_post(post_id):
+    """文章撤回时从所有相关文章列表中移除"""
+    RelatedPost.objects.filter(Q(post_id=post_id) | Q(related_id=post_id)).delete()
+
+
+def update_post(post):
+    """重新计算文章的相关文章，并把它合并进候选文章各自的列表"""
+    if post.status != 'published':
+        remove_post(post.pk)
+        return
+
+    total = get_index_stats()[0]
+    keywords, df = compute_keywords(post.pk, total)
+    tag_ids = list(PostTag.objects.filter(post_id=post.pk).values_list('tag_id', flat=True))
+    candidates = _find_candidates(post, keywords, df, tag_ids, total)
+    profiles = _load_profiles([post.pk, *candidates], total)
+    profile = profiles.pop(post.pk, None)
+    if profile is None:
+        return
+
+    scores = {other_id: similarity(profile, other) for other_id, other in profiles.items()}
+    scores = {other_id: score for other_id, score in scores.items() if score > 0}
+
+    existing = defaultdict(dict)
+    for owner_id, related_id, score in RelatedPost.objects.filter(
+        Q(post_id__in=list(scores)) | Q(related_id=post.pk)
+    ).values_list('post_id', 'related_id', 'score'):
+        existing[owner_id][related_id] = score
+
+    changed = {post.pk: _top(scores)}
+    for owner_id in set(scores) | set(existing):
+        if owner_id == post.pk:
+            continue
+        entries = {related_id: score for related_id, score in existing[owner_id].items() if related_id != post.pk}
+        if owner_id in scores:
+            entries[post.pk] = scores[owner_id]
+        top = _top(entries)
+        if top != _top(existing[owner_id]):
+            changed[owner_id] = top
+
+    with transaction.atomic():
+        RelatedPost.objects.filter(post_id__in=list(changed)).delete()
+        RelatedPost.objects.bulk_create([row for owner_id, top in changed.items() for row in _rows(owner_id, top)])
+
+
+def get_related_posts(post, limit=4):
+    """读取预计算的相关文章；尚未计算时退回同分类的最新文章"""
+    related = list(
+        Post.objects.filter(related_to__post=post, status='published')
+        .order_by('related_to__rank')[:limit]
+    )
+    if not related and post.category_id:
+        related = list(
+            Post.objects.filter(category_id=post.category_id, status='published')
+            .exclude(pk=post.pk)[:limit]
+        )
+    return related
@@ -0,0 +1,163 @@
+"""
+站内全文搜索
+
+中文按二元组（bigram）切分（索引时另加单字，单字查询也能命中）、拉丁字母和数字按单词切分，
+文章保存/删除时增量维护倒排索引，查询时按 BM25 排序。
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count
+
+from .models import Post, SearchDocument, SearchPosting
+
+TOKEN_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9]+')
+MAX_TERM_LENGTH = 64
+
+# 标题中的词项按该倍数计入词频
+TITLE_WEIGHT = 3
+
+STATS_CACHE_KEY = 'blog:search:stats'
+STATS_CACHE_TIMEOUT = 300
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text):
+    """将文本切分为词项列表"""
+    tokens = []
+    for chunk in TOKEN_RE.findall((text or '').lower()):
+        if chunk[0].isascii():
+            tokens.append(chunk[:MAX_TERM_LENGTH])
+        elif len(chunk) == 1:
+            tokens.append(chunk)
+        else:
+            tokens.extend(chunk[i:i + 2] for i in range(len(chunk) - 1))
+    return tokens
+
+
+def index_terms(text):
+    """索引用的词项：在 tokenize 的基础上加入较长中文片段中的单字"""
+    tokens = tokenize(text)
+    for chunk in TOKEN_RE.findall((text or '').lower()):
+        if not chunk[0].isascii() and len(chunk) > 1:
+            tokens.extend(chunk)
+    return tokens
+
+
+def analyze_post(post):
+    """统计文章的词频，返回 (Counter, 文档长度)"""
+    frequencies = Counter(index_terms(post.title) * TITLE_WEIGHT)
+    frequencies.update(index_terms(post.excerpt))
+    frequencies.update(index_terms(post.content))
+    return frequencies, sum(frequencies.values())
+
+
+def _build_rows(post):
+    frequencies, length = analyze_post(post)
+    document = SearchDocument(post_id=post.pk, length=length)
+    postings = [
+        SearchPosting(term=term, post_id=post.pk, frequency=frequency, doc_length=length)
+        for term, frequency in frequencies.items()
+    ]
+    return document, postings
+
+
+def index_post(post):
+    """更新单篇文章的索引，未发布的文章会被移出索引"""
+    with transaction.atomic():
+        remove_post(post.pk)
+        if post.status != 'published':
+            return
+        document, postings = _build_rows(post)
+        document.save()
+        SearchPosting.objects.bulk_create(postings)
+    cache.delete(STATS_CACHE_KEY)
+
+
+def remove_post(post_id):
+    """将文章移出索引"""
+    SearchPosting.objects.filter(post_id=post_id).delete()
+    SearchDocument.objects.filter(post_id=post_id).delete()
+
+
+def rebuild_index(batch_size=500):
+    """
+    批量重建全部索引
+    :return: 已索引的文章数
+    """
+    posts = (
+        Post.objects.filter(status='published')
+        .only('pk', 'title', 'excerpt', 'content')
+        .order_by('pk')
+    )
+    indexed = 0
+    with transaction.atomic():
+        SearchPosting.objects.all().delete()
+        SearchDocument.objects.all().delete()
+
+        documents, postings = [], []
+        for post in posts.iterator(chunk_size=batch_size):
+            document, rows = _build_rows(post)
+            documents.append(document)
+            postings.extend(rows)
+            indexed += 1
+            if len(documents) >= batch_size:
+                SearchDocument.objects.bulk_create(documents)
+                SearchPosting.objects.bulk_create(postings, batch_size=5000)
+                documents, postings = [], []
+        SearchDocument.objects.bulk_create(documents)
+        SearchPosting.objects.bulk_create(postings, batch_size=5000)
+    cache.delete(STATS_CACHE_KEY)
+    return indexed
+
+
+def get_index_stats():
+    """获取索引统计信息 (文档总数, 平均文档长度)，结果短暂缓存"""
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        result = SearchDocument.objects.aggregate(total=Count('pk'), avg_length=Avg('length'))
+        stats = (result['total'], result['avg_length'] or 1)
+        cache.set(STATS_CACHE_KEY, stats, STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def search_post_ids(query):
+    """
+    按 BM25 得分返回匹配的文章ID列表（须包含全部查询词项）
+    :param query: 查询字符串
+    :return: 按相关度降序排列的文章ID列表
+    """
+    terms = set(tokenize(query))
+    if not terms:
+        return []
+
+    postings = defaultdict(dict)
+    lengths = {}
+    for term, post_id, frequency, doc_length in SearchPosting.objects.filter(
+        term__in=terms
+    ).values_list('term', 'post_id', 'frequency', 'doc_length'):
+        postings[term][post_id] = frequency
+        lengths[post_id] = doc_length
+    if len(postings) < len(terms):
+        return []
+
+    candidates = set.intersection(*(set(docs) for docs in postings.values()))
+    if not candidates:
+        return []
+
+    total, avg_length = get_index_stats()
+    scores = Counter()
+    for docs in postings.values():
+        idf = math.log(1 + (max(total - len(docs), 0) + 0.5) / (len(docs) + 0.5))
+        for post_id in candidates:
+            frequency = docs[post_id]
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[post_id] / avg_length)
+            scores[post_id] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+    return sorted(candidates, key=lambda post_id: (-scores[post_id], -post_id))
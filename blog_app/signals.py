@@ -0,0 +1,149 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from . import archive, hot_posts, neighbors, related, search, stats
+from .models import Post, Category, Tag, Comment, SiteSettings
+from .page_cache import bump_generation
+from .site_cache import invalidate_site_chrome
+
+
+@receiver(post_save, sender=Post)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    """文章保存后增量更新搜索索引（删除时索引随外键级联删除）"""
+    if not raw:
+        search.index_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def update_related_posts(sender, instance, raw=False, **kwargs):
+    """搜索索引更新后重算相关文章（依赖索引中的词频）"""
+    if not raw:
+        related.update_post(instance)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def update_related_posts_on_tags(sender, instance, action, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        related.update_post(instance)
+    elif action != 'post_clear':
+        for post in Post.objects.filter(pk__in=kwargs['pk_set'], status='published'):
+            related.update_post(post)
+
+
+@receiver(post_save, sender=Post)
+def publication_changed(sender, instance, raw=False, **kwargs):
+    """文章发布、撤回或修改发布时间时清除归档缓存并更新相邻文章"""
+    if raw or not instance.publication_changed():
+        return
+    archive.invalidate_month_histogram()
+    neighbors.relink_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def published_post_deleted(sender, instance, **kwargs):
+    """已发布文章删除时清除归档缓存并重新连接相邻文章"""
+    if instance.status == 'published':
+        archive.invalidate_month_histogram()
+        neighbors.unlink_deleted_post(instance)
+        hot_posts.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def remove_unpublished_hot_post(sender, instance, raw=False, **kwargs):
+    if not raw and instance.status != 'published':
+        hot_posts.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment_hotness(sender, instance, created, raw=False, **kwargs):
+    """新评论提高所属文章的热度"""
+    if created and not raw:
+        hot_posts.record_comment(instance.post_id)
+
+
+for model in (SiteSettings, Category, Tag):
+    post_save.connect(invalidate_site_chrome, sender=model, dispatch_uid=f'site_chrome_save_{model.__name__}')
+    post_delete.connect(invalidate_site_chrome, sender=model, dispatch_uid=f'site_chrome_delete_{model.__name__}')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, **kwargs):
+    bump_generation('post')
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def invalidate_post_pages_on_tags(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_generation('post')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, created=False, **kwargs):
+    """
+    评论变化只影响所属文章详情页和显示评论数的列表页
+    页面只显示已审核的评论，审核前后都未通过的评论不使缓存失效
+    """
+    was_approved = not created and getattr(instance, '_loaded_approved', True)
+    if not (instance.is_approved or was_approved):
+        return
+    try:
+        slug = instance.post.slug
+    except Post.DoesNotExist:
+        bump_generation('comment')
+    else:
+        bump_generation('comment', f'comments:{slug}')
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_pages(sender, **kwargs):
+    bump_generation('category')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_pages(sender, **kwargs):
+    bump_generation('tag')
+
+
+@receiver(post_save, sender=SiteSettings)
+def invalidate_settings_pages(sender, **kwargs):
+    bump_generation('settings')
+
+
+# ==================== 管理面板统计计数 ====================
+
+@receiver(post_save, sender=Post)
+def count_post_saved(sender, instance, created, raw=False, **kwargs):
+    stats.post_saved(instance, created)
+
+
+@receiver(post_delete, sender=Post)
+def count_post_deleted(sender, instance, **kwargs):
+    stats.post_deleted(instance)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment_saved(sender, instance, created, raw=False, **kwargs):
+    stats.comment_saved(instance, created)
+
+
+@receiver(post_delete, sender=Comment)
+def count_comment_deleted(sender, instance, **kwargs):
+    stats.comment_deleted(instance)
+
+
+for model, counter in ((User, 'total_users'), (Category, 'total_categories'), (Tag, 'total_tags')):
+    post_save.connect(
+        lambda sender, created, counter=counter, **kwargs: stats.object_saved(counter, created),
+        sender=model, weak=False, dispatch_uid=f'stats_save_{model.__name__}',
+    )
+    post_delete.connect(
+        lambda sender, counter=counter, **kwargs: stats.object_deleted(counter),
+        sender=model, weak=False, dispatch_uid=f'stats_delete_{model.__name__}',
+    )
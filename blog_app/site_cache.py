@@ -0,0 +1,76 @@
+"""
+站点公共数据（网站设置、导航分类和标签）的两级缓存
+
+每个进程保留一份副本，并以共享缓存中的版本号校验；
+版本号变化后先从共享缓存读取，仍未命中才查询数据库。
+"""
+import uuid
+
+from django.core.cache import cache
+
+NAV_CATEGORY_LIMIT = 10
+NAV_TAG_LIMIT = 20
+
+
+class LayeredCache:
+    """进程内副本 + 共享缓存，通过版本号统一失效"""
+
+    def __init__(self, namespace, timeout=None):
+        self.namespace = namespace
+        self.version_key = f'{namespace}:version'
+        self.timeout = timeout
+        self._local = {}
+        self._local_version = None
+
+    def current_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, uuid.uuid4().hex, None)
+            version = cache.get(self.version_key)
+        return version
+
+    def get(self, name, loader):
+        """读取缓存项，未命中时调用 loader() 加载"""
+        version = self.current_version()
+        if version != self._local_version:
+            self._local = {}
+            self._local_version = version
+        if name in self._local:
+            return self._local[name]
+
+        key = f'{self.namespace}:{version}:{name}'
+        value = cache.get(key)
+        if value is None:
+            value = loader()
+            cache.set(key, value, self.timeout)
+        self._local[name] = value
+        return value
+
+    def invalidate(self):
+        """更换版本号，使所有进程的副本失效"""
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+        self._local = {}
+        self._local_version = None
+
+
+site_chrome = LayeredCache('blog:chrome')
+
+
+def get_site_settings():
+    from .models import SiteSettings
+    return site_chrome.get('settings', SiteSettings.get_settings)
+
+
+def get_nav_categories():
+    from .models import Category
+    return site_chrome.get('categories', lambda: list(Category.objects.all()[:NAV_CATEGORY_LIMIT]))
+
+
+def get_nav_tags():
+    from .models import Tag
+    return site_chrome.get('tags', lambda: list(Tag.objects.all()[:NAV_TAG_LIMIT]))
+
+
+def invalidate_site_chrome(**kwargs):
+    """网站设置、分类或标签变化时调用（可直接作为信号接收函数）"""
+    site_chrome.invalidate()
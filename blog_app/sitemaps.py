@@ -0,0 +1,52 @@
+"""
+站点地图
+
+按文章、分类、标签分段，每段最多 SITEMAP_LIMIT 条，站点地图索引列出全部分段。
+与订阅源一样由 ``cache_snapshot`` 缓存，爬虫不必再逐页抓取首页来发现文章。
+"""
+from django.contrib.sitemaps import Sitemap
+from django.db.models import Max
+
+from .models import Category, Post, Tag
+
+SITEMAP_LIMIT = 10000
+
+
+class PostSitemap(Sitemap):
+    limit = SITEMAP_LIMIT
+    changefreq = 'weekly'
+    priority = 0.8
+
+    def items(self):
+        return Post.objects.filter(status='published').only('slug', 'updated_at').order_by('pk')
+
+    def lastmod(self, item):
+        return item.updated_at
+
+    def get_latest_lastmod(self):
+        return Post.objects.filter(status='published').aggregate(latest=Max('updated_at'))['latest']
+
+
+class CategorySitemap(Sitemap):
+    limit = SITEMAP_LIMIT
+    changefreq = 'weekly'
+    priority = 0.5
+
+    def items(self):
+        return Category.objects.only('slug').order_by('pk')
+
+
+class TagSitemap(Sitemap):
+    limit = SITEMAP_LIMIT
+    changefreq = 'weekly'
+    priority = 0.3
+
+    def items(self):
+        return Tag.objects.only('slug').order_by('pk')
+
+
+SITEMAPS = {
+    'posts': PostSitemap,
+    'categories': CategorySitemap,
+    'tags': TagSitemap,
+}
@@ -0,0 +1,305 @@
+"""
+静态站点导出
+
+把首页、分类/标签/归档列表的每一页以及全部文章详情页渲染为 HTML 文件，
+高峰期可由 Nginx 直接提供。页面在进程池中渲染，每个进程使用自己的数据库连接。
+
+每个页面的“输入签名”由它展示的文章主键和 updated_at、评论数、相邻/相关文章
+以及站点公共数据（设置、导航、模板）计算；输出目录中的 manifest 记录上次导出的
+签名和页面内容哈希，签名未变的页面直接跳过，内容未变的页面不重写文件。
+
+列表第 N 页（N > 1）写入 ``<路径>/page/N/index.html``，对应 Nginx 配置::
+
+    try_files $uri/page/$arg_page/index.html $uri/index.html @django;
+"""
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
+import os
+import uuid
+from collections import defaultdict, namedtuple
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connections
+from django.db.models import Count, Sum
+from django.http import Http404
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = '.manifest.json'
+# 修改导出逻辑时递增，使已有页面全部重新生成
+EXPORT_VERSION = 1
+PER_PAGE = 10
+# 请求环境中的标记：导出请求不计阅读量、不读写整页缓存（客户端无法伪造非 HTTP_ 开头的键）
+EXPORT_ENVIRON_KEY = 'blog.static_export'
+
+Page = namedtuple('Page', ['url', 'path', 'inputs'])
+ExportResult = namedtuple('ExportResult', ['rendered', 'written', 'skipped', 'removed', 'failed'])
+
+
+def is_static_export(request):
+    return bool(request.META.get(EXPORT_ENVIRON_KEY))
+
+
+def _digest(*parts):
+    raw = json.dumps(parts, default=str, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def output_path(url_path, number=1):
+    """页面在输出目录中的相对路径"""
+    parts = [part for part in url_path.split('/') if part]
+    if number > 1:
+        parts += ['page', str(number)]
+    return '/'.join(parts + ['index.html'])
+
+
+# ==================== 页面枚举 ====================
+
+def _template_fingerprint():
+    """模板文件的路径和修改时间，模板更新后全部页面重新生成"""
+    dirs = [Path(d) for config in settings.TEMPLATES for d in config.get('DIRS', [])]
+    dirs.append(Path(__file__).resolve().parent / 'templates')
+    entries = []
+    for directory in dirs:
+        if directory.is_dir():
+            entries.extend(
+                (str(file.relative_to(directory)), file.stat().st_mtime_ns)
+                for file in sorted(directory.rglob('*.html'))
+            )
+    return entries
+
+
+def site_fingerprint():
+    """所有页面共用的输入：网站设置、分类和标签、模板及渲染版本"""
+    from .content import RENDERER_VERSION
+    from .models import Category, SiteSettings, Tag
+
+    # 页面渲染时会创建默认设置，先创建以免首次导出后签名变化
+    SiteSettings.get_settings()
+    return _digest(
+        EXPORT_VERSION,
+        RENDERER_VERSION,
+        list(SiteSettings.objects.order_by('pk').values()),
+        list(Category.objects.order_by('pk').values_list('pk', 'name', 'slug')),
+        list(Tag.objects.order_by('pk').values_list('pk', 'name', 'slug')),
+        _template_fingerprint(),
+    )
+
+
+def _listing(url_path, rows, site, per_page, extra=()):
+    """
+    列表的全部分页
+    :param rows: 按展示顺序排列的 (主键, updated_at)
+    """
+    num_pages = max(1, math.ceil(len(rows) / per_page))
+    for number in range(1, num_pages + 1):
+        chunk = rows[(number - 1) * per_page:number * per_page]
+        yield Page(
+            f'{url_path}?page={number}',
+            output_path(url_path, number),
+            _digest(site, num_pages, chunk, *(extra if number == 1 else ())),
+        )
+
+
+def collect_pages(per_page=PER_PAGE):
+    """枚举需要导出的全部页面及其输入签名，查询次数与文章数无关"""
+    from . import hot_posts
+    from .models import Category, Comment, Post, RelatedPost, Tag
+
+    site = site_fingerprint()
+    posts = list(
+        Post.objects.filter(status='published').values_list(
+            'pk', 'slug', 'updated_at', 'published_at', 'category_id',
+            'previous_post_id', 'next_post_id', 'is_featured',
+        )
+    )
+    stamps = {row[0]: row[2] for row in posts}
+    rows = [(row[0], row[2]) for row in posts]
+
+    post_tags = defaultdict(list)
+    tag_posts = defaultdict(list)
+    for post_id, tag_id in Post.tags.through.objects.order_by('tag_id').values_list('post_id', 'tag_id'):
+        if post_id in stamps:
+            post_tags[post_id].append(tag_id)
+            tag_posts[tag_id].append(post_id)
+    comments = {
+        row['post_id']: (row['count'], row['total'])
+        for row in Comment.objects.filter(is_approved=True).values('post_id')
+        .annotate(count=Count('pk'), total=Sum('pk')).order_by()
+    }
+    related = defaultdict(list)
+    for post_id, related_id in RelatedPost.objects.order_by('post_id', 'rank').values_list('post_id', 'related_id'):
+        related[post_id].append((related_id, stamps.get(related_id)))
+
+    pages = []
+    home_extra = (
+        [row[0] for row in posts if row[7]][:5],
+        hot_posts.get_hot_post_ids(10),
+    )
+    pages.extend(_listing(reverse('home'), rows, site, per_page, extra=home_extra))
+
+    for pk, slug, updated_at, _, category_id, previous_id, next_id, _ in posts:
+        url = reverse('post_detail', args=[slug])
+        pages.append(Page(url, output_path(url), _digest(
+            site, updated_at, category_id, post_tags[pk], comments.get(pk),
+            (previous_id, stamps.get(previous_id)), (next_id, stamps.get(next_id)), related[pk],
+        )))
+
+    by_category = defaultdict(list)
+    for pk, _, updated_at, _, category_id, *_ in posts:
+        by_category[category_id].append((pk, updated_at))
+    for category_id, slug in Category.objects.values_list('pk', 'slug'):
+        pages.extend(_listing(reverse('category_detail', args=[slug]), by_category[category_id], site, per_page))
+
+    order = {pk: index for index, pk in enumerate(stamps)}
+    for tag_id, slug in Tag.objects.values_list('pk', 'slug'):
+        tagged = sorted(tag_posts[tag_id], key=order.get)
+        pages.extend(_listing(reverse('tag_detail', args=[slug]), [(pk, stamps[pk]) for pk in tagged], site, per_page))
+
+    by_month = defaultdict(list)
+    for pk, _, updated_at, published_at, *_ in posts:
+        if published_at is not None:
+            moment = timezone.localtime(published_at)
+            by_month[(moment.year, moment.month)].append((pk, updated_at))
+    url = reverse('archive')
+    pages.append(Page(url, output_path(url), _digest(site, sorted((key, len(items)) for key, items in by_month.items()))))
+    for (year, month), items in by_month.items():
+        pages.extend(_listing(reverse('archive_month', args=[year, month]), items, site, per_page))
+    return pages
+
+
+# ==================== 渲染 ====================
+
+def render_page(url):
+    """
+    以匿名用户身份渲染页面
+    :return: (状态码, 内容)
+    """
+    request = RequestFactory().get(url, **{EXPORT_ENVIRON_KEY: True})
+    request.user = AnonymousUser()
+    match = resolve(request.path_info)
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+    except Http404:
+        return 404, b''
+    if hasattr(response, 'render'):
+        response.render()
+    return response.status_code, response.content
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def _export_page(task):
+    """
+    渲染并写入一个页面（在子进程中执行）
+    :return: (相对路径, 内容哈希, 是否写入文件)，渲染失败时哈希为 None
+    """
+    url, path, output_dir, previous_hash = task
+    try:
+        status, content = render_page(url)
+    except Exception:
+        logger.exception('导出 %s 失败', url)
+        return path, None, False
+    if status != 200:
+        logger.warning('导出 %s 返回 %s', url, status)
+        return path, None, False
+    digest = hashlib.sha256(content).hexdigest()
+    target = os.path.join(output_dir, *path.split('/'))
+    if digest == previous_hash and os.path.exists(target):
+        return path, digest, False
+    _write_atomic(target, content)
+    return path, digest, True
+
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f).get('pages', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(output_dir, pages):
+    data = json.dumps({'version': EXPORT_VERSION, 'pages': pages}, ensure_ascii=False, sort_keys=True)
+    _write_atomic(os.path.join(output_dir, MANIFEST_NAME), data.encode('utf-8'))
+
+
+def _remove_page(output_dir, path):
+    target = os.path.join(output_dir, *path.split('/'))
+    try:
+        os.remove(target)
+    except FileNotFoundError:
+        pass
+    # 逐级删除空目录，不删除输出目录本身
+    directory = os.path.dirname(target)
+    root = os.path.abspath(output_dir)
+    while os.path.abspath(directory) != root:
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+        directory = os.path.dirname(directory)
+
+
+def export_site(output_dir, workers=None, force=False, per_page=PER_PAGE):
+    """
+    导出静态站点，只重新生成输入有变化的页面
+    :param workers: 渲染进程数，为1时在当前进程中渲染
+    :param force: 忽略 manifest，全部重新渲染
+    :return: ExportResult
+    """
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    previous = load_manifest(output_dir)
+    pages = collect_pages(per_page)
+
+    manifest, tasks = {}, []
+    for page in pages:
+        entry = previous.get(page.path)
+        if not force and entry and entry.get('inputs') == page.inputs and os.path.exists(os.path.join(output_dir, *page.path.split('/'))):
+            manifest[page.path] = entry
+        else:
+            tasks.append((page.url, page.path, output_dir, entry.get('hash') if entry else None))
+    inputs = {page.path: page.inputs for page in pages}
+
+    if workers == 1 or len(tasks) <= 1:
+        results = map(_export_page, tasks)
+        pool = None
+    else:
+        # 子进程不能复用父进程的数据库连接，分叉前关闭，各进程按需建立自己的连接
+        connections.close_all()
+        pool = multiprocessing.Pool(processes=workers)
+        results = pool.imap_unordered(_export_page, tasks, chunksize=8)
+
+    written = failed = 0
+    try:
+        for path, digest, changed in results:
+            if digest is None:
+                failed += 1
+                continue
+            manifest[path] = {'inputs': inputs[path], 'hash': digest}
+            written += changed
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    removed = [path for path in previous if path not in inputs]
+    for path in removed:
+        _remove_page(output_dir, path)
+    _save_manifest(output_dir, manifest)
+    return ExportResult(len(tasks) - failed, written, len(pages) - len(tasks), len(removed), failed)
@@ -0,0 +1,117 @@
+"""
+管理面板统计
+
+计数保存在 SiteCounter 表中，由模型信号在增删改时增量维护，面板只需一次查询读取；
+``manage.py reconcile_counters`` 用条件聚合重新统计并校正漂移
+（如 QuerySet.update 等绕过信号的批量操作造成的偏差）。
+"""
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import Category, Comment, Post, SiteCounter, Tag
+
+COUNTER_NAMES = (
+    'total_posts', 'published_posts', 'draft_posts',
+    'total_comments', 'pending_comments',
+    'total_users', 'total_categories', 'total_tags',
+)
+
+
+def compute_stats():
+    """按表各用一次条件聚合查询统计全部计数"""
+    posts = Post.objects.aggregate(
+        total_posts=Count('pk'),
+        published_posts=Count('pk', filter=Q(status='published')),
+        draft_posts=Count('pk', filter=Q(status='draft')),
+    )
+    comments = Comment.objects.aggregate(
+        total_comments=Count('pk'),
+        pending_comments=Count('pk', filter=Q(is_approved=False)),
+    )
+    return {
+        **posts,
+        **comments,
+        'total_users': User.objects.count(),
+        'total_categories': Category.objects.count(),
+        'total_tags': Tag.objects.count(),
+    }
+
+
+def adjust(**deltas):
+    """增减计数，如 adjust(total_posts=1, draft_posts=1)"""
+    for name, delta in deltas.items():
+        if delta:
+            SiteCounter.objects.filter(name=name).update(value=F('value') + delta)
+
+
+def reconcile():
+    """
+    重新统计并写回计数
+    :return: 发生漂移的计数 {名称: (原值, 实际值)}
+    """
+    actual = compute_stats()
+    with transaction.atomic():
+        stored = dict(SiteCounter.objects.select_for_update().values_list('name', 'value'))
+        drift = {name: (stored.get(name), value) for name, value in actual.items() if stored.get(name) != value}
+        for name, (old, value) in drift.items():
+            SiteCounter.objects.update_or_create(name=name, defaults={'value': value})
+    return drift
+
+
+def get_stats():
+    """读取全部计数，首次使用时先统计一次"""
+    stats = dict(SiteCounter.objects.filter(name__in=COUNTER_NAMES).values_list('name', 'value'))
+    if len(stats) < len(COUNTER_NAMES):
+        reconcile()
+        stats = dict(SiteCounter.objects.filter(name__in=COUNTER_NAMES).values_list('name', 'value'))
+    return stats
+
+
+# ==================== 信号处理 ====================
+
+def _post_counter(status):
+    return {'published': 'published_posts', 'draft': 'draft_posts'}.get(status)
+
+
+def post_saved(instance, created):
+    old = None if created else _post_counter(getattr(instance, '_loaded_status', instance.status))
+    new = _post_counter(instance.status)
+    deltas = Counter()
+    if created:
+        deltas['total_posts'] += 1
+    if old != new:
+        if old:
+            deltas[old] -= 1
+        if new:
+            deltas[new] += 1
+    adjust(**deltas)
+
+
+def post_deleted(instance):
+    status = _post_counter(getattr(instance, '_loaded_status', instance.status))
+    adjust(total_posts=-1, **({status: -1} if status else {}))
+
+
+def comment_saved(instance, created):
+    if created:
+        adjust(total_comments=1, pending_comments=0 if instance.is_approved else 1)
+        return
+    was_approved = getattr(instance, '_loaded_approved', instance.is_approved)
+    if was_approved != instance.is_approved:
+        adjust(pending_comments=1 if was_approved else -1)
+
+
+def comment_deleted(instance):
+    adjust(total_comments=-1, pending_comments=0 if instance.is_approved else -1)
+
+
+def object_saved(name, created):
+    if created:
+        adjust(**{name: 1})
+
+
+def object_deleted(name):
+    adjust(**{name: -1})
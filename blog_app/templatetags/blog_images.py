@@ -0,0 +1,17 @@
+from django import template
+
+from ..images import build_srcset
+
+register = template.Library()
+
+
+@register.filter
+def srcset(info, fmt='jpeg'):
+    """图片各尺寸版本的 srcset 属性值，如 {{ post.cover_variants|srcset:'webp' }}"""
+    return build_srcset(info, fmt)
+
+
+@register.filter
+def variant_url(info, name):
+    """指定尺寸的 JPEG 地址，没有处理过的图片返回空字符串，如 {{ post.cover_variants|variant_url:'thumb' }}"""
+    return (info or {}).get('variants', {}).get(name, {}).get('jpeg', '')
@@ -1,4 +1,4 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client
 from django.urls import reverse
 from django.contrib.auth.models import User
 from .models import Category, Tag, Post, Comment, Profile, SiteSettings
@@ -159,4 +159,1877 @@ class FormTests(TestCase):
             'password2': 'testpassword123',
         }
         form = CustomUserCreationForm(data=form_data)
-        self.assertTrue(form.is_valid())
\ No newline at end of file
+        self.assertTrue(form.is_valid())
+
+class ViewCounterTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from . import view_counter
+        cache.clear()
+        self.view_counter = view_counter
+        view_counter.flush_views()
+        self.user = User.objects.create_user(username='reader', password='testpassword')
+        self.post = Post.objects.create(
+            title='Hot Post',
+            content='Content',
+            author=self.user,
+            status='published'
+        )
+        self.other_post = Post.objects.create(
+            title='Other Post',
+            content='Content',
+            author=self.user,
+            status='published'
+        )
+
+    def test_post_detail_buffers_views(self):
+        """测试详情页阅读量只写入缓冲"""
+        url = reverse('post_detail', kwargs={'slug': self.post.slug})
+        response = self.client.get(url)
+        self.assertEqual(response.context['post'].views, 1)
+        # 第二次命中整页缓存，阅读量仍然计入
+        self.client.get(url)
+        self.assertEqual(self.view_counter.get_pending_views([self.post.pk]), {self.post.pk: 2})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 0)
+
+    def test_concurrent_views_flush_in_one_update(self):
+        """测试并发阅读只产生一次批量UPDATE"""
+        import threading
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        def read(post_id):
+            for _ in range(10):
+                self.view_counter.record_view(post_id)
+
+        threads = [
+            threading.Thread(target=read, args=(post.pk,))
+            for post in [self.post, self.other_post] * 5
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with CaptureQueriesContext(connection) as ctx:
+            posts, views = self.view_counter.flush_views()
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual((posts, views), (2, 100))
+
+        self.post.refresh_from_db()
+        self.other_post.refresh_from_db()
+        self.assertEqual(self.post.views, 50)
+        self.assertEqual(self.other_post.views, 50)
+        self.assertEqual(self.view_counter.flush_views(), (0, 0))
+
+    def test_failed_flush_restores_redis_buffer(self):
+        """写回数据库失败时增量放回 Redis，而不是只放回管理命令进程的内存"""
+        from unittest import mock
+        from django.db import OperationalError
+        buffer = self.view_counter.RedisViewBuffer(InMemoryRedis())
+        with mock.patch.object(self.view_counter, '_get_redis_buffer', return_value=buffer):
+            buffer.incr(self.post.pk, 7)
+            with mock.patch.object(self.view_counter, '_write_deltas', side_effect=OperationalError('gone away')):
+                with self.assertRaises(OperationalError):
+                    self.view_counter.flush_views()
+            self.assertEqual(buffer.get([self.post.pk]), {self.post.pk: 7})
+            self.assertEqual(self.view_counter._local_buffer.get([self.post.pk]), {})
+            self.assertEqual(self.view_counter.flush_views(), (1, 7))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 7)
+
+
+class InMemoryRedis:
+    """测试用的最小 Redis 客户端，只实现阅读量缓冲用到的哈希命令"""
+
+    def __init__(self):
+        self.data = {}
+
+    def hincrby(self, key, field, amount):
+        fields = self.data.setdefault(key, {})
+        fields[str(field)] = fields.get(str(field), 0) + amount
+        return fields[str(field)]
+
+    def hmget(self, key, fields):
+        return [self.data.get(key, {}).get(str(field)) for field in fields]
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def rename(self, src, dst):
+        if src not in self.data:
+            raise KeyError(src)
+        self.data[dst] = self.data.pop(src)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def pipeline(self):
+        return InMemoryPipeline(self)
+
+
+class InMemoryPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def hincrby(self, *args):
+        self.commands.append(args)
+
+    def execute(self):
+        return [self.client.hincrby(*args) for args in self.commands]
+
+
+class HotPostsTests(TestCase):
+    def setUp(self):
+        from . import hot_posts
+        self.hot_posts = hot_posts
+        hot_posts._local_ranking.clear()
+        self.user = User.objects.create_user(username='hot', password='testpassword')
+        self.old = Post.objects.create(
+            title='Old Favourite', content='Content', author=self.user, status='published', views=1000
+        )
+        self.new = Post.objects.create(title='New Post', content='Content', author=self.user, status='published')
+        self.now = 1_700_000_000.0
+
+    def at(self, hours):
+        from unittest import mock
+        return mock.patch.object(self.hot_posts.time, 'time', return_value=self.now + hours * 3600)
+
+    def test_recent_activity_outranks_old_activity(self):
+        """测试热度随时间衰减：一个半衰期后的 3 次阅读胜过之前的 5 次"""
+        with self.at(0):
+            for _ in range(5):
+                self.hot_posts.record_view(self.old.pk)
+        with self.at(48):
+            for _ in range(3):
+                self.hot_posts.record_view(self.new.pk)
+        self.assertEqual(self.hot_posts.get_hot_post_ids(2), [self.new.pk, self.old.pk])
+
+    def test_compaction_keeps_order_and_bounds_scores(self):
+        """测试压缩后排名不变且分数回到原始量级"""
+        with self.at(0):
+            self.hot_posts.record_view(self.old.pk)
+        with self.at(480):
+            self.hot_posts.record_comment(self.new.pk)
+            self.assertEqual(self.hot_posts.compact(), 1)
+            self.hot_posts.record_view(self.old.pk)
+        scores = self.hot_posts._local_ranking._scores
+        self.assertAlmostEqual(scores[self.new.pk], self.hot_posts.COMMENT_WEIGHT)
+        self.assertEqual(self.hot_posts.get_hot_post_ids(2), [self.new.pk, self.old.pk])
+
+    def test_home_sidebar_uses_ranking(self):
+        """测试侧栏热门文章按热度排序，排行不足时按阅读量补足，撤回的文章被移出"""
+        self.client.get(self.new.get_absolute_url())
+        Comment.objects.create(post=self.new, user=self.user, content='Nice')
+        self.assertEqual(self.hot_posts.get_hot_posts(2), [self.new, self.old])
+
+        self.new.status = 'draft'
+        self.new.save()
+        self.assertEqual(self.hot_posts.get_hot_post_ids(5), [])
+        self.assertEqual(self.hot_posts.get_hot_posts(2), [self.old])
+
+
+class ContentPipelineTests(TestCase):
+    CONTENT = '## 安装\n\n运行以下命令：\n\n```python\nprint("hello")\n```\n\n## Usage\n\nSee the *docs*.'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer', password='testpassword')
+
+    def create_post(self, content=CONTENT, **kwargs):
+        return Post.objects.create(title='Markdown', content=content, author=self.user, status='published', **kwargs)
+
+    def test_render_on_save(self):
+        """测试保存时渲染正文、目录、摘要和字数"""
+        post = self.create_post()
+        self.assertIn('<h2 id="_1">安装</h2>', post.content_html)
+        self.assertIn('class="highlight"', post.content_html)
+        self.assertIn('href="#usage"', post.toc_html)
+        self.assertTrue(post.excerpt.startswith('安装 运行以下命令：'))
+        self.assertNotIn('```', post.excerpt)
+        # 中文按字计数：安装、运行以下命令 共 8 字，加上 print hello Usage See the docs
+        self.assertEqual(post.word_count, 14)
+        self.assertEqual(post.reading_minutes, 1)
+        self.assertEqual(self.create_post('纯文本').toc_html, '')
+
+    def test_skip_when_hash_unchanged(self):
+        """测试内容未变化时不重新渲染，修改后重新渲染"""
+        from unittest import mock
+        from . import content
+        post = self.create_post(excerpt='手写摘要')
+        with mock.patch.object(content, 'render_markdown', wraps=content.render_markdown) as render:
+            post.title = 'Renamed'
+            post.save()
+            self.assertEqual(render.call_count, 0)
+            post.content = '# New'
+            post.save()
+            self.assertEqual(render.call_count, 1)
+        post.refresh_from_db()
+        self.assertIn('New</h1>', post.content_html)
+        self.assertEqual(post.excerpt, '手写摘要')
+
+    def test_bulk_rerender_with_process_pool(self):
+        """测试进程池批量重新渲染"""
+        from .content import rerender_posts
+        posts = [self.create_post(f'# 标题 {i}') for i in range(5)]
+        Post.objects.update(content_html='', content_hash='')
+        self.assertEqual(rerender_posts(workers=2, batch_size=2), 5)
+        for post in posts:
+            post.refresh_from_db()
+            self.assertIn(f'标题 {post.content[-1]}</h1>', post.content_html)
+        self.assertEqual(rerender_posts(workers=1), 0)
+
+    def test_post_detail_serves_stored_html(self):
+        """测试详情页输出存储的 HTML"""
+        post = self.create_post()
+        response = self.client.get(post.get_absolute_url())
+        self.assertContains(response, '<div class="highlight">')
+        self.assertContains(response, '约 1 分钟')
+
+    def test_raw_html_is_sanitized(self):
+        """测试正文中的脚本、事件属性和 javascript: 链接被清理"""
+        post = self.create_post(
+            '<script>alert("s")</script>\n\n'
+            '<img src="/media/a.png" onerror="alert(1)">\n\n'
+            '[链接](javascript:alert(2)) <a href=" jav&#x09;ascript:alert(3)">b</a> [站内](/about/)\n\n'
+            '| a |\n|:--|\n| 1 |'
+        )
+        html = post.content_html
+        for fragment in ('<script', 'alert', 'onerror', 'javascript'):
+            self.assertNotIn(fragment, html.lower())
+        self.assertIn('<img src="/media/a.png">', html)
+        self.assertIn('<a href="/about/">站内</a>', html)
+        self.assertIn('<th style="text-align: left;">a</th>', html)
+        response = self.client.get(post.get_absolute_url())
+        self.assertNotContains(response, 'alert(')
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='writer', password='testpassword')
+
+    def create_post(self, title, content, status='published'):
+        return Post.objects.create(title=title, content=content, author=self.user, status=status)
+
+    def test_tokenize_chinese_bigrams_and_latin_words(self):
+        """测试中文二元切分和英文单词切分"""
+        from .search import tokenize
+        self.assertEqual(tokenize('Django博客系统'), ['django', '博客', '客系', '系统'])
+        self.assertEqual(tokenize('用 Redis 缓存'), ['用', 'redis', '缓存'])
+
+    def test_index_follows_post_lifecycle(self):
+        """测试文章保存、撤回和删除时增量维护索引"""
+        from .search import search_post_ids
+        post = self.create_post('性能优化', '介绍数据库索引')
+        self.assertEqual(search_post_ids('数据库'), [post.pk])
+
+        post.status = 'draft'
+        post.save()
+        self.assertEqual(search_post_ids('数据库'), [])
+
+        post.status = 'published'
+        post.save()
+        post.delete()
+        self.assertEqual(search_post_ids('数据库'), [])
+
+    def test_single_character_chinese_query(self):
+        """单字查询能命中较长中文片段中的字"""
+        from .search import search_post_ids
+        post = self.create_post('排查死锁问题', '记录一次线上事故')
+        self.create_post('随笔', '今天天气不错')
+        self.assertEqual(search_post_ids('锁'), [post.pk])
+        self.assertEqual(search_post_ids('题'), [post.pk])
+        self.assertEqual(search_post_ids('死锁'), [post.pk])
+
+    def test_bm25_ranking_requires_all_terms(self):
+        """测试BM25排序与多词项查询"""
+        from .search import search_post_ids
+        in_title = self.create_post('Redis 缓存实践', '正文')
+        in_body = self.create_post('随笔', '顺便提到了 redis 缓存')
+        self.create_post('Redis 入门', '只讲数据结构')
+        self.assertEqual(search_post_ids('redis 缓存'), [in_title.pk, in_body.pk])
+
+    def test_rebuild_index(self):
+        """测试批量重建索引"""
+        from .models import SearchPosting
+        from .search import rebuild_index, search_post_ids
+        post = self.create_post('Searchable Post', 'found in search')
+        self.create_post('Draft Post', 'found in search', status='draft')
+        SearchPosting.objects.all().delete()
+        self.assertEqual(rebuild_index(batch_size=1), 1)
+        self.assertEqual(search_post_ids('searchable'), [post.pk])
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(username='archiver', password='testpassword')
+
+    def create_post(self, published_at, status='published'):
+        return Post.objects.create(
+            title='Archived', content='Content', author=self.user,
+            status=status, published_at=published_at
+        )
+
+    def test_histogram_uses_local_month_buckets(self):
+        """测试按本地时区月份分组统计"""
+        from datetime import datetime, timezone as dt_timezone
+        from .archive import get_month_histogram
+        # UTC 1月31日20点 即 上海时间2月1日4点
+        self.create_post(datetime(2024, 1, 31, 20, tzinfo=dt_timezone.utc))
+        self.create_post(datetime(2024, 1, 15, 12, tzinfo=dt_timezone.utc))
+        self.create_post(None, status='draft')
+
+        with self.assertNumQueries(1):
+            histogram = get_month_histogram()
+        self.assertEqual(
+            [(row['date'].year, row['date'].month, row['count']) for row in histogram],
+            [(2024, 2, 1), (2024, 1, 1)]
+        )
+        with self.assertNumQueries(0):
+            get_month_histogram()
+
+    def test_histogram_invalidated_only_by_publication_changes(self):
+        """测试只有发布状态变化才清除归档缓存"""
+        from .archive import get_month_histogram
+        post = self.create_post(None)
+        self.assertEqual(get_month_histogram()[0]['count'], 1)
+
+        post.title = 'Edited'
+        post.save()
+        with self.assertNumQueries(0):
+            get_month_histogram()
+
+        post.status = 'draft'
+        post.save()
+        self.assertEqual(get_month_histogram(), [])
+
+    def test_month_range_filters(self):
+        """测试月份范围查询边界"""
+        from datetime import datetime, timezone as dt_timezone
+        from .archive import month_range
+        inside = self.create_post(datetime(2024, 1, 31, 20, tzinfo=dt_timezone.utc))
+        self.create_post(datetime(2024, 1, 31, 15, tzinfo=dt_timezone.utc))
+        start, end = month_range(2024, 2)
+        posts = Post.objects.filter(published_at__gte=start, published_at__lt=end)
+        self.assertEqual(list(posts), [inside])
+        self.assertEqual(month_range(2024, 12)[1].year, 2025)
+
+
+class SiteChromeCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        SiteSettings.get_settings()
+
+    def render_chrome(self):
+        from .context_processors import site_settings, navigation_context
+        context = {**site_settings(None), **navigation_context(None)}
+        return (
+            context['site_settings'].site_name,
+            [category.name for category in context['nav_categories']],
+            [tag.name for tag in context['nav_tags']],
+        )
+
+    def test_chrome_served_without_queries_after_warmup(self):
+        """测试预热后渲染站点公共数据不再查询数据库"""
+        Category.objects.create(name='Python', slug='python')
+        self.render_chrome()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.render_chrome()[1], ['Python'])
+
+    def test_context_processors_are_lazy(self):
+        """测试上下文处理器在模板未使用时不查询"""
+        from .context_processors import site_settings, navigation_context
+        with self.assertNumQueries(0):
+            site_settings(None)
+            navigation_context(None)
+
+    def test_model_changes_invalidate_chrome(self):
+        """测试设置、分类和标签变化时缓存失效"""
+        self.render_chrome()
+        Tag.objects.create(name='Django', slug='django')
+        settings = SiteSettings.get_settings()
+        settings.site_name = 'New Name'
+        settings.save()
+        self.assertEqual(self.render_chrome(), ('New Name', [], ['Django']))
+
+        Tag.objects.all().delete()
+        self.assertEqual(self.render_chrome()[2], [])
+
+    def test_stale_local_copy_refreshed_from_shared_version(self):
+        """测试其他进程更新版本号后本进程副本失效"""
+        from django.core.cache import cache
+        from .site_cache import site_chrome
+        self.render_chrome()
+        Category.objects.create(name='Go', slug='go')
+        # 模拟另一个进程修改数据后更新了共享版本号
+        site_chrome._local_version = cache.get(site_chrome.version_key)
+        site_chrome._local['categories'] = []
+        cache.set(site_chrome.version_key, 'other-process', None)
+        self.assertEqual(self.render_chrome()[1], ['Go'])
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .page_cache import reset_stats
+        cache.clear()
+        reset_stats()
+        SiteSettings.get_settings()
+        self.user = User.objects.create_user(username='cached', password='testpassword')
+        self.post = Post.objects.create(
+            title='Cached Post', content='Content', author=self.user, status='published'
+        )
+        self.other_post = Post.objects.create(
+            title='Other Post', content='Content', author=self.user, status='published'
+        )
+        self.url = reverse('post_detail', kwargs={'slug': self.post.slug})
+        self.other_url = reverse('post_detail', kwargs={'slug': self.other_post.slug})
+
+    def test_anonymous_pages_are_cached(self):
+        """测试匿名用户页面缓存及命中统计"""
+        from .page_cache import get_stats
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertContains(response, 'Cached Post')
+        self.assertEqual(get_stats(), {'hits': 1, 'misses': 1})
+
+    def test_page_number_is_part_of_key(self):
+        """测试不同页码分别缓存"""
+        self.client.get(reverse('home'))
+        response = self.client.get(reverse('home'), {'page': 2})
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        response = self.client.get(reverse('home'), {'utm_source': 'feed'})
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+
+    def test_authenticated_users_bypass_cache(self):
+        """测试登录用户不使用整页缓存"""
+        self.client.login(username='cached', password='testpassword')
+        self.client.get(self.url)
+        self.assertNotIn('X-Page-Cache', self.client.get(self.url))
+
+    def test_comment_invalidates_only_its_post(self):
+        """测试评论只使所属文章详情页失效"""
+        self.client.get(self.url)
+        self.client.get(self.other_url)
+        Comment.objects.create(post=self.post, user=self.user, content='Nice', is_approved=True)
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'MISS')
+        self.assertEqual(self.client.get(self.other_url)['X-Page-Cache'], 'HIT')
+
+    def test_pending_comment_keeps_pages_cached(self):
+        """待审核评论不显示在页面上，不使首页和详情页失效；审核通过后失效"""
+        home = reverse('home')
+        self.client.get(home)
+        self.client.get(self.url)
+        comment = Comment.objects.create(post=self.post, user=self.user, content='Pending')
+        self.assertEqual(self.client.get(home)['X-Page-Cache'], 'HIT')
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'HIT')
+        comment.content = 'Still pending'
+        comment.save()
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'HIT')
+
+        comment.is_approved = True
+        comment.save()
+        self.assertEqual(self.client.get(self.url)['X-Page-Cache'], 'MISS')
+
+    def test_post_save_invalidates_post_pages(self):
+        """测试文章修改后相关页面失效"""
+        self.client.get(self.other_url)
+        self.post.title = 'Renamed'
+        self.post.save()
+        self.assertEqual(self.client.get(self.other_url)['X-Page-Cache'], 'MISS')
+
+    def test_post_detail_not_modified(self):
+        """测试详情页条件请求只做一次查询即返回 304，并照常计入阅读量"""
+        from .view_counter import get_pending_views
+        before = get_pending_views([self.post.pk]).get(self.post.pk, 0)
+        first = self.client.get(self.url)
+        etag = first['ETag']
+        self.assertIn('no-cache', first['Cache-Control'])
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(get_pending_views([self.post.pk])[self.post.pk] - before, 3)
+
+        Comment.objects.create(post=self.post, user=self.user, content='New', is_approved=True)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_listing_not_modified(self):
+        """测试列表页按依赖项代数应答条件请求，不查询数据库"""
+        etag = self.client.get(reverse('home'))['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('home'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(reverse('home'), {'page': 2}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.post.save()
+        self.assertEqual(self.client.get(reverse('home'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        missing = reverse('post_detail', kwargs={'slug': 'missing'})
+        self.assertEqual(self.client.get(missing, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        user = User.objects.create_user(username='pager', password='testpassword')
+        now = timezone.now()
+        self.posts = []
+        for i in range(7):
+            # 两两同一发布时间，验证并列时按 id 排序
+            self.posts.append(Post.objects.create(
+                title=f'Post {i}', content='Content', author=user,
+                status='published', published_at=now - timedelta(days=i // 2)
+            ))
+        self.queryset = Post.objects.filter(status='published')
+
+    def test_walk_forward_and_back(self):
+        """测试游标前后翻页覆盖全部文章且顺序与默认排序一致"""
+        from .pagination import CursorPaginator
+        paginator = CursorPaginator(self.queryset, 3)
+        expected = list(self.queryset)
+
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual([post for page in pages for post in page], expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertFalse(pages[0].has_previous())
+
+        previous = paginator.get_page(pages[-1].previous_cursor)
+        self.assertEqual(list(previous), list(pages[1]))
+        first = paginator.get_page(previous.previous_cursor)
+        self.assertEqual(list(first), list(pages[0]))
+        self.assertFalse(first.has_previous())
+
+    def test_deep_page_costs_one_query(self):
+        """测试深页只执行一次查询"""
+        from .pagination import CursorPaginator
+        paginator = CursorPaginator(self.queryset, 2)
+        page = paginator.get_page()
+        for _ in range(2):
+            page = paginator.get_page(page.next_cursor)
+        with self.assertNumQueries(1):
+            paginator.get_page(page.next_cursor)
+
+    def test_invalid_cursor_returns_first_page(self):
+        """测试篡改的游标回到第一页"""
+        from .pagination import CursorPaginator
+        page = CursorPaginator(self.queryset, 3).get_page('forged-token')
+        self.assertEqual(list(page), list(self.queryset[:3]))
+        self.assertEqual(page.estimated_num_pages, 3)
+
+    def test_null_published_at_skipped(self):
+        """测试 published_at 为空的已发布文章不参与游标分页，翻页不报错"""
+        from django.core.cache import cache
+        from .pagination import CursorPaginator
+        cache.clear()
+        Post.objects.filter(pk=self.posts[0].pk).update(published_at=None)
+        paginator = CursorPaginator(self.queryset, 3)
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual([post for page in pages for post in page], list(self.queryset.exclude(pk=self.posts[0].pk)))
+        self.assertEqual(paginator.estimated_count, 6)
+        self.assertEqual(self.client.get(reverse('home')).status_code, 200)
+
+    def test_home_renders_cursor_links(self):
+        """测试首页输出游标翻页链接，旧页码链接仍可访问"""
+        from django.core.cache import cache
+        cache.clear()
+        for i in range(4):
+            Post.objects.create(title=f'Extra {i}', content='Content', author=self.posts[0].author, status='published')
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, '?cursor=')
+        response = self.client.get(reverse('home'), {'page': 1})
+        self.assertContains(response, '?page=2')
+
+
+class CommentTreeTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        SiteSettings.get_settings()
+        self.user = User.objects.create_user(username='commenter', password='testpassword')
+        self.post = Post.objects.create(
+            title='Discussed', content='Content', author=self.user, status='published'
+        )
+
+    def comment(self, parent=None, approved=True):
+        return Comment.objects.create(
+            post=self.post, user=self.user, content='Reply', parent=parent, is_approved=approved
+        )
+
+    def test_tree_flattened_depth_first(self):
+        """测试评论树整理为带深度的深度优先列表"""
+        from .comment_tree import load_comment_page
+        root = self.comment()
+        other_root = self.comment()
+        chain = [root]
+        for _ in range(6):
+            chain.append(self.comment(parent=chain[-1]))
+        sibling = self.comment(parent=root)
+        hidden = self.comment(parent=other_root, approved=False)
+        self.comment(parent=hidden)
+
+        with self.assertNumQueries(3):
+            page = load_comment_page(self.post)
+        self.assertEqual(page.comments, chain + [sibling, other_root])
+        self.assertEqual([comment.depth for comment in page.comments], [0, 1, 2, 3, 4, 5, 6, 1, 0])
+        self.assertEqual(page.comments[6].indent, 6)
+        self.assertIsNone(page.next_cursor)
+
+    def test_pages_split_long_threads(self):
+        """测试分页：顶层话题数和评论数都有上限，被截断的话题在下一页继续"""
+        from django.test.utils import override_settings
+        from .comment_tree import load_comment_page
+        root = self.comment()
+        replies = [self.comment(parent=root) for _ in range(4)]
+        hidden = self.comment(parent=root, approved=False)
+        self.comment(parent=hidden)
+        later_roots = [self.comment() for _ in range(3)]
+
+        with override_settings(COMMENT_PAGE_SIZE=3, COMMENT_THREADS_PER_PAGE=2):
+            first = load_comment_page(self.post)
+            self.assertEqual(first.comments, [root] + replies[:2])
+            second = load_comment_page(self.post, first.next_cursor)
+            self.assertEqual(second.comments, replies[2:])
+            self.assertEqual([comment.depth for comment in second.comments], [1, 1])
+            third = load_comment_page(self.post, second.next_cursor)
+            self.assertEqual(third.comments, later_roots[:2])
+            last = load_comment_page(self.post, third.next_cursor)
+        self.assertEqual(last.comments, later_roots[2:])
+        self.assertIsNone(last.next_cursor)
+        self.assertEqual(first.count, 9)
+
+    def test_post_detail_renders_very_deep_chain(self):
+        """测试超过1000层的回复链不递归渲染"""
+        from django.test.utils import override_settings
+        root = self.comment()
+        comments = Comment.objects.bulk_create(
+            Comment(post=self.post, user=self.user, content=f'第{i}层', is_approved=True) for i in range(1, 1200)
+        )
+        parent = root
+        for comment in comments:
+            comment.parent = parent
+            comment.path = comment.build_path()
+            parent = comment
+        Comment.objects.bulk_update(comments, ['parent', 'path'], batch_size=500)
+
+        url = reverse('post_detail', kwargs={'slug': self.post.slug})
+        with override_settings(COMMENT_PAGE_SIZE=2000):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '第1199层')
+        self.assertEqual(response.context['comments'][-1].depth, 1199)
+
+        # 默认分页时逐页读完整条回复链（登录用户不使用整页缓存）
+        self.client.login(username='commenter', password='testpassword')
+        seen, after = 0, ''
+        while True:
+            response = self.client.get(url, {'comments_after': after} if after else {})
+            page = response.context['comment_page']
+            seen += len(page.comments)
+            if not page.next_cursor:
+                break
+            after = page.next_cursor
+        self.assertEqual(seen, 1200)
+
+    def test_paths_sort_depth_first(self):
+        """测试树路径按深度优先排序"""
+        root = self.comment()
+        late_root = self.comment()
+        reply = self.comment(parent=root)
+        ordered = list(Comment.objects.filter(post=self.post).order_by('path'))
+        self.assertEqual(ordered, [root, reply, late_root])
+        self.assertTrue(reply.path.startswith(root.path))
+
+    def test_post_detail_query_count_with_5000_comments(self):
+        """测试5000条评论时详情页查询数不随评论数增长"""
+        self.client.login(username='commenter', password='testpassword')
+        url = reverse('post_detail', kwargs={'slug': self.post.slug})
+        root = self.comment()
+        self.client.get(url)
+        with self.assertNumQueries(6):
+            self.client.get(url)
+
+        comments = [
+            Comment(post=self.post, user=self.user, content='Bulk', is_approved=True)
+            for _ in range(4999)
+        ]
+        Comment.objects.bulk_create(comments)
+        parent = root
+        for comment in Comment.objects.filter(post=self.post).exclude(pk=root.pk).order_by('pk'):
+            # 每10条为一个新的顶层评论，其余依次嵌套
+            comment.parent = None if comment.pk % 10 == 0 else parent
+            comment.path = (parent.path if comment.parent else '') + Comment.path_segment(comment.pk)
+            parent = comment
+            comments.append(comment)
+        Comment.objects.bulk_update(comments[4999:], ['parent', 'path'], batch_size=500)
+
+        with self.assertNumQueries(6):
+            response = self.client.get(url)
+        self.assertEqual(response.context['comment_count'], 5000)
+        self.assertEqual(len(response.context['comments']), 100)
+
+    def test_rebuild_comment_paths(self):
+        """测试补全旧评论的树路径"""
+        from django.core.management import call_command
+        from io import StringIO
+        root = self.comment()
+        reply = self.comment(parent=root)
+        Comment.objects.update(path='')
+        call_command('rebuild_comment_paths', stdout=StringIO())
+        reply.refresh_from_db()
+        self.assertEqual(reply.path, Comment.path_segment(root.pk) + Comment.path_segment(reply.pk))
+
+
+class PostNeighborTests(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        self.user = User.objects.create_user(username='neighbor', password='testpassword')
+        self.now = timezone.now()
+        self.hour = timedelta(hours=1)
+
+    def create_post(self, title, published_at=None, status='published'):
+        return Post.objects.create(
+            title=title, content='Content', author=self.user,
+            status=status, published_at=published_at
+        )
+
+    def chain(self):
+        """沿 next_post 指针遍历全部已发布文章"""
+        first = Post.objects.get(status='published', previous_post=None)
+        titles, post = [], first
+        while post:
+            titles.append(post.title)
+            post = post.next_post
+        return titles
+
+    def test_neighbors_follow_publication_order(self):
+        """测试发布顺序及同一发布时间的并列"""
+        a = self.create_post('A', self.now - 2 * self.hour)
+        c = self.create_post('C', self.now)
+        b1 = self.create_post('B1', self.now - self.hour)
+        b2 = self.create_post('B2', self.now - self.hour)
+        self.assertEqual(self.chain(), ['A', 'B1', 'B2', 'C'])
+
+        b1.refresh_from_db()
+        self.assertEqual(b1.get_previous_post(), a)
+        self.assertEqual(b1.get_next_post(), b2)
+        c.refresh_from_db()
+        self.assertIsNone(c.get_next_post())
+
+    def test_drafts_unpublish_and_delete(self):
+        """测试草稿、撤回和删除时相邻关系的维护"""
+        self.create_post('A', self.now - 2 * self.hour)
+        b = self.create_post('B', self.now - self.hour)
+        self.create_post('C', self.now)
+        draft = self.create_post('Draft', status='draft')
+        draft.refresh_from_db()
+        self.assertIsNone(draft.previous_post)
+        self.assertEqual(self.chain(), ['A', 'B', 'C'])
+
+        b.status = 'draft'
+        b.save()
+        self.assertEqual(self.chain(), ['A', 'C'])
+        b.refresh_from_db()
+        self.assertIsNone(b.next_post)
+
+        b.status = 'published'
+        b.published_at = self.now + self.hour
+        b.save()
+        self.assertEqual(self.chain(), ['A', 'C', 'B'])
+
+        Post.objects.get(title='C').delete()
+        self.assertEqual(self.chain(), ['A', 'B'])
+
+    def test_stale_instance_does_not_overwrite_links(self):
+        """测试保存旧实例不会覆盖相邻关系"""
+        a = self.create_post('A', self.now - self.hour)
+        self.create_post('B', self.now)
+        a.title = 'A edited'
+        a.save()
+        self.assertEqual(self.chain(), ['A edited', 'B'])
+
+    def test_rebuild_neighbors(self):
+        """测试批量重建相邻关系"""
+        from .neighbors import rebuild_neighbors
+        self.create_post('A', self.now - self.hour)
+        self.create_post('B', self.now)
+        Post.objects.update(previous_post=None, next_post=None)
+        self.assertEqual(rebuild_neighbors(), 2)
+        self.assertEqual(self.chain(), ['A', 'B'])
+
+
+
+class RelatedPostTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='related', password='testpassword')
+        self.python = Category.objects.create(name='Python', slug='python')
+        self.life = Category.objects.create(name='Life', slug='life')
+        self.django_tag = Tag.objects.create(name='Django', slug='django')
+        self.travel_tag = Tag.objects.create(name='Travel', slug='travel')
+
+    def create_post(self, title, content, category=None, tags=(), status='published'):
+        post = Post.objects.create(
+            title=title, content=content, author=self.user, category=category, status=status
+        )
+        post.tags.add(*tags)
+        return post
+
+    def related_titles(self, post):
+        from .models import RelatedPost
+        return list(
+            RelatedPost.objects.filter(post=post).order_by('rank').values_list('related__title', flat=True)
+        )
+
+    def build_corpus(self):
+        self.orm = self.create_post('ORM 查询优化', 'django orm queryset 索引优化', self.python, [self.django_tag])
+        self.views = self.create_post('视图缓存', 'django queryset 页面缓存', self.python, [self.django_tag])
+        self.trip = self.create_post('旅行日记', '海边 旅行 日落', self.life, [self.travel_tag])
+        self.uncategorized = self.create_post('随笔', 'django orm 随手记', None)
+
+    def test_incremental_update_on_save(self):
+        """测试保存文章时增量维护双方的相关文章列表"""
+        self.build_corpus()
+        self.assertEqual(self.related_titles(self.orm)[0], '视图缓存')
+        self.assertIn('ORM 查询优化', self.related_titles(self.views))
+        self.assertNotIn('旅行日记', self.related_titles(self.orm))
+        # 无分类文章只依靠正文相似
+        self.assertEqual(self.related_titles(self.uncategorized), ['ORM 查询优化', '视图缓存'])
+
+        self.views.status = 'draft'
+        self.views.save()
+        self.assertEqual(self.related_titles(self.views), [])
+        self.assertNotIn('视图缓存', self.related_titles(self.orm))
+
+    def test_tag_changes_update_related(self):
+        """测试修改标签后重新计算"""
+        self.build_corpus()
+        self.trip.tags.add(self.django_tag)
+        self.assertIn('旅行日记', self.related_titles(self.orm))
+        self.trip.tags.remove(self.django_tag)
+        self.assertNotIn('旅行日记', self.related_titles(self.orm))
+
+    def test_rebuild_matches_incremental(self):
+        """测试离线批量计算与增量结果一致"""
+        from .models import RelatedPost
+        from .related import rebuild_related
+        self.build_corpus()
+        expected = {post.pk: self.related_titles(post) for post in Post.objects.all()}
+        RelatedPost.objects.all().delete()
+        self.assertEqual(rebuild_related(), 4)
+        self.assertEqual({post.pk: self.related_titles(post) for post in Post.objects.all()}, expected)
+
+    def test_post_detail_uses_precomputed_related(self):
+        """测试详情页读取预计算结果"""
+        self.build_corpus()
+        response = self.client.get(self.orm.get_absolute_url())
+        related = list(response.context['related_posts'])
+        self.assertEqual(related[0], self.views)
+        self.assertNotIn(self.orm, related)
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        from . import stats
+        self.stats = stats
+        self.user = User.objects.create_user(username='counter', password='testpassword')
+        self.category = Category.objects.create(name='Stats', slug='stats')
+        Tag.objects.create(name='Stats', slug='stats')
+        self.stats.reconcile()
+
+    def assertCountersExact(self):
+        self.assertEqual(self.stats.get_stats(), self.stats.compute_stats())
+
+    def test_counters_follow_model_changes(self):
+        """测试增删改文章和评论时计数保持准确"""
+        post = Post.objects.create(title='Draft', content='Content', author=self.user, category=self.category)
+        published = Post.objects.create(title='Live', content='Content', author=self.user, status='published')
+        comment = Comment.objects.create(post=published, user=self.user, content='Hi')
+        Comment.objects.create(post=published, user=self.user, content='Reply', parent=comment, is_approved=True)
+        self.assertCountersExact()
+
+        post.status = 'published'
+        post.save()
+        comment = Comment.objects.get(pk=comment.pk)
+        comment.is_approved = True
+        comment.save()
+        self.assertCountersExact()
+        self.assertEqual(self.stats.get_stats()['pending_comments'], 0)
+
+        # 删除文章时级联删除的评论同样计入
+        published.delete()
+        User.objects.create_user(username='another', password='testpassword')
+        self.category.delete()
+        self.assertCountersExact()
+
+    def test_admin_bulk_moderation_adjusts_pending(self):
+        """测试后台批量审核绕过信号时仍调整待审核计数"""
+        from django.contrib.admin.sites import site
+        from .admin import CommentAdmin
+        post = Post.objects.create(title='Live', content='Content', author=self.user, status='published')
+        for i in range(3):
+            Comment.objects.create(post=post, user=self.user, content=f'Hi {i}')
+        CommentAdmin(Comment, site).approve_comments(None, Comment.objects.all())
+        self.assertCountersExact()
+        CommentAdmin(Comment, site).disapprove_comments(None, Comment.objects.filter(content='Hi 0'))
+        self.assertCountersExact()
+
+    def test_reconcile_corrects_drift(self):
+        """测试校正命令修复漂移，读取计数只需一次查询"""
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import SiteCounter
+        Post.objects.create(title='Live', content='Content', author=self.user, status='published')
+        SiteCounter.objects.filter(name='total_posts').update(value=42)
+        SiteCounter.objects.filter(name='total_tags').delete()
+
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('total_posts: 42 -> 1', out.getvalue())
+        with self.assertNumQueries(1):
+            stats = self.stats.get_stats()
+        self.assertEqual(stats['total_tags'], 1)
+        self.assertEqual(self.stats.reconcile(), {})
+
+
+class UploadServiceTests(TestCase):
+    PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+
+    def setUp(self):
+        import tempfile
+        from django.test.utils import override_settings
+        from . import uploads
+        self.uploads = uploads
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        overrides = override_settings(MEDIA_ROOT=self.media.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        uploads.reset_upload_service()
+        self.addCleanup(uploads.reset_upload_service)
+
+    def test_detect_content_type(self):
+        """测试按文件头识别类型，而不是固定使用 .jpg"""
+        self.assertEqual(self.uploads.detect_content_type(self.PNG, 'photo.jpg'), 'image/png')
+        self.assertEqual(self.uploads.detect_content_type(b'RIFF\x00\x00\x00\x00WEBPVP8 '), 'image/webp')
+        self.assertEqual(self.uploads.detect_content_type(b'plain', 'notes.txt'), 'text/plain')
+        self.assertEqual(self.uploads.detect_content_type(b'????'), 'application/octet-stream')
+
+    def test_local_backend_upload(self):
+        """测试提交后返回 Future，任务状态可查询"""
+        import os
+        future = self.uploads.submit_upload(self.PNG, folder='covers')
+        url = future.result(timeout=5)
+        self.assertTrue(url.startswith('/media/blog-yk/covers/') and url.endswith('.png'))
+        path = os.path.join(self.media.name, url[len('/media/'):])
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), self.PNG)
+        job = self.uploads.get_job(future.job_id)
+        self.assertEqual((job['status'], job['url']), ('done', url))
+
+    def test_retry_with_backoff(self):
+        """测试可重试错误按退避重试，不可重试错误直接失败"""
+        class FlakyBackend:
+            def __init__(self, failures, retryable=True):
+                self.failures, self.retryable, self.calls = failures, retryable, 0
+
+            def put(inner, key, data, content_type):
+                inner.calls += 1
+                if inner.calls <= inner.failures:
+                    raise self.uploads.UploadError('timeout', retryable=inner.retryable)
+                return f'/files/{key}'
+
+        backend = FlakyBackend(2)
+        service = self.uploads.UploadService(backend, max_workers=1, retries=3, backoff=0.001)
+        self.addCleanup(service.shutdown)
+        self.assertTrue(service.submit(self.PNG).result(timeout=5).startswith('/files/'))
+        self.assertEqual(backend.calls, 3)
+
+        backend = FlakyBackend(1, retryable=False)
+        service.backend = backend
+        future = service.submit(self.PNG)
+        with self.assertRaises(self.uploads.UploadError):
+            future.result(timeout=5)
+        self.assertEqual(backend.calls, 1)
+        self.assertEqual(self.uploads.get_job(future.job_id)['status'], 'failed')
+
+    def test_queue_is_bounded(self):
+        """测试排队任务超过上限时拒绝新任务"""
+        import threading
+
+        class BlockingBackend:
+            release = threading.Event()
+
+            def put(self, key, data, content_type):
+                self.release.wait(5)
+                return key
+
+        backend = BlockingBackend()
+        service = self.uploads.UploadService(backend, max_workers=1, max_pending=1)
+        self.addCleanup(service.shutdown)
+        self.addCleanup(backend.release.set)
+        futures = [service.submit(self.PNG), service.submit(self.PNG)]
+        with self.assertRaises(self.uploads.UploadQueueFull):
+            service.submit(self.PNG)
+        backend.release.set()
+        for future in futures:
+            future.result(timeout=5)
+        service.submit(self.PNG).result(timeout=5)
+
+    def test_upload_view_returns_job(self):
+        """测试上传接口不等待上传完成，返回任务ID"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        User.objects.create_user(username='staff', password='testpassword', is_staff=True)
+        self.client.login(username='staff', password='testpassword')
+        pdf = SimpleUploadedFile('a.pdf', b'%PDF-1.4 test')
+        response = self.client.post(reverse('upload_file'), {'file': pdf})
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(response.json()['job_id'])
+        self.uploads.get_upload_service().shutdown()
+        status = self.client.get(response.json()['status_url']).json()
+        self.assertEqual(status['status'], 'done')
+        self.assertTrue(status['url'].endswith('.pdf'))
+        self.assertEqual(self.client.get(reverse('upload_status', args=['missing'])).status_code, 404)
+
+    def test_upload_folder_cannot_escape_root(self):
+        """测试上传目录名按白名单校验，本地后端拒绝写到根目录之外"""
+        import os
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        User.objects.create_user(username='staff', password='testpassword', is_staff=True)
+        self.client.login(username='staff', password='testpassword')
+        for folder in ('../../..', 'a/b', 'Images', ''):
+            with self.subTest(folder=folder):
+                pdf = SimpleUploadedFile('a.pdf', b'%PDF-1.4 test')
+                response = self.client.post(reverse('upload_file'), {'file': pdf, 'folder': folder})
+                self.assertEqual(response.status_code, 400)
+        with self.assertRaises(self.uploads.UploadError):
+            self.uploads.submit_upload(self.PNG, folder='..')
+
+        backend = self.uploads.LocalBackend(root=os.path.join(self.media.name, 'uploads'))
+        with self.assertRaises(self.uploads.UploadError):
+            backend.put('../escaped.png', self.PNG, 'image/png')
+        self.assertFalse(os.path.exists(os.path.join(self.media.name, 'escaped.png')))
+        self.assertTrue(backend.put('blog-yk/covers/ok.png', self.PNG, 'image/png').endswith('/blog-yk/covers/ok.png'))
+
+
+class ImagePipelineTests(TransactionTestCase):
+    def setUp(self):
+        import tempfile
+        from django.test.utils import override_settings
+        from . import images, uploads
+        self.images = images
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        overrides = override_settings(MEDIA_ROOT=self.media.name, IMAGE_WORKERS=2)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        uploads.reset_upload_service()
+        self.addCleanup(uploads.reset_upload_service)
+        self.addCleanup(images.shutdown_process_pool)
+
+    def make_image(self, size, mode='RGB', fmt='PNG'):
+        import io
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new(mode, size, (200, 100, 50, 128)[:len(mode)]).save(buffer, fmt)
+        return buffer.getvalue()
+
+    def test_make_variants(self):
+        """测试生成各尺寸的 WebP/JPEG 版本，小图不放大，透明图转 JPEG 时铺底色"""
+        import io
+        from PIL import Image
+        width, height, variants = self.images.make_variants(self.make_image((2000, 1000), 'RGBA'))
+        self.assertEqual((width, height), (2000, 1000))
+        sizes = {(v.name, v.format): (v.width, v.height) for v in variants}
+        self.assertEqual(sizes[('thumb', 'webp')], (320, 160))
+        self.assertEqual(sizes[('card', 'jpeg')], (800, 400))
+        self.assertEqual(sizes[('full', 'jpeg')], (1600, 800))
+        jpeg = next(v for v in variants if v.format == 'jpeg')
+        self.assertEqual(Image.open(io.BytesIO(jpeg.data)).mode, 'RGB')
+
+        _, _, variants = self.images.make_variants(self.make_image((200, 100), fmt='JPEG'))
+        self.assertEqual({(v.width, v.height) for v in variants}, {(200, 100)})
+
+    def test_pipeline_records_variants_for_srcset(self):
+        """测试处理并上传后记录版本地址，封面保存时填写 srcset 所需数据"""
+        user = User.objects.create_user(username='artist', password='testpassword')
+        info = self.images.submit_image(self.make_image((1200, 600)), folder='covers').result(timeout=30)
+        self.assertTrue(info['url'].endswith('.jpg'))
+        self.assertEqual(set(info['variants']), {'thumb', 'card', 'full'})
+
+        post = Post.objects.create(
+            title='Cover', content='Content', author=user, status='published',
+            cover_image='http://testserver' + info['url'],
+        )
+        self.assertEqual(post.cover_variants, {})
+        post.cover_image = info['url']
+        post.save()
+        self.assertEqual(post.cover_variants['variants']['thumb']['width'], 320)
+
+        response = self.client.get(post.get_absolute_url())
+        webp = info['variants']['card']['webp']
+        self.assertContains(response, f'{webp} 800w')
+        self.assertContains(response, 'type="image/webp"')
+
+
+class ImportPostsTests(TestCase):
+    def setUp(self):
+        import tempfile
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.admin = User.objects.create_superuser(username='admin', password='testpassword')
+        Post.objects.create(title='Hello World', content='Existing', author=self.admin, slug='hello-world')
+
+    def write_jsonl(self, records):
+        import json
+        import os
+        path = os.path.join(self.tmp.name, 'posts.jsonl')
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return path
+
+    def test_import_jsonl_in_batches(self):
+        """测试 JSONL 分批导入：slug 去重、分类标签批量创建、查询数与文章数无关"""
+        from io import StringIO
+        from django.core.management import call_command
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        records = [
+            {'title': 'Hello World', 'content': f'# 第 {i} 篇\n\n正文', 'category': 'Python',
+             'tags': ['django', '性能'], 'date': '2023-05-01'}
+            for i in range(25)
+        ]
+        records.append({'title': '中文标题', 'content': '内容', 'tags': 'django, 中文', 'status': 'draft'})
+        path = self.write_jsonl(records)
+
+        with CaptureQueriesContext(connection) as ctx:
+            call_command('import_posts', path, batch_size=10, skip_rebuild=True, stdout=StringIO())
+        # 3 批，每批查询数固定
+        self.assertLess(len(ctx.captured_queries), 3 * 15)
+
+        slugs = set(Post.objects.values_list('slug', flat=True))
+        self.assertEqual(len(slugs), 27)
+        self.assertIn('hello-world-26', slugs)
+        self.assertEqual(Category.objects.get(name='Python').post_set.count(), 25)
+        self.assertEqual(Tag.objects.get(name='django').post_set.count(), 26)
+        self.assertTrue(Tag.objects.get(name='性能').slug.startswith('tag-'))
+
+        imported = Post.objects.get(slug='hello-world-2')
+        from django.utils import timezone
+        self.assertEqual(timezone.localtime(imported.published_at).date().isoformat(), '2023-05-01')
+        self.assertIn('<h1', imported.content_html)
+        draft = Post.objects.get(title='中文标题')
+        self.assertEqual((draft.status, draft.published_at), ('draft', None))
+        self.assertTrue(draft.slug.startswith('post-'))
+
+    def test_tag_names_differing_in_case(self):
+        """只差大小写的标签对应同一条记录；插入被数据库忽略时明确报错而不是丢失标签"""
+        from unittest import mock
+        from .importer import ImportDataError, PostImporter, normalize
+        author = self.admin
+        importer = PostImporter(author)
+        importer.write_batch([
+            normalize({'title': 'A', 'content': '正文', 'tags': ['Django', 'django'], 'category': 'Web'}),
+            normalize({'title': 'B', 'content': '正文', 'tags': ['DJANGO'], 'category': 'web'}),
+        ])
+        self.assertEqual(list(Tag.objects.values_list('name', flat=True)), ['DJANGO'])
+        self.assertEqual(Tag.objects.get().post_set.count(), 2)
+        self.assertEqual(Category.objects.get().post_set.count(), 2)
+
+        # 不区分大小写的排序规则下查询 "python" 返回已有的 "Python"
+        cache = {}
+        PostImporter._match_names(cache, {'python', 'Go'}, [('Python', 7)])
+        self.assertEqual(cache, {'python': 7})
+
+        with mock.patch.object(Tag.objects, 'bulk_create'), self.assertRaises(ImportDataError):
+            PostImporter(author).write_batch([normalize({'title': 'C', 'content': '正文', 'tags': ['Café']})])
+
+    def test_import_markdown_directory(self):
+        """测试导入 Markdown 目录，重复导入时按 slug 跳过，导入后重建派生数据"""
+        import os
+        from io import StringIO
+        from django.core.management import call_command
+        from .search import search_post_ids
+        from .stats import get_stats
+        with open(os.path.join(self.tmp.name, 'first-post.md'), 'w', encoding='utf-8') as f:
+            f.write('---\ntitle: First Post\ndate: 2024-01-02 08:30\ncategories: [笔记]\n'
+                    'tags:\n  - redis\n  - cache\n---\nRedis 缓存实践\n')
+        with open(os.path.join(self.tmp.name, 'second.md'), 'w', encoding='utf-8') as f:
+            f.write('没有 front matter 的文章\n')
+
+        out = StringIO()
+        call_command('import_posts', self.tmp.name, stdout=out)
+        self.assertIn('已导入 2 篇文章', out.getvalue())
+        post = Post.objects.get(slug='first-post')
+        self.assertEqual(post.category.name, '笔记')
+        self.assertEqual(sorted(post.tags.values_list('name', flat=True)), ['cache', 'redis'])
+        self.assertEqual(search_post_ids('redis'), [post.pk])
+        self.assertEqual(get_stats()['total_posts'], 3)
+
+        out = StringIO()
+        call_command('import_posts', self.tmp.name, skip_rebuild=True, stdout=out)
+        self.assertIn('跳过 2 篇', out.getvalue())
+
+# 仓库中尚未提供的列表模板，用最简模板代替以便执行视图中的全部查询
+PLAN_TEST_TEMPLATES = {
+    name: '{% for post in page_obj %}{{ post.title }}{% endfor %}{{ archive_data }}'
+    for name in [
+        'blog/category_detail.html', 'blog/tag_detail.html', 'blog/archive.html',
+        'blog/archive_month.html', 'blog/search_results.html',
+    ]
+}
+
+
+def stub_template_settings():
+    """在项目模板之前加载 PLAN_TEST_TEMPLATES 的模板配置"""
+    from django.conf import settings
+    return [{
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': settings.TEMPLATES[0]['DIRS'],
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+                'blog_app.context_processors.site_settings',
+                'blog_app.context_processors.navigation_context',
+            ],
+            'loaders': [
+                ('django.template.loaders.locmem.Loader', PLAN_TEST_TEMPLATES),
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ],
+        },
+    }]
+
+
+class QueryPlanTests(TestCase):
+    """对公开视图执行的每条查询运行 EXPLAIN，热点表必须走索引查找"""
+    HOT_TABLES = ('blog_app_post', 'blog_app_comment', 'blog_app_searchposting')
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        user = User.objects.create_user(username='planner', password='testpassword')
+        self.category = Category.objects.create(name='Plan', slug='plan')
+        self.tag = Tag.objects.create(name='Plan', slug='plan')
+        self.post = None
+        for i in range(3):
+            post = Post.objects.create(
+                title=f'Plan {i}', content='查询计划', author=user,
+                category=self.category, status='published'
+            )
+            post.tags.add(self.tag)
+            Comment.objects.create(post=post, user=user, content='Hi', is_approved=True)
+            self.post = post
+
+    def plan_problems(self, url, data=None):
+        """
+        访问页面，检查涉及热点表的每条查询的执行计划，返回问题列表
+        热点表必须以 SEARCH ... USING INDEX（或主键）访问，不允许任何形式的 SCAN（包括全索引扫描）和临时 B 树排序
+        """
+        import re
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext, override_settings
+
+        templates = stub_template_settings()
+        with override_settings(TEMPLATES=templates, PAGE_CACHE_ENABLED=False):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+
+        tables = '|'.join(self.HOT_TABLES)
+        access_re = re.compile(rf'^(SCAN|SEARCH) ({tables})(?:\s|$)')
+        indexed_re = re.compile(rf'^SEARCH ({tables}) USING (?:COVERING INDEX|INDEX|INTEGER PRIMARY KEY)\b')
+        problems = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = [row[-1] for row in cursor.fetchall()]
+                touched = {match.group(2) for match in map(access_re.match, plan) if match}
+                if not touched:
+                    continue
+                indexed = {match.group(1) for match in map(indexed_re.match, plan) if match}
+                for line in plan:
+                    if line.startswith('SCAN ') and access_re.match(line) or line == 'USE TEMP B-TREE FOR ORDER BY':
+                        problems.append(f'{line}: {sql}')
+                for table in sorted(touched - indexed):
+                    problems.append(f'{table} 未使用索引: {sql}')
+        return problems
+
+    def test_public_views_use_indexes(self):
+        """测试公开视图的热点查询都命中索引"""
+        from django.db import connection
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN 仅适用于 SQLite')
+        pages = [
+            (reverse('home'), None),
+            (reverse('home'), {'page': 1}),
+            (reverse('post_detail', kwargs={'slug': self.post.slug}), None),
+            (reverse('category_detail', kwargs={'slug': self.category.slug}), None),
+            (reverse('tag_detail', kwargs={'slug': self.tag.slug}), None),
+            (reverse('archive'), None),
+            (reverse('archive_month', kwargs={'year': self.post.published_at.year, 'month': self.post.published_at.month}), None),
+            (reverse('search'), {'q': '查询'}),
+        ]
+        for url, data in pages:
+            with self.subTest(url=url, data=data):
+                self.assertEqual(self.plan_problems(url, data), [])
+
+
+class StaticExportTests(TestCase):
+    def setUp(self):
+        import tempfile
+        from django.core.cache import cache
+        cache.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        user = User.objects.create_user(username='exporter', password='testpassword')
+        self.category = Category.objects.create(name='Export', slug='export')
+        self.posts = [
+            Post.objects.create(
+                title=f'Export {i}', content=f'静态导出 {i}', author=user,
+                category=self.category, status='published'
+            )
+            for i in range(12)
+        ]
+
+    def export(self, **kwargs):
+        from django.test.utils import override_settings
+        from .static_export import export_site
+        with override_settings(TEMPLATES=stub_template_settings()):
+            return export_site(self.tmp.name, workers=1, **kwargs)
+
+    def read(self, path):
+        import os
+        with open(os.path.join(self.tmp.name, *path.split('/')), encoding='utf-8') as f:
+            return f.read()
+
+    def test_export_renders_all_pages(self):
+        """测试导出首页分页、文章详情、分类和归档页面，且不计阅读量"""
+        from .view_counter import get_pending_views
+        result = self.export()
+        self.assertEqual(result.failed, 0)
+        self.assertIn('Export 11', self.read('index.html'))
+        self.assertIn('Export 0', self.read('page/2/index.html'))
+        self.assertIn('静态导出 5', self.read(f'post/{self.posts[5].slug}/index.html'))
+        self.assertIn('Export 1', self.read('category/export/page/2/index.html'))
+        self.read('archive/index.html')
+        self.assertEqual(get_pending_views([self.posts[5].pk]), {})
+
+    def test_incremental_export(self):
+        """测试再次导出只重新生成输入变化的页面，并删除已撤回文章的页面"""
+        import os
+        first = self.export()
+        second = self.export()
+        self.assertEqual((second.rendered, second.skipped), (0, first.rendered))
+
+        edited = self.posts[0]
+        edited.content = '更新后的正文'
+        edited.save()
+        third = self.export()
+        # 文章本身、相邻的下一篇、首页第2页、分类第2页和所在月份归档第2页
+        self.assertLessEqual(third.rendered, 6)
+        self.assertIn('更新后的正文', self.read(f'post/{edited.slug}/index.html'))
+
+        hidden = self.posts[11]
+        hidden.status = 'draft'
+        hidden.save()
+        fourth = self.export()
+        self.assertEqual(fourth.removed, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, 'post', hidden.slug)))
+
+
+class FeedAndSitemapTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        # 首次读取网站设置时会创建记录并使页面代数变化
+        SiteSettings.get_settings()
+        self.user = User.objects.create_user(username='feeder', password='testpassword')
+        self.category = Category.objects.create(name='Feeds', slug='feeds')
+        self.tag = Tag.objects.create(name='RSS', slug='rss')
+        self.post = Post.objects.create(
+            title='Feed Post', content='订阅源', author=self.user,
+            category=self.category, status='published'
+        )
+        self.post.tags.add(self.tag)
+
+    def test_feeds(self):
+        """测试全站、分类和标签订阅源"""
+        response = self.client.get(reverse('post_feed'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('application/rss+xml', response['Content-Type'])
+        self.assertContains(response, 'Feed Post')
+        response = self.client.get(reverse('post_feed_atom'))
+        self.assertIn('application/atom+xml', response['Content-Type'])
+        self.assertContains(response, 'term="RSS"')
+        self.assertContains(self.client.get(reverse('category_feed', args=['feeds'])), 'Feed Post')
+        self.assertContains(self.client.get(reverse('tag_feed_atom', args=['rss'])), 'Feed Post')
+        self.assertEqual(self.client.get(reverse('tag_feed', args=['missing'])).status_code, 404)
+
+    def test_feed_snapshot_and_conditional_get(self):
+        """测试订阅源快照：ETag 命中时不查询数据库，发布文章后失效"""
+        url = reverse('post_feed')
+        first = self.client.get(url)
+        etag = first['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        Post.objects.create(title='Second Feed Post', content='新文章', author=self.user, status='published')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Second Feed Post')
+
+    def test_snapshot_expires_by_default(self):
+        """测试快照默认按 PAGE_CACHE_TIMEOUT 过期，代数变化后旧快照不会一直留在缓存中"""
+        from unittest import mock
+        from django.core.cache import cache
+        from django.test.utils import override_settings
+        with override_settings(PAGE_CACHE_TIMEOUT=120), mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            self.client.get(reverse('post_feed'))
+        timeouts = [call.args[2] for call in cache_set.call_args_list if call.args[0].startswith('blog:page:')]
+        self.assertEqual(timeouts, [120])
+
+    def test_sitemap_segments(self):
+        """测试站点地图索引按条数上限分段"""
+        from unittest import mock
+        from .sitemaps import PostSitemap
+        for i in range(2):
+            Post.objects.create(title=f'Map {i}', content='站点地图', author=self.user, status='published')
+        with mock.patch.object(PostSitemap, 'limit', 2):
+            response = self.client.get(reverse('sitemap_index'))
+            self.assertContains(response, 'sitemap-posts.xml?p=2')
+            self.assertContains(response, 'sitemap-categories.xml')
+            response = self.client.get(reverse('sitemap_section', args=['posts']), {'p': 2})
+        self.assertContains(response, '<loc>', count=1)
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(self.client.get(reverse('sitemap_section', args=['missing'])).status_code, 404)
+
+
+class AsyncViewTests(TransactionTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        SiteSettings.get_settings()
+        self.user = User.objects.create_user(username='asyncer', password='testpassword')
+        self.category = Category.objects.create(name='Async', slug='async')
+        self.posts = [
+            Post.objects.create(
+                title=f'Async Post {i}', content=f'异步视图 {i}', author=self.user,
+                category=self.category, status='published', is_featured=i == 0
+            )
+            for i in range(3)
+        ]
+        Comment.objects.create(post=self.posts[1], user=self.user, content='Async comment', is_approved=True)
+
+    def request(self, path, data=None, **kwargs):
+        from django.contrib.auth.models import AnonymousUser
+        from django.test import AsyncRequestFactory
+        request = AsyncRequestFactory().get(path, data, **kwargs)
+        request.user = AnonymousUser()
+        return request
+
+    async def test_home(self):
+        """测试异步首页并发加载各组数据，再次访问命中整页缓存"""
+        from . import async_views
+        response = await async_views.home(self.request('/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Async Post 2')
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        response = await async_views.home(self.request('/'))
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+
+    async def test_post_detail(self):
+        """测试异步详情页：评论、阅读量和条件请求"""
+        from django.http import Http404
+        from . import async_views
+        from .view_counter import get_pending_views
+        post = self.posts[1]
+        url = post.get_absolute_url()
+        response = await async_views.post_detail(self.request(url), slug=post.slug)
+        self.assertContains(response, 'Async comment')
+        response = await async_views.post_detail(
+            self.request(url, headers={'If-None-Match': response['ETag']}), slug=post.slug
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(get_pending_views([post.pk])[post.pk], 2)
+        with self.assertRaises(Http404):
+            await async_views.post_detail(self.request('/post/missing/'), slug='missing')
+
+    async def test_search(self):
+        """测试异步搜索按索引顺序返回文章"""
+        from django.test.utils import override_settings
+        from . import async_views
+        with override_settings(TEMPLATES=stub_template_settings()):
+            response = await async_views.search(self.request('/search/', {'q': '异步视图'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Async Post 0')
+
+
+class CommentThrottleTests(TestCase):
+    def setUp(self):
+        from . import comment_guard
+        comment_guard.reset()
+        self.addCleanup(comment_guard.reset)
+        self.user = User.objects.create_user(username='commenter', password='testpassword')
+        self.post = Post.objects.create(title='Throttle Post', content='正文', author=self.user, status='published')
+        self.url = reverse('add_comment', args=[self.post.slug])
+        self.client.login(username='commenter', password='testpassword')
+
+    def test_rate_limit_rejects_before_database(self):
+        """超过限流的评论不查询数据库，AJAX 请求返回 429 JSON"""
+        from django.test.utils import override_settings
+        limits = {'ip': (5, 60), 'user': (2, 60), 'post': (30, 60)}
+        with override_settings(COMMENT_RATE_LIMITS=limits):
+            for i in range(2):
+                self.client.post(self.url, {'content': f'第 {i} 条评论'})
+            # 只剩读取会话用户的查询
+            with self.assertNumQueries(1):
+                response = self.client.post(self.url, {'content': '第三条评论'}, CONTENT_TYPE='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(response.json()['success'])
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_near_duplicate_rejected(self):
+        """近似重复的评论被拒绝，普通表单提交返回文章页"""
+        text = '这篇文章写得非常好，学到了很多关于 Django 缓存和查询优化的知识，感谢分享！'
+        self.client.post(self.url, {'content': text})
+        response = self.client.post(self.url, {'content': text.replace('非常', '很')})
+        self.assertRedirects(response, self.post.get_absolute_url(), fetch_redirect_response=False)
+        response = self.client.post(self.url, {'content': '完全不同的一条评论：图片上传队列在高峰期会不会积压？'})
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_simhash_distance(self):
+        from .comment_guard import hamming_distance, simhash
+        base = simhash('异步视图在远程数据库下并发执行多个查询，可以明显降低首页的响应时间')
+        near = simhash('异步视图在远程数据库下并发执行多个查询，可以明显降低首页响应时间')
+        far = simhash('Sliding window token buckets keep comment floods away from the database')
+        self.assertLessEqual(hamming_distance(base, near), 8)
+        self.assertGreater(hamming_distance(base, far), 16)
+
+
+class CommentModerationTests(TestCase):
+    def setUp(self):
+        from . import stats
+        self.stats = stats
+        self.staff = User.objects.create_user(username='moderator', password='testpassword', is_staff=True)
+        self.post = Post.objects.create(title='Moderated', content='正文', author=self.staff, status='published')
+        self.other = Post.objects.create(title='Other', content='正文', author=self.staff, status='published')
+        self.spam = [
+            Comment.objects.create(post=self.post, user=self.staff, content=f'spam {i}', ip_address='10.0.0.1')
+            for i in range(7)
+        ]
+        self.reply = Comment.objects.create(post=self.post, user=self.staff, content='reply', parent=self.spam[0], is_approved=True)
+        self.nested = Comment.objects.create(post=self.post, user=self.staff, content='nested', parent=self.reply)
+        self.kept = Comment.objects.create(post=self.other, user=self.staff, content='ok', ip_address='10.0.0.2')
+        self.stats.reconcile()
+        self.client.login(username='moderator', password='testpassword')
+
+    def assertCountersExact(self):
+        self.assertEqual(self.stats.get_stats(), self.stats.compute_stats())
+
+    def test_approve_by_filter_in_chunks(self):
+        """按条件分块批准，每块一条 UPDATE，计数和页面缓存代数同步更新"""
+        from .moderation import moderate, select_comments
+        from .page_cache import get_generations
+        before = get_generations([f'comments:{self.post.slug}', f'comments:{self.other.slug}'])
+        comments = select_comments(post=self.post.slug, approved=False)
+        # 每块：取主键、UPDATE、调整计数（外加事务保存点两条）；最后一次空块和一次取 slug
+        with self.assertNumQueries(3 * 5 + 2):
+            result = moderate(comments, 'approve', chunk_size=3)
+        self.assertEqual((result.matched, result.affected), (8, 8))
+        self.assertFalse(Comment.objects.filter(post=self.post, is_approved=False).exists())
+        self.assertFalse(Comment.objects.get(pk=self.kept.pk).is_approved)
+        after = get_generations([f'comments:{self.post.slug}', f'comments:{self.other.slug}'])
+        self.assertNotEqual(before[0], after[0])
+        self.assertEqual(before[1], after[1])
+        self.assertCountersExact()
+
+    def test_delete_by_ip_removes_replies(self):
+        """按IP删除时连同回复一起删除"""
+        response = self.client.post(
+            reverse('comment_moderate'), {'action': 'delete', 'ip': '10.0.0.1'}, content_type='application/json'
+        )
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual((data['matched'], data['affected']), (7, 9))
+        self.assertEqual(list(Comment.objects.values_list('pk', flat=True)), [self.kept.pk])
+        self.assertCountersExact()
+
+    def test_invalid_ids_rejected(self):
+        """ids 不是整数列表时返回 400，不按字符逐个匹配评论"""
+        from .moderation import ModerationError, select_comments
+        with self.assertRaises(ModerationError):
+            select_comments(ids=str(self.spam[0].pk))
+        for payload in (
+            {'action': 'delete', 'ids': '123'},
+            {'action': 'delete', 'ids': {'a': 1}},
+            {'action': 'delete', 'ids': ['1', 'x']},
+            {'action': 'delete', 'ids': [1, None]},
+            {'action': 'delete', 'ids': [True]},
+            ['delete'],
+        ):
+            response = self.client.post(reverse('comment_moderate'), payload, content_type='application/json')
+            self.assertEqual(response.status_code, 400, payload)
+        self.assertEqual(Comment.objects.count(), 10)
+        response = self.client.post(
+            reverse('comment_moderate'),
+            {'action': 'approve', 'ids': [self.spam[1].pk, str(self.spam[2].pk)]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['affected'], 2)
+
+    def test_delete_very_deep_thread(self):
+        """删除超过1000层的回复链不递归，同时选中的父子评论按层级先删回复"""
+        from .moderation import moderate, select_comments
+        comments = Comment.objects.bulk_create(
+            Comment(post=self.other, user=self.staff, content=f'第{i}层', is_approved=True) for i in range(1500)
+        )
+        for parent, comment in zip(comments, comments[1:]):
+            comment.parent = parent
+        Comment.objects.bulk_update(comments[1:], ['parent'], batch_size=500)
+        self.stats.reconcile()
+
+        result = moderate(select_comments(ids=[comments[0].pk, comments[700].pk]), 'delete')
+        self.assertEqual((result.matched, result.affected), (2, 1500))
+        self.assertEqual(list(Comment.objects.filter(post=self.other).values_list('pk', flat=True)), [self.kept.pk])
+        self.assertCountersExact()
+
+    def test_form_post_with_ids(self):
+        """表单按所选ID驳回，未给出条件时返回错误"""
+        Comment.objects.filter(pk__in=[self.spam[1].pk, self.spam[2].pk]).update(is_approved=True)
+        self.stats.reconcile()
+        response = self.client.post(reverse('comment_moderate'), {
+            'action': 'reject', 'ids': [self.spam[1].pk, f'{self.spam[2].pk},{self.spam[3].pk}'],
+        })
+        self.assertRedirects(response, reverse('comment_list'), fetch_redirect_response=False)
+        self.assertEqual(Comment.objects.filter(is_approved=True).count(), 1)
+        self.assertCountersExact()
+
+        response = self.client.post(reverse('comment_moderate'), {'action': 'approve'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from django.test.utils import override_settings
+        from . import instrumentation
+        self.instrumentation = instrumentation
+        cache.clear()
+        instrumentation.clear()
+        overrides = override_settings(INSTRUMENTATION_SAMPLE_RATE=1, PAGE_CACHE_ENABLED=False)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.user = User.objects.create_user(username='perf', password='testpassword', is_staff=True)
+        self.post = Post.objects.create(title='Timed', content='正文', author=self.user, status='published')
+
+    def test_sampled_request_recorded(self):
+        """抽中的请求记入环形缓冲区，Server-Timing 响应头只发给管理员"""
+        from django.test.utils import override_settings
+        with override_settings(TEMPLATES=stub_template_settings()):
+            response = self.client.get(self.post.get_absolute_url())
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('Server-Timing', response)
+            with override_settings(INSTRUMENTATION_SERVER_TIMING=True):
+                self.assertIn('Server-Timing', self.client.get(self.post.get_absolute_url()))
+            self.client.login(username='perf', password='testpassword')
+            response = self.client.get(self.post.get_absolute_url())
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries')
+        entry = self.instrumentation.recent_requests(1)[0]
+        self.assertEqual(entry['view'], 'post_detail')
+        self.assertGreater(entry['queries'], 0)
+        self.assertGreater(entry['cache_hits'] + entry['cache_misses'], 0)
+        self.assertGreater(entry['template_ms'], 0)
+
+        with override_settings(INSTRUMENTATION_SAMPLE_RATE=0):
+            response = self.client.get(self.post.get_absolute_url() + 'missing/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(len(self.instrumentation.recent_requests()), 3)
+
+    def test_duplicate_query_fingerprints(self):
+        """同一查询仅参数不同时归为一个指纹，用于发现 N+1"""
+        from .instrumentation import RequestRecorder, _current
+        recorder = RequestRecorder()
+        token = _current.set(recorder)
+        try:
+            for pk in range(3):
+                list(Post.objects.filter(pk__in=[pk, pk + 1]))
+            Category.objects.count()
+        finally:
+            _current.reset(token)
+        self.assertEqual(recorder.queries, 4)
+        [(sql, count, _)] = recorder.duplicates()
+        self.assertEqual(count, 3)
+        self.assertIn('IN (...)', sql)
+
+    def test_async_middleware_and_dashboard(self):
+        """中间件在异步请求中同样记录，管理面板以 JSON 返回汇总"""
+        from asgiref.sync import async_to_sync, sync_to_async
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from .instrumentation import InstrumentationMiddleware
+
+        async def view(request):
+            await sync_to_async(lambda: list(Post.objects.all()))()
+            return HttpResponse('ok')
+
+        middleware = InstrumentationMiddleware(view)
+        request = RequestFactory().get('/async/')
+        request.user = self.user
+        response = async_to_sync(middleware)(request)
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertEqual(self.instrumentation.recent_requests(1)[0]['queries'], 1)
+
+        self.client.login(username='perf', password='testpassword')
+        data = self.client.get(reverse('performance_dashboard'), {'format': 'json'}).json()
+        self.assertIn('/async/', [row['view'] for row in data['summary']])
+
+
+class ReplicaRoutingTests(TestCase):
+    # replica 是另一个内存数据库，结构相同但没有数据，相当于复制延迟中的从库
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        from django.test.utils import override_settings
+        from . import comment_guard, db_router
+        self.db_router = db_router
+        comment_guard.reset()
+        db_router.reset_health()
+        self.addCleanup(comment_guard.reset)
+        self.addCleanup(db_router.reset_health)
+        overrides = override_settings(
+            DATABASE_REPLICAS={'replica': 1},
+            DATABASE_ROUTERS=['blog_app.db_router.PrimaryReplicaRouter'],
+            PAGE_CACHE_ENABLED=False,
+            TEMPLATES=stub_template_settings(),
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.user = User.objects.create_user(username='reader', password='testpassword')
+        self.post = Post.objects.create(title='Routed', content='正文', author=self.user, status='published')
+
+    def run_middleware(self, method, path):
+        """经过中间件执行视图，返回视图中读查询使用的数据库"""
+        from django.http import HttpResponse
+        from django.test import RequestFactory
+        from .db_router import ReplicaRoutingMiddleware
+        used = []
+
+        def view(request):
+            used.append(Post.objects.all().db)
+            return HttpResponse('ok')
+
+        request = getattr(RequestFactory(), method.lower())(path)
+        ReplicaRoutingMiddleware(view)(request)
+        return used[0]
+
+    def test_reads_stay_on_primary_after_write(self):
+        """公开页面读从库；用户发表评论后在粘滞窗口内读主库，过期后回到从库"""
+        from .db_router import STICKY_COOKIE
+        url = self.post.get_absolute_url()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        self.client.login(username='reader', password='testpassword')
+        response = self.client.post(reverse('add_comment', args=[self.post.slug]), {'content': '主库评论'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'], 10)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.client.cookies[STICKY_COOKIE] = '0'
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_public_get_does_not_stick(self):
+        """匿名访问公开页面（包括网站设置缓存未命中时）不设置粘滞 Cookie，读查询留在从库"""
+        from django.core.cache import cache
+        from .db_router import STICKY_COOKIE
+        SiteSettings.get_settings()
+        for _ in range(2):
+            cache.clear()
+            response = self.client.get(reverse('home'))
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(self.client.get(self.post.get_absolute_url()).status_code, 404)
+
+    def test_cache_fill_after_bump_reads_primary(self):
+        """代数刚递增时未命中缓存的请求读主库后再写入缓存，不把落后从库上的旧内容缓存到新代数下"""
+        from django.core.cache import cache
+        from django.test.utils import override_settings
+        url = self.post.get_absolute_url()
+        SiteSettings.get_settings()
+        with override_settings(PAGE_CACHE_ENABLED=True):
+            cache.clear()
+            # 修改文章使代数递增，从库尚未同步这次写入
+            self.post.title = 'Republished'
+            self.post.save()
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['X-Page-Cache'], 'MISS')
+            self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+            self.assertContains(self.client.get(reverse('post_feed')), 'Republished')
+
+            # 窗口过期（标记被清除）后未命中缓存的请求回到从库
+            cache.clear()
+            self.assertEqual(self.client.get(url).status_code, 404)
+            self.assertNotContains(self.client.get(reverse('post_feed')), 'Republished')
+
+    def test_primary_paths_and_unsafe_methods(self):
+        self.assertEqual(self.run_middleware('GET', '/'), 'replica')
+        self.assertEqual(self.run_middleware('GET', '/dashboard/comments/'), 'default')
+        self.assertEqual(self.run_middleware('POST', '/search/'), 'default')
+        # 请求之外（管理命令、后台线程）读主库
+        self.assertEqual(Post.objects.all().db, 'default')
+
+    def test_failed_replica_ejected(self):
+        """从库连接失败时暂停使用并退回主库，查询出错的从库同样暂停"""
+        from unittest import mock
+        from django.db import OperationalError, connections
+        with mock.patch.object(connections['replica'], 'ensure_connection', side_effect=OperationalError('down')):
+            self.assertEqual(self.run_middleware('GET', '/'), 'default')
+        self.assertEqual(self.db_router.healthy_replicas(), {})
+        # 暂停期间不再尝试连接
+        self.assertEqual(self.run_middleware('GET', '/'), 'default')
+
+        self.db_router.reset_health()
+        self.assertEqual(self.run_middleware('GET', '/'), 'replica')
+
+        def failing_execute(sql, params, many, context):
+            raise OperationalError('lost connection')
+
+        with self.assertRaises(OperationalError):
+            self.db_router._watch_replica_errors(failing_execute, 'SELECT 1', (), False, {'connection': connections['replica']})
+        self.assertEqual(self.db_router.healthy_replicas(), {})
+
+    def test_weighted_selection(self):
+        import random
+        from django.test.utils import override_settings
+        random.seed(0)
+        with override_settings(DATABASE_REPLICAS={'replica': 3, 'default': 1}):
+            picks = [self.db_router.choose_replica() for _ in range(2000)]
+        self.assertAlmostEqual(picks.count('replica') / len(picks), 0.75, delta=0.05)
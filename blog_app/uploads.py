@@ -0,0 +1,260 @@
+"""
+文件上传服务
+
+上传任务提交到有界线程池后立即返回，请求处理不等待对象存储；
+任务状态写入共享缓存，可按任务ID在任意进程中查询。
+存储后端可通过 ``UPLOAD_BACKEND`` 配置替换，测试和开发环境可使用本地文件系统后端。
+"""
+import logging
+import mimetypes
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+JOB_KEY = 'blog:upload:{}'
+JOB_TIMEOUT = 24 * 3600
+
+# 常见文件的魔数，用于识别真实的内容类型
+SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'%PDF-', 'application/pdf'),
+]
+EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+    'image/svg+xml': 'svg',
+    'application/pdf': 'pdf',
+}
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+# 上传目录名只允许小写字母、数字、下划线和连字符，防止 ../ 等写到存储根目录之外
+FOLDER_RE = re.compile(r'^[a-z0-9_-]+$')
+
+
+class UploadError(Exception):
+    """上传失败，retryable 表示是否值得重试（网络错误、服务端错误）"""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class UploadQueueFull(UploadError):
+    """等待上传的任务过多"""
+
+
+def detect_content_type(data, filename=None):
+    """根据文件头识别内容类型，无法识别时根据文件名猜测"""
+    head = bytes(data[:16])
+    for signature, content_type in SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if filename:
+        guessed, _ = mimetypes.guess_type(filename)
+        if guessed:
+            return guessed
+    return DEFAULT_CONTENT_TYPE
+
+
+def check_folder(folder):
+    """校验上传目录名，不合法时抛出 UploadError"""
+    if not isinstance(folder, str) or not FOLDER_RE.match(folder):
+        raise UploadError(f'无效的上传目录: {folder!r}')
+    return folder
+
+
+def get_extension(content_type):
+    return EXTENSIONS.get(content_type) or (mimetypes.guess_extension(content_type) or '.bin').lstrip('.')
+
+
+# ==================== 存储后端 ====================
+
+class LocalBackend:
+    """保存到 MEDIA_ROOT 的本地文件系统后端"""
+
+    def __init__(self, root=None, base_url=None):
+        self.root = str(root or settings.MEDIA_ROOT)
+        self.base_url = base_url or settings.MEDIA_URL
+
+    def put(self, key, data, content_type):
+        root = os.path.realpath(self.root)
+        path = os.path.realpath(os.path.join(root, *key.split('/')))
+        if os.path.commonpath([root, path]) != root or path == root:
+            raise UploadError(f'文件路径超出上传目录: {key}')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再改名，读取方不会看到写了一半的文件
+        temp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            raise UploadError(f'写入文件失败: {e}', retryable=True) from e
+        return self.base_url.rstrip('/') + '/' + key
+
+
+class QiniuBackend:
+    """七牛云存储后端，复用凭证对象、上传凭证和 SDK 的连接池"""
+    TOKEN_TTL = 3600
+    # 上传凭证剩余有效期不足该值时重新签发
+    TOKEN_REFRESH_MARGIN = 300
+
+    def __init__(self, pool_size=None):
+        from qiniu import Auth, config as qiniu_config
+
+        self.auth = Auth(settings.QINIU_ACCESS_KEY, settings.QINIU_SECRET_KEY)
+        self.bucket = settings.QINIU_BUCKET_NAME
+        self.domain = settings.QINIU_DOMAIN
+        self._token = None
+        self._token_expires = 0
+        self._lock = threading.Lock()
+        # SDK 内部共用一个 requests.Session；连接池与线程池大小一致，重试由上传服务负责
+        qiniu_config.set_default(
+            connection_pool=pool_size or getattr(settings, 'UPLOAD_MAX_WORKERS', 4),
+            connection_retries=0,
+        )
+
+    def _get_token(self):
+        with self._lock:
+            if time.time() > self._token_expires - self.TOKEN_REFRESH_MARGIN:
+                # 按空间签发的凭证可用于任意新文件名，insertOnly 禁止覆盖已有文件
+                self._token = self.auth.upload_token(self.bucket, None, self.TOKEN_TTL, {'insertOnly': 1})
+                self._token_expires = time.time() + self.TOKEN_TTL
+            return self._token
+
+    def put(self, key, data, content_type):
+        from qiniu import put_data
+
+        ret, info = put_data(self._get_token(), key, data, mime_type=content_type)
+        if info.status_code == 200:
+            return f'http://{self.domain}/{key}' if self.domain else ret.get('key')
+        # 状态码为 -1 表示网络异常
+        retryable = info.status_code in (-1, 406, 429) or info.status_code >= 500
+        raise UploadError(f'七牛云返回 {info.status_code}: {info.error}', retryable=retryable)
+
+
+# ==================== 上传服务 ====================
+
+class UploadService:
+    """
+    后台上传服务
+    :param backend: 存储后端，需实现 put(key, data, content_type) -> url
+    :param max_workers: 上传线程数
+    :param max_pending: 排队任务上限，超过时拒绝新任务
+    :param retries: 可重试错误的最大重试次数
+    :param backoff: 首次重试的等待秒数，之后指数增长
+    """
+
+    def __init__(self, backend, max_workers=4, max_pending=100, retries=3, backoff=0.5):
+        self.backend = backend
+        self.retries = retries
+        self.backoff = backoff
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload')
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+
+    def submit(self, data, folder='images', filename=None, content_type=None):
+        """
+        提交上传任务，立即返回
+        :param data: 文件内容（bytes 或可读对象，会在当前线程读入内存）
+        :return: Future，结果为文件URL，job_id 属性为任务ID
+        """
+        if hasattr(data, 'read'):
+            filename = filename or getattr(data, 'name', None)
+            data = data.read()
+        check_folder(folder)
+        content_type = content_type or detect_content_type(data, filename)
+        key = f'blog-yk/{folder}/{uuid.uuid4().hex}.{get_extension(content_type)}'
+
+        if not self._slots.acquire(blocking=False):
+            raise UploadQueueFull('上传队列已满，请稍后重试')
+        job_id = uuid.uuid4().hex
+        set_job(job_id, {'status': 'pending', 'key': key})
+        try:
+            future = self._executor.submit(self._run, job_id, key, data, content_type)
+        except RuntimeError:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        future.job_id = job_id
+        return future
+
+    def _run(self, job_id, key, data, content_type):
+        try:
+            url = self._put_with_retry(key, data, content_type)
+        except Exception as e:
+            logger.exception('上传 %s 失败', key)
+            set_job(job_id, {'status': 'failed', 'key': key, 'error': str(e)})
+            raise
+        set_job(job_id, {'status': 'done', 'key': key, 'url': url, 'content_type': content_type})
+        return url
+
+    def _put_with_retry(self, key, data, content_type):
+        for attempt in range(self.retries + 1):
+            try:
+                return self.backend.put(key, data, content_type)
+            except UploadError as e:
+                if not e.retryable or attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+                logger.warning('上传 %s 失败（%s），%.1f 秒后第 %d 次重试', key, e, delay, attempt + 1)
+                time.sleep(delay)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+def set_job(job_id, state):
+    cache.set(JOB_KEY.format(job_id), state, JOB_TIMEOUT)
+
+
+def get_job(job_id):
+    """查询上传任务状态 {'status': 'pending'|'done'|'failed', ...}，不存在时返回 None"""
+    return cache.get(JOB_KEY.format(job_id))
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_upload_service():
+    """按配置创建进程内共享的上传服务"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            backend = import_string(getattr(settings, 'UPLOAD_BACKEND', 'blog_app.uploads.QiniuBackend'))()
+            _service = UploadService(
+                backend,
+                max_workers=getattr(settings, 'UPLOAD_MAX_WORKERS', 4),
+                max_pending=getattr(settings, 'UPLOAD_MAX_PENDING', 100),
+                retries=getattr(settings, 'UPLOAD_RETRIES', 3),
+            )
+        return _service
+
+
+def reset_upload_service():
+    """关闭并丢弃共享的上传服务（配置变化后或测试中使用）"""
+    global _service
+    with _service_lock:
+        if _service is not None:
+            _service.shutdown()
+        _service = None
+
+
+def submit_upload(data, folder='images', filename=None, content_type=None):
+    return get_upload_service().submit(data, folder=folder, filename=filename, content_type=content_type)
@@ -1,18 +1,32 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import async_views, views
+
+# ASGI 入口使用异步实现的公开页面（见 blog_yk/asgi.py）
+public_views = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
     # 博客首页和文章
-    path('', views.home, name='home'),
-    path('post/<slug:slug>/', views.post_detail, name='post_detail'),
+    path('', public_views.home, name='home'),
+    path('post/<slug:slug>/', public_views.post_detail, name='post_detail'),
     path('category/<slug:slug>/', views.category_detail, name='category_detail'),
     path('tag/<slug:slug>/', views.tag_detail, name='tag_detail'),
-    path('search/', views.search, name='search'),
+    path('search/', public_views.search, name='search'),
     path('archive/', views.archive, name='archive'),
     path('archive/<int:year>/<int:month>/', views.archive_month, name='archive_month'),
     path('post/<slug:post_slug>/comment/', views.add_comment, name='add_comment'),
     
+    # 订阅源和站点地图
+    path('feed/', views.post_feed, name='post_feed'),
+    path('feed/atom/', views.post_feed, {'atom': True}, name='post_feed_atom'),
+    path('category/<slug:slug>/feed/', views.category_feed, name='category_feed'),
+    path('category/<slug:slug>/feed/atom/', views.category_feed, {'atom': True}, name='category_feed_atom'),
+    path('tag/<slug:slug>/feed/', views.tag_feed, name='tag_feed'),
+    path('tag/<slug:slug>/feed/atom/', views.tag_feed, {'atom': True}, name='tag_feed_atom'),
+    path('sitemap.xml', views.sitemap_index, name='sitemap_index'),
+    path('sitemap-<str:section>.xml', views.sitemap_section, name='sitemap_section'),
+    
     # 用户认证
     path('login/', views.CustomLoginView.as_view(), name='login'),
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
@@ -58,8 +72,12 @@ urlpatterns = [
     
     # 管理面板
     path('dashboard/', views.dashboard_home, name='dashboard_home'),
+    path('dashboard/performance/', views.performance_dashboard, name='performance_dashboard'),
     path('dashboard/posts/', views.post_list, name='post_list'),
     path('dashboard/comments/', views.comment_list, name='comment_list'),
+    path('dashboard/comments/moderate/', views.comment_moderate, name='comment_moderate'),
     path('dashboard/comments/<int:pk>/approve/', views.comment_approve, name='comment_approve'),
     path('dashboard/comments/<int:pk>/delete/', views.comment_delete, name='comment_delete'),
+    path('dashboard/upload/', views.upload_file, name='upload_file'),
+    path('dashboard/upload/<str:job_id>/', views.upload_status, name='upload_status'),
 ]
\ No newline at end of file
@@ -1,39 +1,24 @@
-import os
+import logging
 import uuid
 from django.conf import settings
-from qiniu import Auth, put_data
-import requests
+from qiniu import Auth
+
+from .uploads import submit_upload
+
+logger = logging.getLogger(__name__)
 
 
 def upload_to_qiniu(file_data, folder='images'):
     """
-    上传文件到七牛云
+    上传文件并等待完成（视图中应使用 uploads.submit_upload，避免阻塞请求）
     :param file_data: 文件数据
     :param folder: 存储文件夹
     :return: 上传后的URL或None
     """
     try:
-        access_key = settings.QINIU_ACCESS_KEY
-        secret_key = settings.QINIU_SECRET_KEY
-        bucket_name = settings.QINIU_BUCKET_NAME
-        
-        q = Auth(access_key, secret_key)
-        
-        file_extension = 'jpg'  # 默认扩展名，可以根据实际情况修改
-        filename = f'blog-yk/{folder}/{uuid.uuid4().hex}.{file_extension}'
-        
-        token = q.upload_token(bucket_name, filename, 3600)
-        
-        ret, info = put_data(token, filename, file_data)
-        
-        if info.status_code == 200:
-            domain = settings.QINIU_DOMAIN
-            return f'http://{domain}/{filename}' if domain else ret.get('key')
-        else:
-            return None
-            
-    except Exception as e:
-        print(f"上传到七牛云失败: {e}")
+        return submit_upload(file_data, folder=folder).result()
+    except Exception:
+        logger.exception('上传文件失败')
         return None
 
 
@@ -90,18 +75,22 @@ def get_client_ip(request):
 
 
 def generate_unique_slug(model_class, title, slug_field='slug'):
-    """生成唯一的slug"""
+    """生成唯一的slug（一次前缀查询取出已占用的slug）"""
     from django.utils.text import slugify
     
     base_slug = slugify(title)
     if not base_slug:
         base_slug = uuid.uuid4().hex[:8]
     
+    taken = set(
+        model_class.objects.filter(**{f'{slug_field}__startswith': base_slug})
+        .values_list(slug_field, flat=True)
+    )
     slug = base_slug
     counter = 1
     
-    while model_class.objects.filter(**{slug_field: slug}).exists():
+    while slug in taken:
         slug = f"{base_slug}-{counter}"
         counter += 1
     
-    return slug
\ No newline at end of file
+    return slug
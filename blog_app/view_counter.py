@@ -0,0 +1,197 @@
+"""
+文章阅读量写缓冲
+
+每次访问只在 Redis（不可用时退回进程内缓冲）中累加增量，
+再由 ``manage.py flush_views`` 周期性地把聚合后的增量批量写回 ``Post.views``。
+"""
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+
+from .db_router import untracked
+
+PENDING_KEY = 'blog:views:pending'
+FLUSH_BATCH_SIZE = 500
+
+
+class LocalViewBuffer:
+    """进程内阅读量缓冲（Redis 不可用时使用）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self.last_flush = time.monotonic()
+
+    def incr(self, post_id, amount=1):
+        with self._lock:
+            self._counts[post_id] += amount
+            return self._counts[post_id]
+
+    def get(self, post_ids):
+        with self._lock:
+            return {pk: self._counts[pk] for pk in post_ids if self._counts.get(pk)}
+
+    def drain(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self.last_flush = time.monotonic()
+        return dict(counts)
+
+
+class RedisViewBuffer:
+    """基于 Redis 哈希的阅读量缓冲，多个 worker 共享"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def incr(self, post_id, amount=1):
+        return self.client.hincrby(PENDING_KEY, post_id, amount)
+
+    def get(self, post_ids):
+        post_ids = list(post_ids)
+        if not post_ids:
+            return {}
+        values = self.client.hmget(PENDING_KEY, post_ids)
+        return {pk: int(v) for pk, v in zip(post_ids, values) if v}
+
+    def drain(self):
+        # 先原子地改名再读取，避免读取与删除之间的增量丢失
+        flushing_key = f'{PENDING_KEY}:flushing:{uuid.uuid4().hex}'
+        try:
+            self.client.rename(PENDING_KEY, flushing_key)
+        except Exception:
+            # 键不存在时 RENAME 会报错，说明没有待写入的增量
+            return {}
+        data = self.client.hgetall(flushing_key)
+        self.client.delete(flushing_key)
+        return {int(k): int(v) for k, v in data.items()}
+
+    def restore(self, deltas):
+        pipe = self.client.pipeline()
+        for pk, delta in deltas.items():
+            pipe.hincrby(PENDING_KEY, pk, delta)
+        pipe.execute()
+
+
+_local_buffer = LocalViewBuffer()
+
+
+def _get_redis_buffer():
+    """默认缓存为 django-redis 时返回 Redis 缓冲，否则返回 None"""
+    try:
+        from django_redis import get_redis_connection
+    except ImportError:
+        return None
+    try:
+        return RedisViewBuffer(get_redis_connection('default'))
+    except NotImplementedError:
+        return None
+
+
+def _flush_interval():
+    return getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 60)
+
+
+def record_view(post_id):
+    """记录一次阅读，返回该文章尚未写回数据库的阅读量"""
+    buffer = _get_redis_buffer()
+    if buffer is not None:
+        try:
+            return buffer.incr(post_id)
+        except Exception:
+            pass
+
+    pending = _local_buffer.incr(post_id)
+    # 进程内缓冲无法被管理命令读取，只能由本进程定期写回
+    if time.monotonic() - _local_buffer.last_flush >= _flush_interval():
+        with untracked():
+            flush_views()
+        pending = 0
+    return pending
+
+
+def get_pending_views(post_ids):
+    """获取文章尚未写回数据库的阅读量 {post_id: 增量}"""
+    post_ids = list(post_ids)
+    pending = Counter(_local_buffer.get(post_ids))
+    buffer = _get_redis_buffer()
+    if buffer is not None:
+        try:
+            pending.update(buffer.get(post_ids))
+        except Exception:
+            pass
+    return dict(pending)
+
+
+def apply_pending_views(posts):
+    """把缓冲中的阅读量叠加到文章对象上，用于模板展示"""
+    posts = list(posts)
+    pending = get_pending_views(post.pk for post in posts)
+    for post in posts:
+        post.views += pending.get(post.pk, 0)
+    return posts
+
+
+def _drain_all():
+    deltas = Counter(_local_buffer.drain())
+    buffer = _get_redis_buffer()
+    if buffer is not None:
+        try:
+            deltas.update(buffer.drain())
+        except Exception:
+            pass
+    return {pk: delta for pk, delta in deltas.items() if delta}
+
+
+def _restore(deltas):
+    """
+    写回失败时把增量放回缓冲，等待下次写回
+    flush_views 通常在管理命令中执行，进程退出后进程内缓冲即丢失，所以优先放回 Redis
+    """
+    buffer = _get_redis_buffer()
+    if buffer is not None:
+        try:
+            buffer.restore(deltas)
+            return
+        except Exception:
+            pass
+    for pk, delta in deltas.items():
+        _local_buffer.incr(pk, delta)
+
+
+def _write_deltas(deltas):
+    from .models import Post
+
+    items = list(deltas.items())
+    with transaction.atomic():
+        for start in range(0, len(items), FLUSH_BATCH_SIZE):
+            chunk = items[start:start + FLUSH_BATCH_SIZE]
+            increment = Case(
+                *[When(pk=pk, then=Value(delta)) for pk, delta in chunk],
+                default=Value(0),
+                output_field=PositiveIntegerField(),
+            )
+            Post.objects.filter(pk__in=[pk for pk, _ in chunk]).update(
+                views=F('views') + increment
+            )
+
+
+def flush_views():
+    """
+    将缓冲的阅读量批量写回数据库
+    :return: (涉及文章数, 写入的阅读量总数)
+    """
+    deltas = _drain_all()
+    if not deltas:
+        return 0, 0
+    try:
+        _write_deltas(deltas)
+    except Exception:
+        _restore(deltas)
+        raise
+    return len(deltas), sum(deltas.values())
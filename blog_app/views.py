@@ -1,103 +1,154 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
+from django.http import JsonResponse, Http404
 from django.core.paginator import Paginator
-from django.db.models import Q, F, Count
+from django.db.models import Q, Count, Max
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.http import require_POST
 from django.contrib import messages
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.views import LoginView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.contrib.sitemaps import views as sitemap_views
 from .models import Post, Category, Tag, Comment, Profile, SiteSettings
+from . import comment_guard, hot_posts, instrumentation, moderation, view_counter
+from .page_cache import Validation, cache_page_for_anonymous, cache_snapshot
+from .pagination import paginate_posts
+from .comment_tree import load_comment_page, parse_cursor
+from .search import search_post_ids
+from .related import get_related_posts
+from .stats import get_stats
+from .uploads import UploadError, UploadQueueFull, check_folder, detect_content_type, get_job, submit_upload
+from .images import PROCESSABLE_TYPES, submit_image
+from .archive import get_month_histogram, month_range
+from .static_export import is_static_export
+from .feeds import CategoryPostsFeed, LatestPostsFeed, TagPostsFeed
+from .sitemaps import SITEMAPS
 from .forms import (CommentForm, CustomUserCreationForm, UserUpdateForm, 
                    ProfileUpdateForm, CustomLoginForm, PostForm, CategoryForm, 
                    TagForm, SiteSettingsForm)
 import json
+import math
 
 
 # ==================== 博客首页和文章视图 ====================
 
+def home_loaders(request):
+    """首页上下文的各组查询，互不依赖（异步视图中并发执行）"""
+    posts = Post.objects.filter(status='published').select_related('author', 'category').prefetch_related('tags').defer(*Post.BODY_FIELDS)
+    return {
+        'page_obj': lambda: paginate_posts(request, posts, 10),
+        'featured_posts': lambda: list(Post.objects.filter(status='published', is_featured=True)[:5]),
+        'popular_posts': lambda: view_counter.apply_pending_views(hot_posts.get_hot_posts(5)),
+        'latest_posts': lambda: list(Post.objects.filter(status='published').order_by('-published_at')[:5]),
+        'categories': lambda: list(Category.objects.all()),
+        'tags': lambda: list(Tag.objects.all()[:20]),
+    }
+
+
+# 如果数据库表不存在，显示安装页面
+HOME_DB_ERROR_CONTEXT = {
+    'page_obj': None,
+    'featured_posts': [],
+    'popular_posts': [],
+    'latest_posts': [],
+    'categories': [],
+    'tags': [],
+    'db_error': True,
+    'error_message': '数据库表尚未创建，请先运行数据库迁移命令。'
+}
+
+
+@cache_page_for_anonymous('post', 'comment')
 def home(request):
     """首页视图"""
     try:
-        posts = Post.objects.filter(status='published').select_related('author', 'category').prefetch_related('tags')
-        
-        paginator = Paginator(posts, 10)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
-        
-        featured_posts = Post.objects.filter(status='published', is_featured=True)[:5]
-        popular_posts = Post.objects.filter(status='published').order_by('-views')[:5]
-        latest_posts = Post.objects.filter(status='published').order_by('-published_at')[:5]
-        categories = Category.objects.all()
-        tags = Tag.objects.all()[:20]
-        
-        context = {
-            'page_obj': page_obj,
-            'featured_posts': featured_posts,
-            'popular_posts': popular_posts,
-            'latest_posts': latest_posts,
-            'categories': categories,
-            'tags': tags,
-        }
+        context = {name: load() for name, load in home_loaders(request).items()}
     except Exception as e:
-        # 如果数据库表不存在，显示安装页面
-        context = {
-            'page_obj': None,
-            'featured_posts': [],
-            'popular_posts': [],
-            'latest_posts': [],
-            'categories': [],
-            'tags': [],
-            'db_error': True,
-            'error_message': '数据库表尚未创建，请先运行数据库迁移命令。'
-        }
+        context = dict(HOME_DB_ERROR_CONTEXT)
     return render(request, 'blog/home.html', context)
 
 
+def count_cached_view(request, meta):
+    """整页缓存命中或返回 304 时仍然记录阅读量"""
+    view_counter.record_view(meta['post_id'])
+    hot_posts.record_view(meta['post_id'])
+
+
+def post_validator(request, slug):
+    """详情页的条件请求校验值：按 slug 一次索引查询文章更新时间和最新已审核评论"""
+    approved = Q(comments__is_approved=True)
+    row = (
+        Post.objects.filter(slug=slug, status='published')
+        .annotate(comment_count=Count('comments', filter=approved), last_comment_at=Max('comments__created_at', filter=approved))
+        .values_list('pk', 'updated_at', 'comment_count', 'last_comment_at')
+        .first()
+    )
+    if row is None:
+        return None
+    pk, updated_at, comment_count, last_comment_at = row
+    last_modified = max(moment for moment in (updated_at, last_comment_at) if moment is not None)
+    return Validation((pk, updated_at, comment_count, last_comment_at), int(last_modified.timestamp()), {'post_id': pk})
+
+
+@cache_page_for_anonymous(
+    'post',
+    lambda request, slug: f'comments:{slug}',
+    vary_on_params=('comments_after',),
+    on_hit=count_cached_view,
+    validator=post_validator,
+)
 def post_detail(request, slug):
     """文章详情页"""
-    post = get_object_or_404(Post, slug=slug, status='published')
+    # 上一篇/下一篇已预先计算，随文章一起取出
+    post = get_object_or_404(post_detail_queryset(), slug=slug, status='published')
     
-    Post.objects.filter(pk=post.pk).update(views=F('views') + 1)
-    post.refresh_from_db()
-    
-    comments = Comment.objects.filter(
-        post=post, 
-        is_approved=True, 
-        parent__isnull=True
-    ).select_related('user').prefetch_related('replies__user')
-    
-    comment_form = CommentForm()
-    previous_post = post.get_previous_post()
-    next_post = post.get_next_post()
-    
-    related_posts = Post.objects.filter(
-        category=post.category,
-        status='published'
-    ).exclude(pk=post.pk)[:4]
+    # 阅读量先写入缓冲，由 flush_views 命令批量写回数据库；导出静态页面不计阅读量
+    post.views += record_post_view(request, post)
     
+    comment_page = load_comment_page(post, parse_cursor(request.GET.get('comments_after')))
+    return render_post_detail(request, post, comment_page, get_related_posts(post))
+
+
+def post_detail_queryset():
+    return Post.objects.select_related('author', 'category', 'previous_post', 'next_post').defer(
+        *[f'{neighbor}__{field}' for neighbor in ('previous_post', 'next_post') for field in Post.BODY_FIELDS]
+    )
+
+
+def record_post_view(request, post):
+    """记录一次阅读，返回尚未写回数据库的阅读量"""
+    if is_static_export(request):
+        return 0
+    hot_posts.record_view(post.pk)
+    return view_counter.record_view(post.pk)
+
+
+def render_post_detail(request, post, comment_page, related_posts):
     context = {
         'post': post,
-        'comments': comments,
-        'comment_form': comment_form,
-        'previous_post': previous_post,
-        'next_post': next_post,
+        'comments': comment_page.comments,
+        'comment_count': comment_page.count,
+        'comment_page': comment_page,
+        'comment_form': CommentForm(),
+        'previous_post': post.get_previous_post(),
+        'next_post': post.get_next_post(),
         'related_posts': related_posts,
     }
-    return render(request, 'blog/post_detail.html', context)
+    response = render(request, 'blog/post_detail.html', context)
+    response.page_cache_meta = {'post_id': post.pk}
+    return response
 
 
+@cache_page_for_anonymous('post', 'comment')
 def category_detail(request, slug):
     """分类详情页"""
     category = get_object_or_404(Category, slug=slug)
-    posts = Post.objects.filter(category=category, status='published')
+    posts = Post.objects.filter(category=category, status='published').defer(*Post.BODY_FIELDS)
     
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate_posts(request, posts, 10)
     
     context = {
         'category': category,
@@ -106,14 +157,13 @@ def category_detail(request, slug):
     return render(request, 'blog/category_detail.html', context)
 
 
+@cache_page_for_anonymous('post', 'comment')
 def tag_detail(request, slug):
     """标签详情页"""
     tag = get_object_or_404(Tag, slug=slug)
-    posts = Post.objects.filter(tags=tag, status='published')
+    posts = Post.objects.filter(tags=tag, status='published').defer(*Post.BODY_FIELDS)
     
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate_posts(request, posts, 10)
     
     context = {
         'tag': tag,
@@ -125,61 +175,56 @@ def tag_detail(request, slug):
 def search(request):
     """搜索功能"""
     query = request.GET.get('q', '').strip()
-    posts = []
-    
-    if query:
-        posts = Post.objects.filter(
-            Q(title__icontains=query) | 
-            Q(content__icontains=query) |
-            Q(excerpt__icontains=query),
-            status='published'
-        ).select_related('author', 'category').prefetch_related('tags')
-    
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_ids = search_post_ids(query) if query else []
     
+    # 分页和总数都基于索引返回的ID列表，不再额外执行COUNT
+    paginator = Paginator(post_ids, 10)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    posts = search_results_queryset(page_obj.object_list).in_bulk()
+    return render_search_results(request, query, page_obj, posts)
+
+
+def search_results_queryset(post_ids):
+    return Post.objects.filter(pk__in=post_ids, status='published').select_related(
+        'author', 'category'
+    ).prefetch_related('tags').defer(*Post.BODY_FIELDS)
+
+
+def render_search_results(request, query, page_obj, posts):
+    """按索引返回的顺序排列本页文章并渲染"""
+    page_obj.object_list = [posts[pk] for pk in page_obj.object_list if pk in posts]
     context = {
         'query': query,
         'page_obj': page_obj,
-        'total_results': posts.count() if query else 0,
+        'total_results': page_obj.paginator.count,
     }
     return render(request, 'blog/search_results.html', context)
 
 
 def archive(request):
     """文章归档页"""
-    posts = Post.objects.filter(status='published').dates('published_at', 'month', order='DESC')
-    
-    archive_data = []
-    for date in posts:
-        month_posts = Post.objects.filter(
-            status='published',
-            published_at__year=date.year,
-            published_at__month=date.month
-        ).count()
-        archive_data.append({
-            'date': date,
-            'count': month_posts
-        })
-    
     context = {
-        'archive_data': archive_data,
+        'archive_data': get_month_histogram(),
     }
     return render(request, 'blog/archive.html', context)
 
 
+@cache_page_for_anonymous('post', 'comment')
 def archive_month(request, year, month):
     """月份归档详情"""
+    try:
+        start, end = month_range(year, month)
+    except ValueError:
+        raise Http404('归档月份不存在')
+    
+    # 使用范围查询，可以利用 published_at 上的索引
     posts = Post.objects.filter(
         status='published',
-        published_at__year=year,
-        published_at__month=month
-    )
+        published_at__gte=start,
+        published_at__lt=end
+    ).defer(*Post.BODY_FIELDS)
     
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate_posts(request, posts, 10)
     
     context = {
         'year': year,
@@ -192,15 +237,23 @@ def archive_month(request, year, month):
 @login_required
 @require_POST
 def add_comment(request, post_slug):
-    """添加评论"""
-    post = get_object_or_404(Post, slug=post_slug, status='published')
+    """添加评论：先做限流和重复内容检查，通过后才查询文章并写入数据库"""
+    is_ajax = request.headers.get('Content-Type') == 'application/json'
+    ip_address = get_client_ip(request)
+    retry_after = comment_guard.acquire(ip=ip_address, user=request.user.pk, post=post_slug)
+    if retry_after:
+        return _reject_comment(request, post_slug, is_ajax, f'评论过于频繁，请 {math.ceil(retry_after)} 秒后再试。', retry_after)
+
     form = CommentForm(request.POST)
-    
+    if form.is_valid() and comment_guard.is_duplicate(form.cleaned_data['content']):
+        return _reject_comment(request, post_slug, is_ajax, '请勿重复提交相同或相近的评论。')
+
     if form.is_valid():
+        post = get_object_or_404(Post, slug=post_slug, status='published')
         comment = form.save(commit=False)
         comment.post = post
         comment.user = request.user
-        comment.ip_address = get_client_ip(request)
+        comment.ip_address = ip_address
         
         parent_id = request.POST.get('parent_id')
         if parent_id:
@@ -212,16 +265,60 @@ def add_comment(request, post_slug):
         comment.save()
         messages.success(request, '评论提交成功，等待审核后显示。')
         
-        if request.headers.get('Content-Type') == 'application/json':
+        if is_ajax:
             return JsonResponse({'success': True, 'message': '评论提交成功'})
     else:
         messages.error(request, '评论提交失败，请检查输入内容。')
-        if request.headers.get('Content-Type') == 'application/json':
+        if is_ajax:
             return JsonResponse({'success': False, 'errors': form.errors})
     
     return redirect('post_detail', slug=post_slug)
 
 
+def _reject_comment(request, post_slug, is_ajax, message, retry_after=None):
+    """拒绝评论：AJAX 请求返回 429 JSON，普通表单提交提示后返回文章页"""
+    if is_ajax:
+        response = JsonResponse({'success': False, 'message': message}, status=429)
+    else:
+        messages.error(request, message)
+        response = redirect('post_detail', slug=post_slug)
+    if retry_after:
+        response['Retry-After'] = str(math.ceil(retry_after))
+    return response
+
+
+# ==================== 订阅源和站点地图 ====================
+
+@cache_snapshot('post')
+def post_feed(request, atom=False):
+    """全站最新文章订阅源"""
+    return LatestPostsFeed(atom=atom)(request)
+
+
+@cache_snapshot('post')
+def category_feed(request, slug, atom=False):
+    """分类订阅源"""
+    return CategoryPostsFeed(atom=atom)(request, slug=slug)
+
+
+@cache_snapshot('post')
+def tag_feed(request, slug, atom=False):
+    """标签订阅源"""
+    return TagPostsFeed(atom=atom)(request, slug=slug)
+
+
+@cache_snapshot('post')
+def sitemap_index(request):
+    """站点地图索引"""
+    return sitemap_views.index(request, SITEMAPS, sitemap_url_name='sitemap_section')
+
+
+@cache_snapshot('post', vary_on_params=('p',))
+def sitemap_section(request, section):
+    """站点地图分段，p 参数为段内页码"""
+    return sitemap_views.sitemap(request, SITEMAPS, section=section)
+
+
 # ==================== 用户认证视图 ====================
 
 class CustomLoginView(LoginView):
@@ -301,20 +398,16 @@ def edit_profile(request):
 @staff_member_required
 def dashboard_home(request):
     """管理面板首页"""
-    stats = {
-        'total_posts': Post.objects.count(),
-        'published_posts': Post.objects.filter(status='published').count(),
-        'draft_posts': Post.objects.filter(status='draft').count(),
-        'total_comments': Comment.objects.count(),
-        'pending_comments': Comment.objects.filter(is_approved=False).count(),
-        'total_users': User.objects.count(),
-        'total_categories': Category.objects.count(),
-        'total_tags': Tag.objects.count(),
-    }
-    
-    recent_posts = Post.objects.select_related('author', 'category').order_by('-created_at')[:5]
-    recent_comments = Comment.objects.select_related('post', 'user').order_by('-created_at')[:5]
-    popular_posts = Post.objects.filter(status='published').order_by('-views')[:5]
+    # 计数由信号维护，一次查询读取
+    stats = get_stats()
+    
+    recent_posts = Post.objects.select_related('author', 'category').defer(*Post.BODY_FIELDS).order_by('-created_at')[:5]
+    recent_comments = (
+        Comment.objects.select_related('post', 'user')
+        .defer('post__excerpt', *[f'post__{field}' for field in Post.BODY_FIELDS])
+        .order_by('-created_at')[:5]
+    )
+    popular_posts = view_counter.apply_pending_views(hot_posts.get_hot_posts(5))
     
     context = {
         'stats': stats,
@@ -325,6 +418,30 @@ def dashboard_home(request):
     return render(request, 'dashboard/home.html', context)
 
 
+@staff_member_required
+def performance_dashboard(request):
+    """最近采样请求的耗时、查询和缓存统计，?format=json 返回 JSON"""
+    try:
+        limit = min(int(request.GET.get('limit', 100)), settings.INSTRUMENTATION_RING_SIZE)
+    except ValueError:
+        limit = 100
+    entries = instrumentation.recent_requests(limit)
+    view = request.GET.get('view')
+    if view:
+        entries = [entry for entry in entries if entry.get('view') == view]
+    summary = instrumentation.summarize(entries)
+    
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'summary': summary, 'requests': entries})
+    context = {
+        'summary': summary,
+        'requests': entries,
+        'current_view': view,
+        'sample_rate': settings.INSTRUMENTATION_SAMPLE_RATE,
+    }
+    return render(request, 'dashboard/performance.html', context)
+
+
 @staff_member_required
 def post_list(request):
     """文章列表管理"""
@@ -374,6 +491,14 @@ def comment_list(request):
     elif approved == 'false':
         comments = comments.filter(is_approved=False)
     
+    # 按文章或IP筛选，筛选结果可整体提交批量审核
+    post_slug = request.GET.get('post', '')
+    if post_slug:
+        comments = comments.filter(post__slug=post_slug)
+    ip = request.GET.get('ip', '')
+    if ip:
+        comments = comments.filter(ip_address=ip)
+    
     paginator = Paginator(comments, 20)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
@@ -381,6 +506,9 @@ def comment_list(request):
     context = {
         'page_obj': page_obj,
         'current_approved': approved,
+        'current_post': post_slug,
+        'current_ip': ip,
+        'moderation_actions': moderation.ACTIONS,
     }
     return render(request, 'dashboard/comment_list.html', context)
 
@@ -408,6 +536,88 @@ def comment_delete(request, pk):
     return redirect('comment_list')
 
 
+@staff_member_required
+@require_POST
+def comment_moderate(request):
+    """
+    批量审核评论
+    参数 action 为 approve/reject/delete，ids 为所选评论ID，
+    或用 post（文章slug）、ip、approved（true/false）按条件选择全部匹配的评论
+    """
+    is_ajax = request.headers.get('Content-Type') == 'application/json'
+    if is_ajax:
+        try:
+            data = json.loads(request.body or '{}')
+        except ValueError:
+            return JsonResponse({'success': False, 'message': '请求格式错误'}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({'success': False, 'message': '请求格式错误'}, status=400)
+        ids = data.get('ids')
+    else:
+        data = request.POST
+        ids = [pk for value in data.getlist('ids') for pk in value.split(',') if pk.strip()]
+    
+    approved = data.get('approved')
+    if isinstance(approved, str):
+        approved = {'true': True, 'false': False}.get(approved)
+    try:
+        comments = moderation.select_comments(
+            ids=ids, post=data.get('post') or None, ip=data.get('ip') or None, approved=approved
+        )
+        result = moderation.moderate(comments, data.get('action'))
+    except moderation.ModerationError as e:
+        if is_ajax:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+        messages.error(request, str(e))
+        return redirect('comment_list')
+    
+    if is_ajax:
+        return JsonResponse({'success': True, **result._asdict()})
+    labels = {'approve': '批准', 'reject': '驳回', 'delete': '删除'}
+    messages.success(request, f'已{labels[result.action]} {result.affected} 条评论（匹配 {result.matched} 条）。')
+    return redirect('comment_list')
+
+
+@staff_member_required
+@require_POST
+def upload_file(request):
+    """上传文件：提交后台任务后立即返回任务ID"""
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'success': False, 'message': '请选择文件'}, status=400)
+    if upload.size > settings.UPLOAD_MAX_SIZE:
+        return JsonResponse({'success': False, 'message': '文件过大'}, status=400)
+    
+    try:
+        folder = check_folder(request.POST.get('folder', 'images'))
+    except UploadError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    data = upload.read()
+    try:
+        # 位图先生成多种尺寸再上传，其他文件原样上传
+        if detect_content_type(data, upload.name) in PROCESSABLE_TYPES:
+            future = submit_image(data, folder=folder)
+        else:
+            future = submit_upload(data, folder=folder, filename=upload.name)
+    except UploadQueueFull as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=503)
+    
+    return JsonResponse({
+        'success': True,
+        'job_id': future.job_id,
+        'status_url': reverse('upload_status', args=[future.job_id]),
+    }, status=202)
+
+
+@staff_member_required
+def upload_status(request, job_id):
+    """查询上传任务状态"""
+    job = get_job(job_id)
+    if job is None:
+        return JsonResponse({'success': False, 'message': '任务不存在'}, status=404)
+    return JsonResponse({'success': True, **job})
+
+
 # ==================== 工具函数 ====================
 
 def get_client_ip(request):
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blog_yk.settings')
+# 首页、文章详情和搜索使用异步视图
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
\ No newline at end of file
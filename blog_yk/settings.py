@@ -27,6 +27,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.sitemaps',
     'crispy_forms',
     'crispy_bootstrap5',
     
@@ -35,7 +36,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'blog_app.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'blog_app.db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -75,12 +78,35 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD', default='zhjh0704'),
         'HOST': config('DB_HOST', default='101.35.218.174'),
         'PORT': config('DB_PORT', default='3306'),
+        # 数据库连接保持的秒数；异步视图在线程池中并发查询，建议设为正数以复用各线程的连接
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=0, cast=int),
         'OPTIONS': {
             'charset': 'utf8mb4',
         },
     }
 }
 
+# 只读从库：DB_REPLICAS=host1[:port][*权重],host2...，账号和库名与主库相同，权重默认为 1
+# 配置后公开页面的读查询按权重分配到从库，写查询和管理面板使用主库
+DATABASE_REPLICAS = {}
+for _index, _replica in enumerate(filter(None, config('DB_REPLICAS', default='').split(',')), start=1):
+    _address, _, _weight = _replica.strip().partition('*')
+    _host, _, _port = _address.partition(':')
+    _alias = f'replica{_index}'
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        'HOST': _host,
+        'PORT': _port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS[_alias] = int(_weight or 1)
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['blog_app.db_router.PrimaryReplicaRouter']
+# 用户写入后继续读主库的秒数（覆盖从库复制延迟）、出错从库暂停使用的秒数、始终使用主库的路径
+DATABASE_STICKY_SECONDS = config('DB_STICKY_SECONDS', default=10, cast=int)
+DATABASE_REPLICA_EJECT_SECONDS = config('DB_REPLICA_EJECT_SECONDS', default=30, cast=int)
+DATABASE_PRIMARY_PATHS = ('/dashboard/', '/admin/', '/profile/')
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -127,6 +153,14 @@ QINIU_SECRET_KEY = config('QINIU_SECRET_KEY', default='9lZjiRtRLL0U_MuYkcUZBAL16
 QINIU_BUCKET_NAME = config('QINIU_BUCKET_NAME', default='youxuan-images')
 QINIU_DOMAIN = config('QINIU_DOMAIN', default='')
 
+# 上传服务：存储后端（本地开发可用 blog_app.uploads.LocalBackend）、上传线程数和排队上限
+UPLOAD_BACKEND = config('UPLOAD_BACKEND', default='blog_app.uploads.QiniuBackend')
+UPLOAD_MAX_WORKERS = config('UPLOAD_MAX_WORKERS', default=4, cast=int)
+UPLOAD_MAX_PENDING = config('UPLOAD_MAX_PENDING', default=100, cast=int)
+UPLOAD_MAX_SIZE = config('UPLOAD_MAX_SIZE', default=10 * 1024 * 1024, cast=int)
+# 图片处理进程数，默认为CPU核数
+IMAGE_WORKERS = config('IMAGE_WORKERS', default=None, cast=lambda value: int(value) if value else None)
+
 # Redis Configuration (Optional)
 REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
 
@@ -141,6 +175,43 @@ CACHES = {
     }
 }
 
+# 阅读量缓冲写回间隔（秒），仅在 Redis 不可用、使用进程内缓冲时生效
+VIEW_COUNT_FLUSH_INTERVAL = config('VIEW_COUNT_FLUSH_INTERVAL', default=60, cast=int)
+
+# 热门文章热度的半衰期（小时）
+HOT_POSTS_HALF_LIFE_HOURS = config('HOT_POSTS_HALF_LIFE_HOURS', default=48, cast=float)
+
+# 匿名用户整页缓存
+PAGE_CACHE_ENABLED = config('PAGE_CACHE_ENABLED', default=True, cast=bool)
+PAGE_CACHE_TIMEOUT = config('PAGE_CACHE_TIMEOUT', default=300, cast=int)
+
+# 首页、文章详情和搜索使用异步视图（blog_yk/asgi.py 中默认开启，WSGI 下使用同步视图）
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
+# 评论限流：名称 -> (时间窗口内允许的评论数, 时间窗口秒数)，按令牌桶连续补充
+COMMENT_RATE_LIMITS = {
+    'ip': (config('COMMENT_RATE_IP', default=5, cast=int), 60),
+    'user': (config('COMMENT_RATE_USER', default=3, cast=int), 60),
+    'post': (config('COMMENT_RATE_POST', default=30, cast=int), 60),
+}
+# 近似重复评论：指纹保留秒数、判定重复的最大海明距离（64 位指纹）、参与检查的最短评论长度
+COMMENT_DUPLICATE_WINDOW = config('COMMENT_DUPLICATE_WINDOW', default=600, cast=int)
+COMMENT_DUPLICATE_DISTANCE = config('COMMENT_DUPLICATE_DISTANCE', default=8, cast=int)
+COMMENT_DUPLICATE_MIN_LENGTH = config('COMMENT_DUPLICATE_MIN_LENGTH', default=20, cast=int)
+
+# 详情页评论分页：每页最多的评论数和顶层话题数
+COMMENT_PAGE_SIZE = config('COMMENT_PAGE_SIZE', default=100, cast=int)
+COMMENT_THREADS_PER_PAGE = config('COMMENT_THREADS_PER_PAGE', default=20, cast=int)
+
+# 请求性能采样：采样率（0 关闭，1 全部记录）、环形缓冲区保留的请求数、
+# 是否向所有用户输出 Server-Timing 响应头（默认只向管理员或在 DEBUG 下输出）
+INSTRUMENTATION_SAMPLE_RATE = config('INSTRUMENTATION_SAMPLE_RATE', default=0.01, cast=float)
+INSTRUMENTATION_RING_SIZE = config('INSTRUMENTATION_RING_SIZE', default=500, cast=int)
+INSTRUMENTATION_SERVER_TIMING = config('INSTRUMENTATION_SERVER_TIMING', default=False, cast=bool)
+
+# 文章列表分页方式：cursor（游标分页，深页与首页开销相同）或 page（页码分页）
+PAGINATION_MODE = config('PAGINATION_MODE', default='cursor')
+
 # Session Configuration
 SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
 SESSION_CACHE_ALIAS = 'default'
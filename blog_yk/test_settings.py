@@ -0,0 +1,36 @@
+"""
+测试与基准测试配置
+
+在主配置基础上改用 SQLite 和本地内存缓存，无需 MySQL/Redis 即可运行：
+python manage.py test --settings=blog_yk.test_settings
+"""
+
+from .settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# 上传到本地文件系统，不访问网络
+UPLOAD_BACKEND = 'blog_app.uploads.LocalBackend'
+
+# 测试中按需开启请求采样
+INSTRUMENTATION_SAMPLE_RATE = 0
+
+# 第二个内存数据库作为从库：结构相同但不复制数据，用于测试主从路由
+DATABASES['replica'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': ':memory:',
+}
+DATABASE_REPLICAS = {}
@@ -170,6 +170,44 @@ document.addEventListener('DOMContentLoaded', function() {
         codeBlock.parentElement.appendChild(button);
     });
 
+    // Batch comment moderation: <form data-moderation-form> with checkboxes name="ids",
+    // optional hidden inputs post/ip/approved, and buttons name="action" value="approve|reject|delete"
+    document.querySelectorAll('form[data-moderation-form]').forEach(form => {
+        const selectAll = form.querySelector('[data-select-all]');
+        if (selectAll) {
+            selectAll.addEventListener('change', function() {
+                form.querySelectorAll('input[name="ids"]').forEach(box => {
+                    box.checked = selectAll.checked;
+                });
+            });
+        }
+
+        form.addEventListener('submit', function(e) {
+            e.preventDefault();
+            const action = e.submitter ? e.submitter.value : 'approve';
+            const ids = Array.from(form.querySelectorAll('input[name="ids"]:checked')).map(box => box.value);
+            const payload = { action: action, ids: ids };
+            // Without a selection the current filters (post/ip/approved) select every matching comment
+            if (!ids.length) {
+                ['post', 'ip', 'approved'].forEach(name => {
+                    const field = form.querySelector(`[name="${name}"]`);
+                    if (field && field.value) {
+                        payload[name] = field.value;
+                    }
+                });
+            }
+            if (action === 'delete' && !confirm('确定删除所选评论及其回复吗？')) {
+                return;
+            }
+            makeRequest(form.action, { method: 'POST', body: JSON.stringify(payload) })
+                .then(data => {
+                    alert(`已处理 ${data.affected} 条评论（匹配 ${data.matched} 条）`);
+                    window.location.reload();
+                })
+                .catch(() => alert('批量操作失败'));
+        });
+    });
+
     // Print functionality
     window.printPost = function() {
         window.print();
@@ -219,6 +257,10 @@ function makeRequest(url, options = {}) {
     
     return fetch(url, { ...defaultOptions, ...options })
         .then(response => {
+            // 评论限流返回 429 和 {success: false, message}，交给调用方提示
+            if (response.status === 429) {
+                return response.json();
+            }
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }